@@ -0,0 +1,421 @@
+import os
+import sys
+import json
+import re
+import time
+import shutil
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Files the manager or the server rewrite in place. These are always given their own copy
+# so a write to one tree can never show through a hardlink into the other.
+ALWAYS_COPY = {"session.lock", "saved_properties.properties"}
+
+FICLONE = 0x40049409 # Linux reflink ioctl
+FSCTL_DUPLICATE_EXTENTS_TO_FILE = 0x00098344 # Windows ReFS block cloning
+FSCTL_SET_SPARSE = 0x000900C4
+FILE_ATTRIBUTE_SPARSE_FILE = 0x200
+MAX_CLONE_CHUNK = 1024 * 1024 * 1024 # ReFS rejects single clone requests of 4GB or more
+
+BACKUP_INDEX = "backup_index.json"
+MANIFEST_SUFFIX = ".manifest.json"
+VERIFY_READ_SIZE = 1024 * 1024
+BACKUP_NAME_RE = re.compile(r"^(?P<world>.+)_\d{2}-\d{2}-\d{2}(\(\d+\))?\.zip$")
+DEFAULT_RETENTION = {
+    "hourly": 24,
+    "daily": 14,
+    "weekly": 8,
+    "size limit gb": 0
+}
+
+def _windows_block_clone(src, dst):
+    import ctypes
+    import msvcrt
+    from ctypes import wintypes
+
+    class DUPLICATE_EXTENTS_DATA(ctypes.Structure):
+        _fields_ = [("FileHandle", wintypes.HANDLE),
+                    ("SourceFileOffset", ctypes.c_longlong),
+                    ("TargetFileOffset", ctypes.c_longlong),
+                    ("ByteCount", ctypes.c_longlong)]
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.DeviceIoControl.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPVOID, wintypes.DWORD,
+                                         wintypes.LPVOID, wintypes.DWORD, ctypes.POINTER(wintypes.DWORD), wintypes.LPVOID]
+    kernel32.DeviceIoControl.restype = wintypes.BOOL
+
+    # Clone ranges have to be aligned to the volume's cluster size
+    sectors_per_cluster, bytes_per_sector = wintypes.DWORD(), wintypes.DWORD()
+    free_clusters, total_clusters = wintypes.DWORD(), wintypes.DWORD()
+    root = os.path.splitdrive(os.path.abspath(dst))[0] + "\\"
+    if not kernel32.GetDiskFreeSpaceW(root, ctypes.byref(sectors_per_cluster), ctypes.byref(bytes_per_sector),
+                                      ctypes.byref(free_clusters), ctypes.byref(total_clusters)):
+        return False
+    cluster_size = sectors_per_cluster.value * bytes_per_sector.value
+
+    size = os.path.getsize(src)
+    returned = wintypes.DWORD()
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        dst_handle = msvcrt.get_osfhandle(d.fileno())
+        if os.stat(src).st_file_attributes & FILE_ATTRIBUTE_SPARSE_FILE:
+            if not kernel32.DeviceIoControl(dst_handle, FSCTL_SET_SPARSE, None, 0, None, 0, ctypes.byref(returned), None):
+                return False
+        d.truncate(size)
+        d.flush()
+
+        offset = 0
+        while offset < size:
+            count = min(MAX_CLONE_CHUNK, size - offset)
+            count = -(-count // cluster_size) * cluster_size
+            data = DUPLICATE_EXTENTS_DATA(msvcrt.get_osfhandle(s.fileno()), offset, offset, count)
+            if not kernel32.DeviceIoControl(dst_handle, FSCTL_DUPLICATE_EXTENTS_TO_FILE, ctypes.byref(data),
+                                            ctypes.sizeof(data), None, 0, ctypes.byref(returned), None):
+                return False
+            offset += count
+    return True
+
+def _mac_clonefile(src, dst):
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    return libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+
+def reflink_file(src, dst):
+    """Makes dst a copy-on-write clone of src. Returns False if the filesystem can't do it."""
+    try:
+        if sys.platform == "win32":
+            cloned = _windows_block_clone(src, dst)
+        elif sys.platform == "darwin":
+            cloned = _mac_clonefile(src, dst)
+        else:
+            import fcntl
+            with open(src, "rb") as s, open(dst, "wb") as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            cloned = True
+    except (OSError, AttributeError, ValueError):
+        cloned = False
+
+    if cloned:
+        shutil.copystat(src, dst)
+    elif os.path.exists(dst):
+        os.remove(dst)
+    return cloned
+
+def clone_tree(source_folder, destination_folder, progress_function=None):
+    """Clones a folder using reflinks where supported, otherwise hardlinks.
+    Returns the method used and the number of files cloned."""
+    if os.path.exists(destination_folder):
+        raise FileExistsError(destination_folder)
+
+    use_reflinks = True
+    use_hardlinks = True
+    method = "copy"
+    processed = 0
+    for root, _, files in os.walk(source_folder):
+        relative = os.path.relpath(root, source_folder)
+        target_root = os.path.normpath(os.path.join(destination_folder, relative))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            src = os.path.join(root, name)
+            dst = os.path.join(target_root, name)
+            if name in ALWAYS_COPY:
+                shutil.copy2(src, dst)
+            elif use_reflinks and reflink_file(src, dst):
+                method = "reflink"
+            else:
+                # Only the first failure is needed to know the volume can't clone
+                use_reflinks = False
+                try:
+                    if not use_hardlinks:
+                        raise OSError("Hardlinks unavailable")
+                    os.link(src, dst)
+                    method = "hardlink"
+                except OSError:
+                    use_hardlinks = False
+                    shutil.copy2(src, dst)
+
+            processed += 1
+            if progress_function:
+                progress_function(processed, name)
+
+    return method, processed
+
+def break_hardlinks(folder, progress_function=None):
+    """Gives every file in the folder that is still shared with a snapshot its own copy.
+    Must be run before anything writes to the folder so the snapshot is left untouched.
+    Returns how many files were separated and the paths of any that are still shared,
+    in which case nothing should write to the folder. progress_function(processed, total, name)
+    is called after each shared file."""
+    shared = []
+    failed = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_nlink > 1:
+                    shared.append(path)
+            except OSError:
+                failed.append(path)
+
+    unshared = 0
+    for i, path in enumerate(shared):
+        temp_path = path + ".unshare"
+        try:
+            shutil.copy2(path, temp_path)
+            os.replace(temp_path, path)
+            unshared += 1
+        except OSError:
+            failed.append(path)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        if progress_function:
+            progress_function(i + 1, len(shared), os.path.basename(path))
+    return unshared, failed
+
+def snapshot_world(world_folder_path, snapshot_folder, progress_function=None):
+    os.makedirs(snapshot_folder, exist_ok=True)
+    current_date = datetime.now().strftime("%m-%d-%y_%H-%M-%S")
+    snapshot_path = os.path.join(snapshot_folder, f"{os.path.basename(world_folder_path)}_{current_date}")
+    index = 1
+    while os.path.exists(snapshot_path):
+        snapshot_path = os.path.join(snapshot_folder, f"{os.path.basename(world_folder_path)}_{current_date}({index})")
+        index += 1
+
+    method, _ = clone_tree(world_folder_path, snapshot_path, progress_function)
+    return snapshot_path, method
+
+
+_index_lock = threading.Lock()
+
+def save_backup_index(backup_folder, index):
+    index_path = os.path.join(backup_folder, BACKUP_INDEX)
+    with open(index_path + ".tmp", 'w') as f:
+        json.dump(index, f, indent=4)
+    os.replace(index_path + ".tmp", index_path)
+
+def load_backup_index(backup_folder):
+    """Returns {zip name: metadata} for every backup without opening any of the zips.
+    Backups made before the index existed are picked up from their name and file stats."""
+    if not os.path.isdir(backup_folder):
+        return {}
+
+    try:
+        with open(os.path.join(backup_folder, BACKUP_INDEX), 'r') as f:
+            index: dict = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        index = {}
+
+    changed = False
+    found = set()
+    with os.scandir(backup_folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".zip") or not entry.is_file():
+                continue
+            found.add(entry.name)
+            if entry.name not in index:
+                stat = entry.stat()
+                match = BACKUP_NAME_RE.match(entry.name)
+                index[entry.name] = {
+                    "world": match.group("world") if match else entry.name.removesuffix(".zip"),
+                    "created": stat.st_mtime,
+                    "size": stat.st_size
+                }
+                changed = True
+
+    for name in list(index.keys()):
+        if name not in found:
+            index.pop(name)
+            changed = True
+
+    if changed:
+        save_backup_index(backup_folder, index)
+    return index
+
+def record_backup(backup_zip_path, world):
+    backup_folder = os.path.dirname(backup_zip_path)
+    with _index_lock:
+        index = load_backup_index(backup_folder)
+        index[os.path.basename(backup_zip_path)] = {
+            "world": world,
+            "created": time.time(),
+            "size": os.path.getsize(backup_zip_path),
+            "verified": None
+        }
+        save_backup_index(backup_folder, index)
+
+def record_verification(backup_zip_path, verified: bool):
+    backup_folder = os.path.dirname(backup_zip_path)
+    with _index_lock:
+        index = load_backup_index(backup_folder)
+        entry = index.get(os.path.basename(backup_zip_path))
+        if entry is None:
+            return
+        entry["verified"] = verified
+        entry["verified at"] = time.time()
+        save_backup_index(backup_folder, index)
+
+def select_expired_backups(index: dict, policy: dict):
+    """Picks the backups that fall outside of the retention policy.
+    Per world, the newest backup of each of the last N hours, days and weeks (that have backups) is kept.
+    If all of those are 0, every backup is kept. The size limit then removes the oldest kept backups,
+    but never the latest backup of a world."""
+    hourly = policy.get("hourly", 0)
+    daily = policy.get("daily", 0)
+    weekly = policy.get("weekly", 0)
+    size_limit = int(policy.get("size limit gb", 0) * 1024 ** 3)
+
+    by_world = {}
+    for name, data in index.items():
+        by_world.setdefault(data.get("world"), []).append(name)
+
+    keep = set()
+    latest = set()
+    for names in by_world.values():
+        names.sort(key=lambda n: index[n]["created"], reverse=True)
+        latest.add(names[0])
+        if not (hourly or daily or weekly):
+            keep.update(names)
+            continue
+
+        for count, bucket in ((hourly, "%Y-%m-%d %H"), (daily, "%Y-%m-%d"), (weekly, "%G-%V")):
+            seen = set()
+            for name in names:
+                if len(seen) >= count:
+                    break
+                key = datetime.fromtimestamp(index[name]["created"]).strftime(bucket)
+                if key not in seen:
+                    seen.add(key)
+                    keep.add(name)
+        keep.update(names[:1])
+
+    if size_limit:
+        total = sum(index[name]["size"] for name in keep)
+        for name in sorted(keep, key=lambda n: index[n]["created"]):
+            if total <= size_limit:
+                break
+            if name in latest:
+                continue
+            keep.discard(name)
+            total -= index[name]["size"]
+
+    return [name for name in index if name not in keep]
+
+def apply_retention(backup_folder, policy: dict):
+    with _index_lock:
+        index = load_backup_index(backup_folder)
+        expired = select_expired_backups(index, policy)
+        removed = []
+        for name in expired:
+            try:
+                os.remove(os.path.join(backup_folder, name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            try:
+                os.remove(os.path.join(backup_folder, name + MANIFEST_SUFFIX))
+            except OSError:
+                pass
+            index.pop(name)
+            removed.append(name)
+
+        if removed:
+            save_backup_index(backup_folder, index)
+    return removed
+
+def write_manifest(backup_zip_path, manifest):
+    """Saves the CRC and size of every file next to the backup, as they were read from the world
+    while it was written, and checks the finished zip lists the same. Returns any problems."""
+    with open(backup_zip_path + MANIFEST_SUFFIX, 'w') as f:
+        json.dump(manifest, f)
+
+    problems = []
+    with zipfile.ZipFile(backup_zip_path, 'r') as zf:
+        listed = {info.filename: info for info in zf.infolist() if not info.is_dir()}
+    for name, (crc, size) in manifest.items():
+        info = listed.get(name)
+        if info is None:
+            problems.append(f"{name}: missing from the archive")
+        elif info.CRC != crc or info.file_size != size:
+            problems.append(f"{name}: does not match the world file it was read from")
+    return problems
+
+def load_manifest(backup_zip_path):
+    try:
+        with open(backup_zip_path + MANIFEST_SUFFIX, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _verify_entries(backup_zip_path, infos, throttle=None, cancelled=None):
+    problems = []
+    with zipfile.ZipFile(backup_zip_path, 'r') as zf:
+        for info in infos:
+            if cancelled and cancelled.is_set():
+                break
+            ratio = info.compress_size / info.file_size if info.file_size else 1
+            try:
+                # ZipExtFile checks the CRC of the data once it reaches the end of the entry
+                with zf.open(info) as entry:
+                    while True:
+                        data = entry.read(VERIFY_READ_SIZE)
+                        if not data:
+                            break
+                        if throttle:
+                            throttle(int(len(data) * ratio))
+            except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                problems.append(f"{info.filename}: {e}")
+    return problems
+
+def verify_backup(backup_zip_path, workers=4, throttle=None, cancelled=None, executor=None):
+    """Re-reads every entry of the backup across several threads, checking each CRC, and compares
+    the entries against the manifest saved at backup time. Returns (passed, problems)."""
+    try:
+        with zipfile.ZipFile(backup_zip_path, 'r') as zf:
+            infos = [info for info in zf.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile) as e:
+        return False, [str(e)]
+
+    problems = []
+    manifest = load_manifest(backup_zip_path)
+    if manifest is not None:
+        listed = {info.filename: info for info in infos}
+        for name, (crc, size) in manifest.items():
+            info = listed.get(name)
+            if info is None:
+                if not name.endswith("/"):
+                    problems.append(f"{name}: missing from the archive")
+            elif info.CRC != crc or info.file_size != size:
+                problems.append(f"{name}: does not match the backup manifest")
+        for name in listed:
+            if name not in manifest:
+                problems.append(f"{name}: not in the backup manifest")
+
+    # Deal the entries out by size so each worker gets a similar amount of reading
+    batches = [[] for _ in range(max(1, workers))]
+    batch_sizes = [0] * len(batches)
+    for info in sorted(infos, key=lambda i: i.compress_size, reverse=True):
+        smallest = batch_sizes.index(min(batch_sizes))
+        batches[smallest].append(info)
+        batch_sizes[smallest] += info.compress_size
+
+    def verify_batch(batch):
+        return _verify_entries(backup_zip_path, batch, throttle, cancelled)
+
+    if len(batches) == 1:
+        problems.extend(verify_batch(batches[0]))
+    elif executor is not None:
+        for result in executor.map(verify_batch, batches):
+            problems.extend(result)
+    else:
+        with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+            for result in pool.map(verify_batch, batches):
+                problems.extend(result)
+
+    if cancelled and cancelled.is_set():
+        return None, problems
+    return len(problems) == 0, problems
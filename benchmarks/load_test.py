@@ -0,0 +1,387 @@
+"""Load tests the host manager's client port with many simulated manager clients.
+
+By default a test host is started in its own process. It runs the host's client server, status
+service and request limits against a stand-in Minecraft server that answers status queries. Each
+simulated client connects, identifies, switches to framed messages, and then chats, polls the
+status and asks for the mod list at the given rates. Latencies, throughput and the host process's
+CPU and memory use are reported at the end. Run it from the repository folder:
+
+    python benchmarks/load_test.py --clients 200 --duration 30
+
+To load a host manager that is already running, point it at that host instead, optionally with the
+process id of the host manager so its CPU and memory are measured too:
+
+    python benchmarks/load_test.py --target 25.1.2.3:5555 --host-pid 1234
+"""
+import os
+import sys
+import time
+import glob
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import protocol
+import queries
+import host_server
+import status_service
+import request_limits
+import transfer_funcs
+
+MB = 1024 * 1024
+HOST_PORT = 5595
+QUERY_PORT = 25595
+REQUEST_TIMEOUT = 10
+
+
+class StubQueryServer:
+    """Answers Minecraft query protocol requests the way a running server does, so the host's
+    status polling has something real to talk to."""
+    def __init__(self, port, players, world="bench world", version="1.21.4"):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", port))
+        self.port = port
+        self.players = players
+        self.world = world
+        self.version = version
+        self.challenge = 9513307
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(2048)
+            except OSError:
+                return
+            if len(data) < 7 or data[:2] != b"\xfe\xfd":
+                continue
+            packet_type, session = data[2], data[3:7]
+            if packet_type == 9:
+                self.sock.sendto(b"\x09" + session + str(self.challenge).encode() + b"\x00", address)
+            elif packet_type == 0:
+                self.sock.sendto(b"\x00" + session + self.full_stat(), address)
+
+    def full_stat(self):
+        values = {
+            "hostname": "Bench server", "gametype": "SMP", "game_id": "MINECRAFT", "version": self.version,
+            "plugins": "", "map": self.world, "numplayers": str(len(self.players)), "maxplayers": "20",
+            "hostport": str(self.port), "hostip": "127.0.0.1",
+        }
+        body = b"splitnum\x00\x80\x00"
+        body += b"".join(key.encode() + b"\x00" + value.encode() + b"\x00" for key, value in values.items())
+        body += b"\x00\x01player_\x00\x00"
+        body += b"".join(player.encode() + b"\x00" for player in self.players)
+        return body + b"\x00"
+
+    def close(self):
+        self.sock.close()
+
+
+class BenchHost:
+    """The host manager's client handling without its window: chat, status, players, mod lists."""
+    def __init__(self, query_port, resource_folder, limits=True):
+        self.clients = {}
+        self.resource_folder = resource_folder
+        self.results = request_limits.SharedResults()
+        self.status = status_service.StatusService(lambda: self.query_status(query_port),
+                                                   lambda: queries.players("127.0.0.1", query_port),
+                                                   self.status_updated)
+        self.server = host_server.HostServer(self, request_limits.RequestLimiter() if limits else None)
+
+    @staticmethod
+    def query_status(port):
+        status, brand, version, world = queries.status("127.0.0.1", port)
+        return status, version, world
+
+    def start(self, port):
+        self.status.start()
+        return self.server.start("127.0.0.1", port)
+
+    def stop(self):
+        self.server.stop()
+        self.status.stop()
+
+    def status_updated(self, snapshot, changed, requested):
+        if changed & {"status", "server_version", "world"}:
+            self.send_data("status", snapshot.status_info())
+
+    def client_name(self, ip):
+        # Every simulated client comes from the same address, so each one is asked for its name
+        return None
+
+    def name_client(self, client, name):
+        self.clients[client] = name
+
+    def client_joined(self, client):
+        self.send_data("host-version", "bench", client)
+        client.send_text("You have joined the room!")
+
+    def client_left(self, client):
+        self.clients.pop(client, None)
+
+    def handle_chat(self, client, message):
+        for other in list(self.clients):
+            try:
+                other.send_text(f'<font color="green">You: {message}</font>' if other is client else f'<font color="#5050de">{self.clients.get(client)}: {message}</font>')
+            except ConnectionError:
+                pass
+
+    def handle_request(self, client, request, args):
+        if request == "get-status":
+            self.send_data("status", self.status.snapshot().status_info(), client)
+        elif request == "get-players":
+            self.send_data("players", list(self.status.snapshot().players), client)
+        elif request == "get-resource-names":
+            paths = self.results.get(("resources", self.resource_folder), request_limits.RESOURCES_TTL, glob.glob, os.path.join(self.resource_folder, "*"))
+            self.send_data("resource-names", transfer_funcs.resource_details(paths), client)
+
+    def send_data(self, topic, data, client=None):
+        if not isinstance(data, (list, tuple, dict)):
+            data = [data]
+        for target in [client] if client else list(self.clients):
+            try:
+                target.send_data(topic, data)
+            except ConnectionError:
+                if client:
+                    raise
+
+
+def run_host(port, query_port, resources, limits, ready, stop):
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(resources):
+            with open(os.path.join(folder, f"mod-{i}.jar"), "wb") as f:
+                f.write(os.urandom(64 * 1024))
+        host = BenchHost(query_port, folder, limits)
+        if not host.start(port):
+            raise SystemExit(f"Couldn't listen on port {port}")
+        ready.set()
+        stop.wait()
+        host.stop()
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.timeouts = {}
+        self.limited = 0
+
+    def add(self, kind, seconds):
+        self.latencies.setdefault(kind, []).append(seconds)
+
+    def timed_out(self, kind):
+        self.timeouts[kind] = self.timeouts.get(kind, 0) + 1
+
+
+class SimulatedClient:
+    """Speaks to the host the way manager.py does once it has connected."""
+    def __init__(self, index, host, port, stats: Stats):
+        self.name = f"bench-{index}"
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.reader = None
+        self.writer = None
+        self.decoder = protocol.MixedDecoder(b"SERVER-MESSAGE~~>", b"\n")
+        self.framed = asyncio.Event()
+        self.pending = {}
+        self.chats = {}
+        self.next_id = 0
+
+    async def connect(self):
+        started = time.perf_counter()
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(b"connection request")
+        reply = await asyncio.wait_for(self.reader.read(1024), REQUEST_TIMEOUT)
+        if reply == b"identify":
+            self.writer.write(f"CLIENT-MESSAGE~~>{self.name}".encode())
+        elif reply != b"accept":
+            raise ConnectionError(f"Unexpected handshake reply {reply!r}")
+        self.writer.write(f"CLIENT-MESSAGE~~>MANAGER-REQUEST~~>{protocol.FRAMING_REQUEST},{protocol.VERSION}".encode())
+        asyncio.create_task(self.receive())
+        await asyncio.wait_for(self.framed.wait(), REQUEST_TIMEOUT)
+        self.stats.add("connect", time.perf_counter() - started)
+
+    async def receive(self):
+        try:
+            while data := await self.reader.read(65536):
+                self.decoder.feed(data)
+                for frame in self.decoder.frames():
+                    self.handle(frame)
+        except (ConnectionError, protocol.ProtocolError):
+            pass
+
+    def handle(self, frame):
+        now = time.perf_counter()
+        if frame.kind == protocol.LEGACY:
+            if frame.body.startswith(f"DATA-RETURN({protocol.FRAMING_TOPIC})"):
+                self.framed.set()
+            return
+        if frame.kind == protocol.TEXT:
+            if frame.body.startswith('<font color="green">You: '):
+                sent = self.chats.pop(frame.body[len('<font color="green">You: '):-len("</font>")], None)
+                if sent:
+                    self.stats.add("chat", now - sent)
+            elif frame.body == request_limits.LIMIT_MESSAGE:
+                self.stats.limited += 1
+            return
+        request = self.pending.pop(frame.request_id, None)
+        if request:
+            self.stats.add(request[0], now - request[1])
+
+    def request(self, kind, topic, *args):
+        self.next_id += 1
+        self.pending[self.next_id] = (kind, time.perf_counter())
+        self.writer.write(protocol.encode_request(self.next_id, topic, args))
+
+    def chat(self, message):
+        self.chats[message] = time.perf_counter()
+        self.writer.write(protocol.encode_frame(protocol.TEXT, 0, message))
+
+    async def run(self, duration, chat_rate, status_rate, resource_rate):
+        """Sends each kind of message at its rate, starting at a random point so clients don't line up."""
+        end = time.perf_counter() + duration
+        actions = [(rate, action) for rate, action in [
+            (chat_rate, lambda n: self.chat(f"{self.name} message {n}")),
+            (status_rate, lambda n: self.request("status", "get-status")),
+            (resource_rate, lambda n: self.request("resources", "get-resource-names", "bench world", "details")),
+        ] if rate > 0]
+        await asyncio.gather(*(self.repeat(1 / rate, action, end) for rate, action in actions))
+
+    async def repeat(self, interval, action, end):
+        await asyncio.sleep(min(interval * (hash(self.name + str(action)) % 1000) / 1000, max(0, end - time.perf_counter())))
+        count = 0
+        while time.perf_counter() < end:
+            action(count)
+            count += 1
+            await asyncio.sleep(min(interval, max(0, end - time.perf_counter())))
+
+    async def finish(self):
+        # Anything still unanswered once replies have had time to arrive was dropped or timed out
+        await asyncio.sleep(min(REQUEST_TIMEOUT, 2))
+        for kind, _ in self.pending.values():
+            self.stats.timed_out(kind)
+        for _ in self.chats:
+            self.stats.timed_out("chat")
+        self.writer.close()
+
+
+class ProcessMonitor:
+    def __init__(self, pid, interval=0.5):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu = []
+        self.memory = []
+        self.threads = 0
+        self.stopped = threading.Event()
+        self.process.cpu_percent(None)
+        threading.Thread(target=self.sample, daemon=True).start()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.cpu.append(self.process.cpu_percent(None))
+                self.memory.append(self.process.memory_info().rss)
+                self.threads = max(self.threads, self.process.num_threads())
+            except psutil.Error:
+                return
+
+    def stop(self):
+        self.stopped.set()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run_clients(args, host, port, stats: Stats):
+    clients = [SimulatedClient(i, host, port, stats) for i in range(args.clients)]
+    # Connected in batches, as a burst of thousands of connections at once would only test the backlog
+    for start in range(0, len(clients), 50):
+        results = await asyncio.gather(*(client.connect() for client in clients[start:start + 50]), return_exceptions=True)
+        for error in results:
+            if isinstance(error, Exception):
+                stats.timed_out("connect")
+    connected = [client for client in clients if client.framed.is_set()]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client.run(args.duration, args.chat_rate, args.status_rate, args.resource_rate) for client in connected))
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(client.finish() for client in connected))
+    return len(connected), elapsed
+
+
+def report(stats: Stats, connected, elapsed, monitor: ProcessMonitor = None):
+    print(f"{connected} clients connected, ran for {elapsed:.1f} s")
+    print(f"{'messages':<10} {'count':>8} {'per sec':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'unanswered':>11}")
+    for kind in ["connect", "chat", "status", "resources"]:
+        latencies = sorted(stats.latencies.get(kind, []))
+        timeouts = stats.timeouts.get(kind, 0)
+        if not latencies and not timeouts:
+            continue
+        if latencies:
+            rate = f"{len(latencies) / elapsed:.1f}" if kind != "connect" else "-"
+            print(f"{kind:<10} {len(latencies):>8} {rate:>9} {percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.9) * 1000:>8.1f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.1f} {latencies[-1] * 1000:>8.1f} {timeouts:>11}")
+        else:
+            print(f"{kind:<10} {0:>8} {'-':>9} {'-':>8} {'-':>8} {'-':>8} {'-':>8} {timeouts:>11}")
+    if stats.limited:
+        print(f"Clients were told to slow down {stats.limited} times. Requests over the host's limits go unanswered, try --no-limits.")
+    if monitor and monitor.cpu:
+        print(f"Host CPU: {sum(monitor.cpu) / len(monitor.cpu):.1f}% average, {max(monitor.cpu):.1f}% peak (100% is one core)")
+        print(f"Host memory: {monitor.memory[0] / MB:.1f} MB at the start, {max(monitor.memory) / MB:.1f} MB peak, {monitor.threads} threads at most")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50, help="Number of simulated clients.")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds each client keeps sending for.")
+    parser.add_argument("--chat-rate", type=float, default=0.2, help="Chat messages per second from each client.")
+    parser.add_argument("--status-rate", type=float, default=1, help="Status requests per second from each client.")
+    parser.add_argument("--resource-rate", type=float, default=0.1, help="Mod list requests per second from each client.")
+    parser.add_argument("--players", type=int, default=8, help="Players the stand-in Minecraft server reports.")
+    parser.add_argument("--resources", type=int, default=30, help="Mods the test host offers.")
+    parser.add_argument("--no-limits", action="store_true", help="Turn off the test host's request limits.")
+    parser.add_argument("--target", help="host:port of a running host manager to test instead.")
+    parser.add_argument("--host-pid", type=int, help="Process id of the host manager given with --target.")
+    args = parser.parse_args()
+
+    stop = multiprocessing.Event()
+    host_process = None
+    query_server = None
+    if args.target:
+        host, _, port = args.target.rpartition(":")
+        port = int(port)
+        pid = args.host_pid
+    else:
+        host, port = "127.0.0.1", HOST_PORT
+        query_server = StubQueryServer(QUERY_PORT, [f"Player{i}" for i in range(args.players)])
+        ready = multiprocessing.Event()
+        host_process = multiprocessing.Process(target=run_host, args=(port, QUERY_PORT, args.resources, not args.no_limits, ready, stop), daemon=True)
+        host_process.start()
+        if not ready.wait(30):
+            raise SystemExit("The test host didn't start")
+        pid = host_process.pid
+
+    monitor = ProcessMonitor(pid) if pid else None
+    stats = Stats()
+    try:
+        connected, elapsed = asyncio.run(run_clients(args, host, port, stats))
+    finally:
+        if monitor:
+            monitor.stop()
+        stop.set()
+        if host_process:
+            host_process.join(10)
+        if query_server:
+            query_server.close()
+    report(stats, connected, elapsed, monitor)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Compares world transfer speed over one connection and over several parallel ones.
+
+Transfers go through a local proxy that adds round trip latency and caps how much data each
+connection can have in flight, the way a TCP window does on a long distance link. Run it from
+the repository folder:
+
+    python benchmarks/transfer_benchmark.py --size-mb 64 --rtt-ms 80 --streams 1 2 4 8
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import transfer_funcs
+
+MB = 1024 * 1024
+
+
+class LatencyPipe:
+    """Forwards one direction of a connection, delivering each chunk half a round trip after it was read
+    and only letting a window's worth of data be unacknowledged at once."""
+    def __init__(self, source: socket.socket, destination: socket.socket, rtt, window):
+        self.source = source
+        self.destination = destination
+        self.delay = rtt / 2
+        self.window = window
+        self.in_flight = 0
+        self.releases = deque()
+        self.chunks = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        threading.Thread(target=self.read_loop, daemon=True).start()
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def read_loop(self):
+        try:
+            while True:
+                with self.condition:
+                    while True:
+                        now = time.monotonic()
+                        while self.releases and self.releases[0][0] <= now:
+                            self.in_flight -= self.releases.popleft()[1]
+                        if self.in_flight < self.window:
+                            break
+                        self.condition.wait(self.releases[0][0] - now if self.releases else None)
+                    room = self.window - self.in_flight
+                data = self.source.recv(min(room, 64 * 1024))
+                with self.condition:
+                    self.chunks.append((time.monotonic() + self.delay, data))
+                    self.in_flight += len(data)
+                    self.condition.notify_all()
+                if not data:
+                    return
+        except OSError:
+            with self.condition:
+                self.chunks.append((time.monotonic(), b""))
+                self.condition.notify_all()
+
+    def write_loop(self):
+        while True:
+            with self.condition:
+                while not self.chunks:
+                    self.condition.wait()
+                due, data = self.chunks.popleft()
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                if not data:
+                    self.destination.shutdown(socket.SHUT_WR)
+                    return
+                self.destination.sendall(data)
+            except OSError:
+                return
+            with self.condition:
+                # The acknowledgement takes the other half of the round trip to free up the window
+                self.releases.append((time.monotonic() + self.delay, len(data)))
+                self.condition.notify_all()
+
+
+class LatencyProxy:
+    def __init__(self, target_port, rtt, window):
+        self.target_port = target_port
+        self.rtt = rtt
+        self.window = window
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            LatencyPipe(client, upstream, self.rtt, self.window)
+            LatencyPipe(upstream, client, self.rtt, self.window)
+
+    def close(self):
+        self.sock.close()
+
+
+def run_transfer(archive_path, size, streams, rtt, window):
+    transfer_sock = transfer_funcs.TransferSocket("127.0.0.1", backlog=streams)
+    proxy = LatencyProxy(transfer_sock.port, rtt, window)
+    token = transfer_funcs.new_transfer_token()
+    ranges = transfer_funcs.split_ranges(0, size, streams)
+    received_path = archive_path + ".received"
+    open(received_path, "wb").close()
+
+    def host():
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            senders = []
+            for _ in ranges:
+                data_client = transfer_sock.accept_token("127.0.0.1", token, timeout=30)
+                index = transfer_funcs.RANGE_INDEX.unpack(transfer_funcs.receive_exactly(data_client, transfer_funcs.RANGE_INDEX.size))[0]
+                start, end = ranges[index]
+                senders.append(pool.submit(transfer_funcs.send_archive_range, data_client, archive_path, start, end))
+            for sender in senders:
+                sender.result()
+
+    def receive(index):
+        start, end = ranges[index]
+        with socket.create_connection(("127.0.0.1", proxy.port)) as data_sock:
+            data_sock.sendall(token.encode() + transfer_funcs.RANGE_INDEX.pack(index))
+            transfer_funcs.receive_range(data_sock, received_path, start, end)
+
+    try:
+        start_time = time.perf_counter()
+        host_thread = threading.Thread(target=host, daemon=True)
+        host_thread.start()
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            list(pool.map(receive, range(len(ranges))))
+        elapsed = time.perf_counter() - start_time
+        host_thread.join()
+        matches = transfer_funcs.file_sha256(received_path).hexdigest() == transfer_funcs.file_sha256(archive_path).hexdigest()
+        return elapsed, matches
+    finally:
+        proxy.close()
+        transfer_sock.close()
+        os.remove(received_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64, help="Size of the test archive.")
+    parser.add_argument("--rtt-ms", type=float, default=80, help="Simulated round trip time.")
+    parser.add_argument("--window-kb", type=int, default=256, help="Data each connection can have in flight.")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4, 8], help="Stream counts to compare.")
+    args = parser.parse_args()
+
+    size = args.size_mb * MB
+    with tempfile.TemporaryDirectory() as folder:
+        archive_path = os.path.join(folder, "world.zip")
+        with open(archive_path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(MB))
+
+        print(f"{args.size_mb} MB over a {args.rtt_ms:g} ms link with a {args.window_kb} KB window")
+        print(f"{'streams':>8} {'seconds':>9} {'MB/s':>8} {'checksum':>9}")
+        for streams in args.streams:
+            elapsed, matches = run_transfer(archive_path, size, streams, args.rtt_ms / 1000, args.window_kb * 1024)
+            print(f"{streams:>8} {elapsed:>9.2f} {args.size_mb / elapsed:>8.1f} {'ok' if matches else 'MISMATCH':>9}")
+
+
+if __name__ == "__main__":
+    main()
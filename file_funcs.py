@@ -6,6 +6,10 @@ import time
 import glob
 import subprocess
 import zipfile
+import zlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PyQt6.QtWidgets import QFileDialog, QProgressDialog, QApplication, QMessageBox
 from PyQt6.QtCore import QUrl
@@ -24,6 +28,10 @@ def get_appdata_path():
 APPDATA_PATH = get_appdata_path()
 MANAGER_SETTINGS = os.path.join(APPDATA_PATH, "manager_settings.json")
 COMMANDS = os.path.join(APPDATA_PATH, "commands.json")
+RESOURCE_CACHE = os.path.join(APPDATA_PATH, "resource_cache")
+# How often the GUI checks on a backup running in the background
+BACKUP_PUMP_INTERVAL = 0.05
+BACKUP_CHUNK_SIZE = 1024 * 1024
 
 def load_commands(file_lock):
     data = {
@@ -161,7 +169,7 @@ def update_settings(file_lock, ips, servers, server_path, worlds, world_order, d
                 }, f, indent=4)
     save_all_world_properties(server_path, worlds)
 
-def prepare_server_settings(world, version, gamemode, difficulty, fabric, level_type, server_path, log_queue, seed=None):
+def prepare_server_settings(world, version, gamemode, difficulty, fabric, level_type, server_path, log_queue, seed=None, resource_pack=None, pack_base_url=None):
     # Change the properties
     try:
         with open(os.path.join(server_path, "eula.txt"), 'r') as f:
@@ -197,6 +205,11 @@ def prepare_server_settings(world, version, gamemode, difficulty, fabric, level_
         found_whitelist = False
         found_view = False
         found_simulation = False
+        found_pack = False
+        found_pack_sha1 = False
+        hand_set_pack = False
+        # resource_pack is (url, sha1) when the manager serves the world's pack itself
+        pack_url, pack_sha1 = resource_pack or ("", "")
         for i, line in enumerate(lines):
             if line.startswith("level-name="):
                 lines[i] = f"level-name=worlds/{world}\n"
@@ -252,6 +265,22 @@ def prepare_server_settings(world, version, gamemode, difficulty, fabric, level_
             elif line.startswith("simulation-distance="):
                 lines[i] = f"simulation-distance={str(min(32, max(3, universal_settings.get("simulation distance")))) or "10"}\n"
                 found_simulation = True
+            elif line.startswith("resource-pack="):
+                # A pack set by hand is left alone, along with its sha1. An empty one or one the
+                # manager's pack server handed out for any world is replaced with this world's pack, if it has one
+                current_url = line.strip().split("=", 1)[1].replace("\\:", ":")
+                managed = bool(pack_base_url) and current_url.startswith(pack_base_url)
+                hand_set_pack = not managed and current_url != ""
+                if not hand_set_pack:
+                    lines[i] = f"resource-pack={pack_url.replace(":", "\\:")}\n"
+                found_pack = True
+            elif line.startswith("resource-pack-sha1="):
+                found_pack_sha1 = True
+        
+        if not hand_set_pack:
+            for i, line in enumerate(lines):
+                if line.startswith("resource-pack-sha1="):
+                    lines[i] = f"resource-pack-sha1={pack_sha1}\n"
         
         if not found_world:
             lines.append(f"level-name=worlds/{world}\n")
@@ -288,6 +317,10 @@ def prepare_server_settings(world, version, gamemode, difficulty, fabric, level_
             lines.append(f"view-distance=10\n")
         if not found_simulation:
             lines.append(f"simulation-distance=10\n")
+        if resource_pack and not found_pack:
+            lines.append(f"resource-pack={pack_url.replace(":", "\\:")}\n")
+        if resource_pack and not found_pack_sha1 and not hand_set_pack:
+            lines.append(f"resource-pack-sha1={pack_sha1}\n")
         
         with open(os.path.join(server_path, "server.properties"), 'w') as properties:
             properties.writelines(lines)
@@ -753,6 +786,14 @@ def format_size(bytes_size):
         size /= 1024
     return f"{size:.2f} PB"
 
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
 def get_total_size(path):
     total = 0
     for root, _, files in os.walk(path):
@@ -765,7 +806,7 @@ def get_disk_space(path):
     usage = shutil.disk_usage(os.path.dirname(path))
     return usage.free
 
-def backup_world(world_folder_path, backup_zip_path, parent, progress_function=None):
+def backup_world(world_folder_path, backup_zip_path, parent, progress_function=None, runner=None, job=None, manifest=None):
     os.makedirs(os.path.dirname(backup_zip_path), exist_ok=True)
     # World folder size
     total_size = get_total_size(world_folder_path)
@@ -804,32 +845,37 @@ def backup_world(world_folder_path, backup_zip_path, parent, progress_function=N
                              }""")
     dialog_box.setModal(True)
     
-    processed = 0
+    progress = queue.Queue()
+    cancelled = threading.Event()
     last_updated = time.time()
+    def pump():
+        nonlocal last_updated
+        while not progress.empty():
+            processed, name = progress.get_nowait()
+            dialog_box.setLabelText("Copying files...<br>" + name)
+            dialog_box.setValue(processed)
+            if progress_function and time.time() - last_updated >= 0.1:
+                last_updated = time.time()
+                progress_function(processed, name)
+        QApplication.processEvents()
+        if dialog_box.wasCanceled() and not cancelled.is_set():
+            cancelled.set()
+            dialog_box.setCancelButton(None)
+            dialog_box.setLabelText("Cancelling...")
+
     try:
-        with zipfile.ZipFile(backup_zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
-            for root, _, files in os.walk(world_folder_path):
-                for name in files:
-                    dialog_box.setLabelText("Copying files...<br>" + name)
-                    full_path = os.path.join(root, name)
-                    arcname = os.path.relpath(full_path, world_folder_path)
-                    try:
-                        zf.write(full_path, arcname)
-                    except RuntimeError:
-                        dialog_box.cancel()
-                    
-                    QApplication.processEvents()
-                    if dialog_box.wasCanceled():
-                        dialog_box.setCancelButton(None)
-                        dialog_box.setLabelText("Cancelling...")
-                        raise RuntimeError("Backup cancelled")
-
-                    processed += 1
-                    dialog_box.setValue(processed)
-                    if progress_function and time.time() - last_updated >= 0.1:
-                        last_updated = time.time()
-                        progress_function(processed, name)
-        
+        if runner:
+            # The whole zip is one job on a background priority thread under the maintenance I/O limit
+            future = runner.submit(job, write_backup_zip, world_folder_path, backup_zip_path, progress, cancelled, runner.throttle_for(job), manifest)
+            runner.wait(future, pump, BACKUP_PUMP_INTERVAL)
+        else:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                future = pool.submit(write_backup_zip, world_folder_path, backup_zip_path, progress, cancelled, None, manifest)
+                while not future.done():
+                    pump()
+                    time.sleep(BACKUP_PUMP_INTERVAL)
+                future.result()
+        pump()
         return True
     except RuntimeError:
         if os.path.exists(backup_zip_path):
@@ -839,6 +885,33 @@ def backup_world(world_folder_path, backup_zip_path, parent, progress_function=N
     except Exception as e:
         return False
 
+def write_backup_zip(world_folder_path, backup_zip_path, progress, cancelled, throttle=None, manifest=None):
+    """Zips the world off the GUI thread, putting (processed, name) on progress after each file.
+    Raises RuntimeError once cancelled is set. If given, manifest is filled with each entry's
+    [crc, size] worked out from the world file itself as it is read."""
+    processed = 0
+    with zipfile.ZipFile(backup_zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for root, _, files in os.walk(world_folder_path):
+            for name in files:
+                if cancelled.is_set():
+                    raise RuntimeError("Backup cancelled")
+                full_path = os.path.join(root, name)
+                if throttle:
+                    throttle(os.path.getsize(full_path))
+                info = zipfile.ZipInfo.from_file(full_path, os.path.relpath(full_path, world_folder_path))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                crc = 0
+                size = 0
+                with open(full_path, "rb") as source, zf.open(info, "w") as entry:
+                    while chunk := source.read(BACKUP_CHUNK_SIZE):
+                        crc = zlib.crc32(chunk, crc)
+                        size += len(chunk)
+                        entry.write(chunk)
+                if manifest is not None:
+                    manifest[info.filename] = [crc, size]
+                processed += 1
+                progress.put((processed, name))
+
 
 def get_folder_layout_version(world_path, log_queue):
     if os.path.isdir(os.path.join(world_path, "region")):
@@ -0,0 +1,287 @@
+import json
+import time
+import asyncio
+import itertools
+import threading
+from typing import NamedTuple
+from collections import deque
+import protocol
+import state_sync
+
+MANAGER_PORT = 5555
+SERVER_MARKER = b"SERVER-MESSAGE~~>"
+CLIENT_MARKER = "CLIENT-MESSAGE~~>"
+CONNECT_TIMEOUT = 5
+PING_INTERVAL = 5
+# How long to wait for a host to answer a state subscription before asking for everything the old way
+LEGACY_STATE_DELAY = 2
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+CHAT_HISTORY = 200
+READ_SIZE = 65536
+
+
+class LinkView(NamedTuple):
+    """A copy of what a link knows, made on the pool's loop so other threads can read it safely."""
+    ip: str
+    connected: bool
+    status: tuple
+    players: tuple
+    chat: tuple
+    latency: float | None
+
+
+def parse_server_message(text):
+    """Turns a message from before framing was negotiated into the frame it would have been sent as."""
+    if text.startswith("DATA-RETURN"):
+        data = text.split("~~>")
+        key, args = data[0][data[0].find("(")+1:data[0].find(")")], json.loads(data[1])
+        return protocol.Frame(protocol.DATA, 0, (key, args))
+    return protocol.Frame(protocol.TEXT, 0, text)
+
+
+class HostLink:
+    """A live connection to one host that follows its status, players and chat, and reconnects
+    by itself if the connection drops. Everything but the read only attributes runs on the pool's loop."""
+    def __init__(self, pool: "HostPool", ip, port, name):
+        self.pool = pool
+        self.ip = ip
+        self.port = port
+        self.name = name
+        self.connected = False
+        self.framed = False
+        self.mirror = state_sync.StateMirror()
+        self.status = ["pinging", "", ""]
+        self.players = []
+        self.latency = None
+        self.chat = deque(maxlen=CHAT_HISTORY)
+        self.writer = None
+        self.task = None
+        self.request_ids = itertools.count(1)
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        attempt = 0
+        while True:
+            try:
+                await self.session()
+                attempt = 0
+            except (OSError, asyncio.TimeoutError, protocol.ProtocolError, ValueError):
+                pass
+            finally:
+                if self.connected:
+                    self.connected = False
+                    self.status = ["pinging", "", ""]
+                    self.players = []
+                    self.latency = None
+                    self.pool.notify(self, {"connection", "status", "players"})
+                # The status was cleared, so the next subscription's answer has to draw everything again
+                self.mirror.synced = False
+                self.framed = False
+                self.writer = None
+            await asyncio.sleep(RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)])
+            attempt += 1
+
+    async def session(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.ip, self.port), CONNECT_TIMEOUT)
+        try:
+            writer.write(b"connection request")
+            reply = await asyncio.wait_for(reader.read(1024), CONNECT_TIMEOUT)
+            if reply == b"identify":
+                writer.write(f"{CLIENT_MARKER}{self.name}".encode("utf-8"))
+            elif reply != b"accept":
+                # Counts as a failure, so a host that keeps turning this computer away is retried less often
+                raise ConnectionRefusedError("The host turned the connection down")
+
+            self.writer = writer
+            self.connected = True
+            self.pool.notify(self, {"connection"})
+            # Hosts from before framing ignore the request and keep using the old messages
+            self.request(protocol.FRAMING_REQUEST, str(protocol.VERSION))
+            self.request("subscribe-state", self.mirror.id, str(self.mirror.version))
+            keep_alive = asyncio.create_task(self.keep_alive())
+            try:
+                decoder = protocol.MixedDecoder(SERVER_MARKER, b"\n")
+                while data := await reader.read(READ_SIZE):
+                    decoder.feed(data)
+                    for frame in decoder.frames():
+                        self.handle(frame)
+            finally:
+                keep_alive.cancel()
+        finally:
+            writer.close()
+
+    async def keep_alive(self):
+        await asyncio.sleep(LEGACY_STATE_DELAY)
+        if not self.mirror.synced:
+            # Hosts from before state syncing ignore the subscription
+            self.request("get-status")
+            self.request("get-players")
+        while True:
+            self.request("ping", f"{time.perf_counter():.6f}")
+            await asyncio.sleep(PING_INTERVAL)
+
+    def handle(self, frame: protocol.Frame):
+        if frame.kind == protocol.LEGACY:
+            frame = parse_server_message(frame.body)
+        elif frame.kind == protocol.DATA:
+            frame = protocol.Frame(protocol.DATA, frame.request_id, (frame.body["topic"], frame.body["data"]))
+
+        if frame.kind == protocol.TEXT:
+            self.chat.append((time.time(), frame.body))
+            self.pool.notify(self, {"chat"})
+        elif frame.kind == protocol.DATA:
+            self.handle_data(*frame.body)
+
+    def handle_data(self, key, args):
+        if key == protocol.FRAMING_TOPIC:
+            self.framed = True
+        elif key == "status":
+            self.status = args
+            if args[0] != "online":
+                self.players = []
+            self.pool.notify(self, {"status", "players"})
+        elif key == "players":
+            self.players = args
+            self.pool.notify(self, {"players"})
+        elif key == "state-snapshot":
+            self.render_state(self.mirror.load(args))
+        elif key == "state-diff":
+            resumed = not self.mirror.synced
+            changed = self.mirror.apply(args)
+            if changed is None:
+                # Missed a change, so start again from a full copy
+                self.mirror = state_sync.StateMirror()
+                self.request("subscribe-state", "", "0")
+            else:
+                self.render_state(set(self.mirror.values) if resumed else changed)
+        elif key == "pong":
+            self.latency = (time.perf_counter() - float(args[0])) * 1000
+            self.pool.notify(self, {"latency"})
+        elif key == "closing":
+            self.writer.close()
+
+    def view(self):
+        return LinkView(self.ip, self.connected, tuple(self.status), tuple(self.players), tuple(self.chat), self.latency)
+
+    def render_state(self, names):
+        values = self.mirror.values
+        if "status" in names:
+            status = values["status"]
+            self.status = [status["status"], status["version"], status["world"]]
+        if names & {"status", "players"}:
+            self.players = list(values.get("players", [])) if self.status[0] == "online" else []
+            self.pool.notify(self, {"status", "players"})
+
+    def send(self, message):
+        if self.writer is None:
+            return
+        if self.framed:
+            self.writer.write(protocol.encode_frame(protocol.TEXT, 0, message))
+        else:
+            self.writer.write(f"{CLIENT_MARKER}{message}".encode("utf-8"))
+
+    def request(self, topic, *args):
+        if self.writer is None:
+            return
+        if self.framed:
+            self.writer.write(protocol.encode_request(next(self.request_ids) % 2**32, topic, args))
+            return
+        self.send(f"MANAGER-REQUEST~~>{','.join((topic, *args))}")
+
+    def close(self):
+        self.request("closing")
+        if self.task:
+            self.task.cancel()
+        if self.writer:
+            self.writer.close()
+
+
+class HostPool:
+    """Keeps a HostLink open to each of several hosts from one background event loop, so any of
+    them can be shown or chatted with straight away. on_update(ip, names) is called from the loop's
+    thread with the names of what changed: connection, status, players, chat or latency. Other
+    threads read a host's latest LinkView from view(ip), never the link itself."""
+    def __init__(self, on_update):
+        self.on_update = on_update
+        self.links = {}
+        self.views = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="host-links", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        with self.lock:
+            links = list(self.links.values())
+            self.links.clear()
+            self.views.clear()
+        for link in links:
+            self.loop.call_soon_threadsafe(link.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(1)
+        self.thread = None
+
+    def link(self, ip) -> HostLink | None:
+        with self.lock:
+            return self.links.get(ip)
+
+    def view(self, ip) -> LinkView | None:
+        with self.lock:
+            return self.views.get(ip)
+
+    def sync(self, ips, name, port=MANAGER_PORT):
+        """Connects to each host in ips that isn't connected yet and closes links to any others."""
+        self.start()
+        with self.lock:
+            removed = [link for ip, link in self.links.items() if ip not in ips]
+            added = [HostLink(self, ip, port, name) for ip in ips if ip not in self.links]
+            for link in removed:
+                del self.links[link.ip]
+                self.views.pop(link.ip, None)
+            for link in added:
+                self.links[link.ip] = link
+            for link in self.links.values():
+                # Only used by hosts that haven't seen this computer before
+                link.name = name
+        for link in removed:
+            self.loop.call_soon_threadsafe(link.close)
+        for link in added:
+            self.loop.call_soon_threadsafe(link.start)
+
+    def disconnect(self, ip):
+        with self.lock:
+            link = self.links.pop(ip, None)
+            self.views.pop(ip, None)
+        if link:
+            self.loop.call_soon_threadsafe(link.close)
+
+    def send_chat(self, ip, message):
+        link = self.link(ip)
+        if link:
+            self.loop.call_soon_threadsafe(link.send, message)
+
+    def request(self, ip, topic, *args):
+        link = self.link(ip)
+        if link:
+            self.loop.call_soon_threadsafe(link.request, topic, *args)
+
+    def notify(self, link: HostLink, names):
+        view = link.view()
+        with self.lock:
+            if self.links.get(link.ip) is not link:
+                return
+            self.views[link.ip] = view
+        try:
+            self.on_update(link.ip, names)
+        except Exception:
+            pass
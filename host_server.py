@@ -0,0 +1,430 @@
+import json
+import socket
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import protocol
+import request_limits
+
+CLIENT_MARKER = "CLIENT-MESSAGE~~>"
+REQUEST_PREFIX = "MANAGER-REQUEST~~>"
+PING_REQUEST = REQUEST_PREFIX + "ping"
+FRAMING_REQUEST = REQUEST_PREFIX + protocol.FRAMING_REQUEST
+READ_SIZE = 65536
+INTENTION_TIMEOUT = 10
+SEND_CHUNK_SIZE = 256 * 1024
+HANDLER_THREADS = 16
+# Older clients read the handshake reply with a single recv, so nothing else may arrive in the same read
+HANDSHAKE_GAP = 0.2
+# Each client's outbox. Past the soft limit the client has SLOW_CLIENT_TIMEOUT seconds to catch up
+MAX_QUEUED_BYTES = 1024 * 1024
+HARD_QUEUED_BYTES = 8 * 1024 * 1024
+SLOW_CLIENT_TIMEOUT = 15
+BACKLOG_CHECK_INTERVAL = 1
+# Updates where only the newest one is worth sending
+COALESCED_TOPICS = {"status", "players", "worlds-list", "transfer-progress"}
+
+# The request a worker thread is handling, so replies to it carry its request id
+handling = threading.local()
+
+
+class OutgoingMessage:
+    __slots__ = ("topic", "data")
+
+    def __init__(self, topic, data):
+        self.topic = topic
+        self.data = data
+
+
+class ClientConnection:
+    """One connected manager client. Request handlers run on worker threads and use it like the
+    socket it replaces: sendall, getpeername and close are all safe to call from any thread.
+
+    Nothing sent to a client ever blocks the sender. Messages go into the client's own bounded
+    outbox, which a writer task on the loop empties as fast as the client reads. While a client
+    is behind, a newer status style update replaces the one still waiting, and a client that stays
+    over the limit for too long is disconnected.
+
+    Messages are encoded as they are queued on the loop, so everything queued before the client
+    switches to framing still goes out in the old format."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        self.address = writer.get_extra_info("peername")[:2]
+        self.closed = False
+        self.framed = False
+        self.outbox = deque()
+        self.queued = {}
+        self.queued_bytes = 0
+        self.over_limit_since = None
+        self.ready = asyncio.Event()
+        self.emptied = asyncio.Event()
+        self.emptied.set()
+        self.writer_task = None
+
+    def getpeername(self):
+        return self.address
+
+    def on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def call_on_loop(self, function, *args):
+        if self.closed:
+            raise ConnectionResetError("The client has disconnected")
+        self.call_soon(function, *args)
+
+    def sendall(self, data: bytes):
+        self.call_on_loop(self.enqueue, None, bytes(data))
+
+    def send_text(self, text):
+        self.call_on_loop(self.queue_message, protocol.TEXT, 0, text)
+
+    def send_data(self, topic, data):
+        request = getattr(handling, "request", None)
+        request_id = request[1] if request and request[0] is self else 0
+        self.call_on_loop(self.queue_message, protocol.DATA, request_id, (topic, data))
+
+    def queue_message(self, kind, request_id, body):
+        topic = None
+        if kind == protocol.DATA:
+            topic, data = body
+            if self.framed:
+                encoded = protocol.encode_data(request_id, topic, data)
+            else:
+                encoded = f"SERVER-MESSAGE~~>DATA-RETURN({topic})~~>{json.dumps(data)}\n".encode("utf-8")
+        elif self.framed:
+            encoded = protocol.encode_frame(kind, request_id, body)
+        else:
+            encoded = f"SERVER-MESSAGE~~>{body}\n".encode("utf-8")
+        self.enqueue(topic if topic in COALESCED_TOPICS else None, encoded)
+
+    def enqueue(self, topic, data: bytes):
+        if self.closed or self.writer.is_closing():
+            return
+        waiting = self.queued.get(topic) if topic else None
+        if waiting is not None:
+            # Only the newest status matters to a client that hasn't read the last one yet
+            self.queued_bytes -= len(waiting.data)
+            self.outbox.remove(waiting)
+        message = OutgoingMessage(topic, data)
+        self.outbox.append(message)
+        self.queued_bytes += len(data)
+        if topic:
+            self.queued[topic] = message
+        self.emptied.clear()
+        self.ready.set()
+        self.check_backlog()
+
+    def check_backlog(self):
+        if self.queued_bytes <= MAX_QUEUED_BYTES:
+            self.over_limit_since = None
+            return
+        now = self.loop.time()
+        if self.over_limit_since is None:
+            self.over_limit_since = now
+        if self.queued_bytes > HARD_QUEUED_BYTES or now - self.over_limit_since > SLOW_CLIENT_TIMEOUT:
+            self.close(abort=True)
+
+    def start_writer(self):
+        self.writer_task = asyncio.create_task(self.write_outbox())
+
+    async def write_outbox(self):
+        try:
+            while not self.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.outbox and not self.closed:
+                    message = self.outbox.popleft()
+                    if self.queued.get(message.topic) is message:
+                        del self.queued[message.topic]
+                    self.queued_bytes -= len(message.data)
+                    self.writer.write(message.data)
+                    await self.wait_for_client()
+                    self.check_backlog()
+                if not self.outbox:
+                    self.emptied.set()
+        except (ConnectionError, OSError):
+            self.close()
+
+    async def wait_for_client(self):
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.writer.drain(), BACKLOG_CHECK_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                self.check_backlog()
+
+    async def flush(self):
+        await self.emptied.wait()
+        await self.writer.drain()
+
+    def drain(self):
+        """Blocks a worker thread until everything queued so far has been handed to the OS."""
+        if self.closed:
+            raise ConnectionResetError("The client has disconnected")
+        asyncio.run_coroutine_threadsafe(self.flush(), self.loop).result()
+
+    def send_file(self, path, throttle=None):
+        with open(path, "rb") as f:
+            while data := f.read(SEND_CHUNK_SIZE):
+                if throttle:
+                    throttle(len(data))
+                self.sendall(data)
+                self.drain()
+
+    def close(self, abort=False):
+        """Closes the connection once what has already been written is sent. Aborting drops it
+        straight away instead, for clients that have stopped reading."""
+        if self.closed:
+            if abort:
+                self.call_soon(self.writer.transport.abort)
+            return
+        self.closed = True
+        self.call_soon(self.shut, abort)
+
+    def call_soon(self, function, *args):
+        if self.on_loop():
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
+
+    def shut(self, abort=False):
+        if abort:
+            self.writer.transport.abort()
+        else:
+            self.writer.close()
+        # Wakes anything waiting on the outbox so it sees the client is gone
+        self.ready.set()
+        self.emptied.set()
+        self.outbox.clear()
+        self.queued.clear()
+
+
+class HostServer:
+    """Accepts manager clients on a single asyncio event loop, with one task per connection.
+    Messages from a client are handled one at a time on worker threads, so a slow request
+    doesn't hold up the loop or anyone else.
+
+    Clients start out with the marker separated text messages every version understands, and
+    newer ones then ask to switch to length prefixed frames (see protocol.py).
+
+    The handler is the host app, which provides client_name(ip), name_client(client, name),
+    client_joined(client), handle_chat(client, message), handle_request(client, request, args)
+    and client_left(client).
+
+    With a limiter, requests and chat over a client's limits are dropped before they reach a
+    worker thread, except for requests where only the newest matters. The newest of each of
+    those is held back and handled once the client is allowed to make it again."""
+    def __init__(self, handler, limiter: request_limits.RequestLimiter = None):
+        self.handler = handler
+        self.limiter = limiter
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.connections = set()
+        self.tasks = set()
+        self.executor = None
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, host_ip, port):
+        """Binds and starts serving. Returns False if the address can't be used."""
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=HANDLER_THREADS, thread_name_prefix="client")
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.handle_connection, host_ip, port, limit=READ_SIZE))
+        except OSError:
+            self.loop.close()
+            self.executor.shutdown(wait=False)
+            return False
+        self.thread = threading.Thread(target=self.loop.run_forever, name="host-server", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self, timeout=2.0):
+        if not self.running():
+            return
+
+        async def shut_down():
+            self.server.close()
+            for connection in list(self.connections):
+                connection.close()
+            # Lets each connection say goodbye through the handler before the loop stops
+            if self.tasks:
+                _, stuck = await asyncio.wait(list(self.tasks), timeout=timeout)
+                if stuck:
+                    # Clients that aren't reading never let a closing connection finish sending
+                    for connection in list(self.connections):
+                        connection.close(abort=True)
+                    await asyncio.wait(stuck, timeout=timeout)
+
+        try:
+            asyncio.run_coroutine_threadsafe(shut_down(), self.loop).result(timeout * 3)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.executor.shutdown(wait=False)
+        self.thread = None
+        if not self.loop.is_running():
+            self.loop.close()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = ClientConnection(reader, writer, asyncio.get_running_loop())
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            # Clients check the host is up by connecting and closing again, so only a request is served
+            intention = await asyncio.wait_for(reader.read(1024), INTENTION_TIMEOUT)
+            if intention.decode("utf-8", "replace") != "connection request":
+                return
+
+            client.start_writer()
+            decoder = protocol.MixedDecoder(CLIENT_MARKER.encode("utf-8"))
+            pending = await self.identify(client, decoder)
+            if pending is None:
+                return
+
+            self.connections.add(client)
+            await self.run_handler(self.handler.client_joined, client)
+            try:
+                await self.receive_messages(client, decoder, pending)
+            finally:
+                self.connections.discard(client)
+                await self.run_handler(self.handler.client_left, client)
+        except (asyncio.TimeoutError, ConnectionError, OSError, protocol.ProtocolError):
+            pass
+        except Exception as e:
+            print(e)
+        finally:
+            client.close()
+            if self.limiter:
+                self.limiter.forget(client)
+            if client.writer_task:
+                await asyncio.gather(client.writer_task, return_exceptions=True)
+
+    async def identify(self, client: ClientConnection, decoder):
+        """Names the client, asking for a name if its address hasn't been seen before.
+        Returns any messages that arrived along with the name, or None if the client left."""
+        name = self.handler.client_name(client.address[0])
+        if name is not None:
+            self.handler.name_client(client, name)
+            client.sendall(b"accept")
+            await client.flush()
+            await asyncio.sleep(HANDSHAKE_GAP)
+            return []
+
+        client.sendall(b"identify")
+        while True:
+            data = await client.reader.read(READ_SIZE)
+            if not data:
+                return None
+            # The name is always sent before framing is negotiated
+            decoder.feed(data)
+            messages = decoder.decode()
+            if messages:
+                await self.run_handler(self.handler.name_client, client, messages[0].body)
+                return messages[1:]
+
+    async def receive_messages(self, client: ClientConnection, decoder: protocol.MixedDecoder, pending):
+        """Reads messages while earlier ones are still being handled, so pings are answered straight away."""
+        messages = asyncio.Queue()
+        dispatcher = asyncio.create_task(self.dispatch(client, messages))
+        # Held back requests by type, and the timers that retry them
+        deferred = {}
+        retries = {}
+
+        def retry(request):
+            del retries[request]
+            if self.limiter.allow(client, request):
+                messages.put_nowait(deferred.pop(request))
+            else:
+                retries[request] = client.loop.call_later(self.limiter.retry_delay(client, request), retry, request)
+
+        try:
+            while not dispatcher.done():
+                for frame in pending:
+                    if frame.kind == protocol.LEGACY:
+                        frame = self.parse_legacy(frame.body)
+                        if frame is None:
+                            continue
+                    elif frame.kind == protocol.REQUEST:
+                        frame = protocol.Frame(protocol.REQUEST, frame.request_id, self.request_body(frame))
+                    if frame.kind == protocol.TEXT and frame.body == "CLOSING":
+                        return
+                    if frame.kind == protocol.REQUEST and frame.body[0] == "ping":
+                        # Answered from the loop, so the reading reflects the network and not the handlers
+                        client.queue_message(protocol.DATA, frame.request_id, ("pong", frame.body[1][:1]))
+                    elif frame.kind == protocol.REQUEST and frame.body[0] == protocol.FRAMING_REQUEST:
+                        # The acknowledgement is the last message sent in the old format
+                        client.queue_message(protocol.DATA, 0, (protocol.FRAMING_TOPIC, [protocol.VERSION]))
+                        client.framed = True
+                    elif self.limiter and not self.limiter.allow(client, frame.body[0] if frame.kind == protocol.REQUEST else "chat"):
+                        if frame.kind == protocol.REQUEST and frame.body[0] in request_limits.LATEST_WINS_REQUESTS:
+                            deferred[frame.body[0]] = frame
+                            if frame.body[0] not in retries:
+                                retries[frame.body[0]] = client.loop.call_later(self.limiter.retry_delay(client, frame.body[0]), retry, frame.body[0])
+                        elif self.limiter.should_notify(client):
+                            client.send_text(request_limits.LIMIT_MESSAGE)
+                    else:
+                        messages.put_nowait(frame)
+
+                data = await client.reader.read(READ_SIZE)
+                if not data or client.closed:
+                    return
+                decoder.feed(data)
+                pending = decoder.decode()
+        finally:
+            for timer in retries.values():
+                timer.cancel()
+            messages.put_nowait(None)
+            await dispatcher
+
+    @staticmethod
+    def parse_legacy(message):
+        """Turns an old style message into the frame a newer client would have sent for it.
+        Older clients don't end their messages, so each one runs to the next marker or the end of a read."""
+        if not message:
+            return None
+        if not message.startswith(REQUEST_PREFIX):
+            return protocol.Frame(protocol.TEXT, 0, message)
+        request, *args = message.split("~~>")[-1].split(",")
+        return protocol.Frame(protocol.REQUEST, 0, (request, args))
+
+    @staticmethod
+    def request_body(frame):
+        if isinstance(frame.body, tuple):
+            return frame.body
+        if isinstance(frame.body, dict) and isinstance(frame.body.get("topic"), str) and isinstance(frame.body.get("args", []), list):
+            return frame.body["topic"], [str(arg) for arg in frame.body.get("args", [])]
+        raise protocol.ProtocolError("Badly formed request")
+
+    async def dispatch(self, client: ClientConnection, messages: asyncio.Queue):
+        # One message at a time, so a client's requests are handled in the order it sent them
+        while (frame := await messages.get()) is not None:
+            if not client.closed:
+                await self.run_handler(self.handle_frame, client, frame)
+
+    def handle_frame(self, client: ClientConnection, frame: protocol.Frame):
+        if frame.kind == protocol.TEXT:
+            if isinstance(frame.body, str):
+                self.handler.handle_chat(client, frame.body)
+        elif frame.kind == protocol.REQUEST:
+            handling.request = (client, frame.request_id)
+            try:
+                self.handler.handle_request(client, *frame.body)
+            finally:
+                handling.request = None
+
+    async def run_handler(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MB = 1024 * 1024
+DEFAULT_MAINTENANCE = {"workers": 2, "io limit mb": 32, "memory limit percent": 90}
+BACKOFF_SECONDS = 30
+BACKOFF_DIVISOR = 4
+BACKOFF_RATE = 8 * MB # Used while backing off when there is no I/O limit set
+REPORT_AFTER = 1.0
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+# ioprio_set isn't wrapped by os, so it is called by number, which differs between architectures
+IOPRIO_SYSCALLS = {"x86_64": 251, "aarch64": 30, "i386": 289, "i686": 289, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_LOWEST_BEST_EFFORT = (2 << 13) | 7
+
+
+def lower_thread_priority():
+    """Drops the calling thread to background CPU and I/O priority."""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN)
+        elif hasattr(os, "setpriority"):
+            # Linux applies nice values per thread
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+            if sys.platform.startswith("linux"):
+                lower_thread_io_priority()
+    except (OSError, AttributeError):
+        pass
+
+
+def lower_thread_io_priority():
+    """Nice values only cover the CPU on Linux, so the I/O priority is lowered separately."""
+    import ctypes
+    import platform
+    number = IOPRIO_SYSCALLS.get(platform.machine())
+    if number is None:
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.syscall(number, IOPRIO_WHO_PROCESS, threading.get_native_id(), IOPRIO_LOWEST_BEST_EFFORT)
+
+
+class TokenBucket:
+    """Limits a stream of work to a number of bytes per second, shared between any threads using it."""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.capacity = rate
+            self.tokens = min(self.tokens, self.capacity)
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def reserve(self, amount):
+        """Takes the tokens for amount now and returns how long the caller should wait before using them."""
+        with self.lock:
+            if not self.rate:
+                return 0
+            self.refill()
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def take(self, amount=1):
+        """Takes the tokens only if they are all available, for callers that turn work away instead of waiting."""
+        with self.lock:
+            if not self.rate:
+                return True
+            self.refill()
+            if self.tokens < amount:
+                return False
+            self.tokens -= amount
+            return True
+
+    def wait_time(self, amount=1):
+        """How long until take(amount) would succeed."""
+        with self.lock:
+            if not self.rate:
+                return 0
+            self.refill()
+            return max(0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount, wait=time.sleep):
+        delay = self.reserve(amount)
+        if delay > 0:
+            wait(delay)
+        return delay
+
+    __call__ = consume
+
+
+class MaintenanceRunner:
+    """Runs backup, pruning and transfer work on low priority threads under a shared I/O budget,
+    slowing down further while the server is short on memory or falling behind."""
+    def __init__(self, settings: dict = None, log_function=None):
+        self.log_function = log_function
+        self.lock = threading.Lock()
+        self.active = set()
+        self.throttled = {}
+        self.backoff_until = 0
+        self.backoff_reason = None
+        self.workers = 0
+        self.pool = None
+        self.bucket = TokenBucket(0)
+        self.backoff_bucket = TokenBucket(BACKOFF_RATE)
+        self.configure(settings or DEFAULT_MAINTENANCE)
+
+    def configure(self, settings: dict):
+        workers = max(1, int(settings.get("workers", DEFAULT_MAINTENANCE["workers"])))
+        io_limit = int(float(settings.get("io limit mb", DEFAULT_MAINTENANCE["io limit mb"])) * MB)
+        self.memory_limit = settings.get("memory limit percent", DEFAULT_MAINTENANCE["memory limit percent"])
+        self.bucket.set_rate(io_limit)
+        self.backoff_bucket.set_rate(io_limit // BACKOFF_DIVISOR if io_limit else BACKOFF_RATE)
+        if workers != self.workers:
+            old_pool = self.pool
+            self.workers = workers
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="maintenance", initializer=lower_thread_priority)
+            if old_pool:
+                old_pool.shutdown(wait=False)
+
+    def back_off(self, reason, seconds=BACKOFF_SECONDS):
+        with self.lock:
+            starting = time.monotonic() >= self.backoff_until
+            self.backoff_until = time.monotonic() + seconds
+            self.backoff_reason = reason
+            active = sorted(self.active)
+        if starting and active and self.log_function:
+            self.log_function(f"<font color='orange'>Slowing down {', '.join(active)} because of {reason}.</font>")
+
+    def report_memory(self, used_percent, server_percent):
+        if used_percent is not None and used_percent >= self.memory_limit:
+            self.back_off("high memory usage")
+        elif server_percent is not None and server_percent >= self.memory_limit:
+            self.back_off("high server memory usage")
+
+    def report_lag(self, ms_behind):
+        self.back_off(f"server lag ({ms_behind}ms behind)")
+
+    def throttle(self, amount, job=None):
+        with self.lock:
+            backing_off = time.monotonic() < self.backoff_until
+            reason = self.backoff_reason if backing_off else "I/O limit"
+        delay = self.bucket.reserve(amount)
+        if backing_off:
+            delay = max(delay, self.backoff_bucket.reserve(amount))
+        if delay > 0:
+            if job:
+                # Waits on parallel workers overlap, so only count time not already covered
+                start = time.monotonic()
+                with self.lock:
+                    entry = self.throttled.setdefault(job, [0, reason, 0])
+                    entry[0] += max(0, start + delay - max(start, entry[2]))
+                    entry[2] = max(entry[2], start + delay)
+                    if backing_off:
+                        entry[1] = reason
+            time.sleep(delay)
+        return delay
+
+    def throttle_for(self, job):
+        return lambda amount: self.throttle(amount, job)
+
+    def start(self, job):
+        with self.lock:
+            self.active.add(job)
+
+    def finish(self, job):
+        """Forgets the job and reports how long it was held back, if it was noticeable."""
+        with self.lock:
+            self.active.discard(job)
+            seconds, reason, _ = self.throttled.pop(job, (0, None, 0))
+        if seconds >= REPORT_AFTER and self.log_function:
+            self.log_function(f"{job[0].upper() + job[1:]} was slowed down for {round(seconds)}s ({reason}).")
+        return seconds
+
+    def submit(self, job, function, *args, io_bytes=0):
+        def run():
+            if io_bytes:
+                self.throttle(io_bytes, job)
+            return function(*args)
+        return self.pool.submit(run)
+
+    def wait(self, future, pump, interval=0.01):
+        """Waits on a job from the GUI thread, calling pump to keep it responsive."""
+        while not future.done():
+            pump()
+            time.sleep(interval)
+        return future.result()
+
+    def map(self, job, function, items, pump, size=None):
+        """Runs function over items on the worker threads, yielding results in order.
+        Stopping early cancels the items that have not started yet."""
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(self.submit(job, function, item, io_bytes=size(item) if size else 0))
+                if len(pending) >= self.workers * 2:
+                    yield self.wait(pending.popleft(), pump)
+            while pending:
+                yield self.wait(pending.popleft(), pump)
+        finally:
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                while not future.done():
+                    pump()
+                    time.sleep(0.01)
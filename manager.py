@@ -1,24 +1,43 @@
 import sys
 import socket
+import selectors
 import queue
 import time
 import threading
 import json
+import html
 import os
+import hashlib
+import shutil
+import itertools
 import winreg
 import subprocess
 import manager_host
 import file_funcs
+import transfer_funcs
+import protocol
+import state_sync
+import status_probe
+import host_links
 from queries import latest_app_info
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QStackedLayout, QGridLayout, QWidget, QTextBrowser, QProgressBar, QSizePolicy, QCheckBox, QMessageBox, QProgressDialog, QScrollArea, QListWidget, QAbstractItemView, QListWidgetItem
 from PyQt6.QtGui import QFont, QIcon, QPixmap, QPainter, QPaintEvent, QDesktopServices
-from PyQt6.QtCore import Qt, QRect, QThread, pyqtSignal, QObject, QUrl, QCoreApplication
+from PyQt6.QtCore import Qt, QRect, QThread, pyqtSignal, QObject, QUrl, QCoreApplication, QTimer
 
 VERSION = "v2.10.14"
 DEBUG_LOGS = False
 
 KEY_PATH = "Software\\MinecraftManager"
+TRANSFER_STREAM_CHOICES = [1, 2, 4, 8]
+PING_INTERVAL = 5000
+# How long to wait for a host to answer a state subscription before asking for everything the old way
+LEGACY_STATE_DELAY = 2000
+SERVER_MARKER = b"SERVER-MESSAGE~~>"
+RECEIVE_SIZE = 65536
+# How often the receive loop looks up from waiting to check whether it should stop
+RECEIVE_WAIT = 0.5
 
 if getattr(sys, "frozen", False):
     BASE_DIR = Path(sys.executable).parent
@@ -65,40 +84,6 @@ class ConnectionWorker(QObject):
         except:
             self.connection_failure.emit()
 
-class StatusWorker(QObject):
-    manager_status_result = pyqtSignal(bool)
-    server_status_result = pyqtSignal(bool, str, str, int, int)
-
-    def __init__(self, ip, port):
-        super().__init__()
-        self.ip = ip
-        self.port = port
-    
-    def check_status(self):
-        try:
-            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client.settimeout(1.0)
-            client.connect((self.ip, self.port))
-            client.close()
-            self.manager_status_result.emit(True)
-        except (socket.timeout, socket.error):
-            self.manager_status_result.emit(False)
-        
-        try:
-            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client.settimeout(2.0)
-            client.connect((self.ip, 5676))
-            data = client.recv(1024).decode("utf-8")
-            client.close()
-            response = json.loads(data)
-            self.server_status_result.emit(response["status"],
-                                           response["world"]["name"],
-                                           response["world"]["version"],
-                                           response["players"]["online"],
-                                           response["players"]["max"])
-        except (socket.timeout, socket.error, json.JSONDecodeError):
-            self.server_status_result.emit(False, "", "", 0, 0)
-
 class ServerButton(QPushButton):
     connect_to_server = pyqtSignal(str)
 
@@ -172,45 +157,23 @@ class ServerButton(QPushButton):
             self.server_label.setStyleSheet("color: #8e0e1b; font-size: 14px; font-weight: bold; border: none;")
             self.player_label.setText("- / -")
     
-    def get_info_status(self):
+    def get_info_status(self, cached: status_probe.ProbeResult | None = None):
+        # The last known status stays up while the host is checked again
+        if cached is not None:
+            self.set_probe_result(cached)
+            return
         self.setDisabled(True)
         self.manager_status_label.setText("Pinging...")
         self.manager_status_label.setStyleSheet("color: #ffcdcd; font-weight: bold; border: none;")
         self.server_label.setText("Pinging...")
         self.server_label.setStyleSheet("color: #ffffff; font-size: 14px; font-weight: bold; border: none;")
-        self.status_thread = QThread(self)
-        self.status_worker = StatusWorker(self.server_ip, self.server_port)
-        self.status_worker.moveToThread(self.status_thread)
-        self.status_thread.started.connect(self.status_worker.check_status)
-        self.status_worker.manager_status_result.connect(self.set_manager_status)
-        self.status_worker.server_status_result.connect(self.set_server_status)
-        self.status_worker.server_status_result.connect(self.status_thread.quit)
-        self.status_worker.server_status_result.connect(self.status_worker.deleteLater)
-        self.status_thread.finished.connect(self.status_thread.deleteLater)
-        self.status_thread.start()
+
+    def set_probe_result(self, result: status_probe.ProbeResult):
+        self.set_manager_status(result.manager_online)
+        self.set_server_status(result.server_online, result.world, result.version, result.players, result.max_players)
     
     def set_players(self, current, max):
         self.player_label.setText(f"{str(current)} / {str(max)}")
-    
-    def schedule_deletion(self):
-        thread_running = False
-        
-        try:
-            if hasattr(self, 'status_thread') and self.status_thread.isRunning():
-                thread_running = True
-        except RuntimeError:
-            thread_running = False
-            
-        if thread_running:
-            try:
-                self.status_worker.manager_status_result.disconnect(self.set_manager_status)
-                self.status_worker.server_status_result.disconnect(self.set_server_status)
-            except (TypeError, RuntimeError):
-                pass
-            
-            self.status_thread.finished.connect(self.deleteLater)
-        else:
-            self.deleteLater()
 
 class DeleteServerButton(QPushButton):
     def __init__(self, server_button: ServerButton):
@@ -258,6 +221,10 @@ class ServerManagerApp(QMainWindow):
     download_query_signal = pyqtSignal(int, str)
     setup_world_transfer_signal = pyqtSignal(str)
     download_cancelled_signal = pyqtSignal()
+    latency_signal = pyqtSignal(float)
+    probe_result_signal = pyqtSignal(str, int, object)
+    dashboard_update_signal = pyqtSignal(str, object)
+    resources_checked_signal = pyqtSignal(str, list)
 
     def __init__(self):
         super().__init__()
@@ -276,10 +243,24 @@ class ServerManagerApp(QMainWindow):
         self.worlds = {}
         self.resources_download_path: Path | None = None
         self.saved_servers: list = file_funcs.load_saved_servers(queue.Queue(), threading.Lock())
+        self.status_prober = status_probe.StatusProber(self.probe_result_signal.emit)
+        self.host_pool = host_links.HostPool(self.dashboard_update_signal.emit)
+        self.display_name = self.load_display_name()
         self.last_page_index = 0
         self.log_queue = queue.Queue()
         self.world_transfer_location: str | None = None
         self.cancelled_download = threading.Event()
+        self.transfer_finished = threading.Event()
+        self.transfer_checksum = None
+        self.world_sync_folder = None
+        self.resource_details = {}
+        self.file_hash = None
+        self.framed = False
+        self.request_ids = itertools.count(1)
+        self.state_mirror = state_sync.StateMirror()
+        self.state_host = None
+        self.extract_world_transfer = False
+        self.transfer_streams = self.load_transfer_streams()
         self.connection_delay_messages = ["Having trouble connecting? Either",
                                      "1. Your Hamachi is not open",
                                      "2. The host's Hamachi is not open",
@@ -301,6 +282,12 @@ class ServerManagerApp(QMainWindow):
         self.download_query_signal.connect(self.download_question_dialog)
         self.setup_world_transfer_signal.connect(self.download_world_setup)
         self.download_cancelled_signal.connect(self.cancel_download)
+        self.latency_signal.connect(self.set_latency)
+        self.probe_result_signal.connect(self.set_probe_result)
+        self.dashboard_update_signal.connect(self.update_dashboard)
+        self.resources_checked_signal.connect(self.request_resources)
+        self.ping_timer = QTimer(self)
+        self.ping_timer.timeout.connect(self.send_ping)
         
         self.init_ui()
         self.switch_to_mode_page()
@@ -375,6 +362,7 @@ class ServerManagerApp(QMainWindow):
         self.name_entry.setMaximumWidth(self.width() // 2)
         self.name_entry.setFont(QFont(self.name_entry.font().family(), int(self.name_entry.font().pointSize() * 1.5)))
         self.name_entry.setPlaceholderText("Display Name")
+        self.name_entry.setText(self.display_name)
         self.name_entry.returnPressed.connect(self.send_name)
 
         name_entry_confirm = QPushButton("Confirm")
@@ -462,6 +450,10 @@ class ServerManagerApp(QMainWindow):
         status_layout.addWidget(self.server_status_offline_label, 0, 1)
         self.server_status_offline_label.show()
         status_layout.setColumnStretch(2, 1)
+        self.latency_label = QLabel("")
+        self.latency_label.setObjectName("world_details")
+        self.latency_label.setToolTip("Round trip time to the host")
+        status_layout.addWidget(self.latency_label, 0, 3)
 
         self.log_box = QTextBrowser()
         self.log_box.setOpenExternalLinks(True)
@@ -625,11 +617,16 @@ class ServerManagerApp(QMainWindow):
         refresh_button = QPushButton("Refresh")
         refresh_button.setObjectName("roseButton")
         refresh_button.clicked.connect(self.refresh_saved_servers)
+        dashboard_button = QPushButton("Dashboard")
+        dashboard_button.setObjectName("indigoButton")
+        dashboard_button.setToolTip("Status, players and chat from every saved host")
+        dashboard_button.clicked.connect(self.switch_to_dashboard_page)
         add_server_button = QPushButton("Add Server")
         add_server_button.setObjectName("sageButton")
         add_server_button.clicked.connect(self.switch_to_add_server_page)
         h_box.addWidget(add_server_button)
         h_box.addWidget(refresh_button)
+        h_box.addWidget(dashboard_button)
         h_box.addStretch(2)
         h_box.addWidget(host_button, 1)
 
@@ -810,6 +807,61 @@ class ServerManagerApp(QMainWindow):
         resources_page = QWidget()
         resources_page.setLayout(resource_layout)
 
+        # Page 9: Multi-Host Dashboard
+        dashboard_layout = QVBoxLayout()
+
+        dashboard_title = QLabel("Dashboard")
+        dashboard_title.setObjectName("mediumText")
+        dashboard_title.setFont(self.title_font)
+
+        dashboard_top = QHBoxLayout()
+        dashboard_back = QPushButton("Back")
+        dashboard_back.setObjectName("roseButton")
+        dashboard_back.clicked.connect(self.switch_to_mode_page)
+        self.dashboard_name_entry = QLineEdit()
+        self.dashboard_name_entry.setPlaceholderText("Display Name")
+        self.dashboard_name_entry.setToolTip("The name hosts that haven't seen you before will know you by")
+        self.dashboard_name_entry.setText(self.display_name)
+        self.dashboard_name_entry.editingFinished.connect(self.set_dashboard_name)
+        dashboard_top.addWidget(dashboard_back)
+        dashboard_top.addStretch(1)
+        dashboard_top.addWidget(QLabel("Name:"))
+        dashboard_top.addWidget(self.dashboard_name_entry)
+
+        dashboard_body = QHBoxLayout()
+        self.dashboard_hosts = QListWidget()
+        self.dashboard_hosts.setStyleSheet(list_stylesheet)
+        self.dashboard_hosts.currentItemChanged.connect(lambda current, previous: self.show_dashboard_host())
+
+        dashboard_right = QVBoxLayout()
+        self.dashboard_players_label = QLabel("")
+        self.dashboard_players_label.setWordWrap(True)
+        self.dashboard_chat = QTextBrowser()
+        self.dashboard_chat.setOpenExternalLinks(True)
+        self.dashboard_chat.setReadOnly(True)
+        dashboard_message_row = QHBoxLayout()
+        self.dashboard_message_entry = QLineEdit()
+        self.dashboard_message_entry.setPlaceholderText("Send Message")
+        self.dashboard_message_entry.returnPressed.connect(self.send_dashboard_message)
+        self.dashboard_manage_button = QPushButton("Manage")
+        self.dashboard_manage_button.setToolTip("Open the host's worlds, mods and downloads")
+        self.dashboard_manage_button.clicked.connect(self.manage_dashboard_host)
+        dashboard_message_row.addWidget(self.dashboard_message_entry, 1)
+        dashboard_message_row.addWidget(self.dashboard_manage_button)
+        dashboard_right.addWidget(self.dashboard_players_label)
+        dashboard_right.addWidget(self.dashboard_chat, 1)
+        dashboard_right.addLayout(dashboard_message_row)
+
+        dashboard_body.addWidget(self.dashboard_hosts, 2)
+        dashboard_body.addLayout(dashboard_right, 3)
+
+        dashboard_layout.addWidget(dashboard_title)
+        dashboard_layout.addLayout(dashboard_top)
+        dashboard_layout.addLayout(dashboard_body, 1)
+
+        dashboard_page = QWidget()
+        dashboard_page.setLayout(dashboard_layout)
+
         #----------------------------------------------------
 
         # Add pages to the stacked layout
@@ -821,6 +873,7 @@ class ServerManagerApp(QMainWindow):
         self.stacked_layout.addWidget(update_page)
         self.stacked_layout.addWidget(add_server_page)
         self.stacked_layout.addWidget(resources_page)
+        self.stacked_layout.addWidget(dashboard_page)
 
         # Set the main layout to the stacked layout
         main_layout.addLayout(self.stacked_layout)
@@ -851,6 +904,40 @@ class ServerManagerApp(QMainWindow):
         except:
             return
     
+    def save_transfer_streams(self):
+        try:
+            key = winreg.CreateKey(winreg.HKEY_CURRENT_USER, KEY_PATH)
+            winreg.SetValueEx(key, "TransferStreams", 0, winreg.REG_DWORD, self.transfer_streams)
+            winreg.CloseKey(key)
+        except:
+            return
+    
+    def load_transfer_streams(self):
+        try:
+            key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, KEY_PATH)
+            value, _ = winreg.QueryValueEx(key, "TransferStreams")
+            winreg.CloseKey(key)
+            return value if value in TRANSFER_STREAM_CHOICES else 1
+        except:
+            return 1
+    
+    def save_display_name(self):
+        try:
+            key = winreg.CreateKey(winreg.HKEY_CURRENT_USER, KEY_PATH)
+            winreg.SetValueEx(key, "DisplayName", 0, winreg.REG_SZ, self.display_name)
+            winreg.CloseKey(key)
+        except:
+            return
+
+    def load_display_name(self):
+        try:
+            key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, KEY_PATH)
+            value, _ = winreg.QueryValueEx(key, "DisplayName")
+            winreg.CloseKey(key)
+            return value
+        except:
+            return ""
+
     def load_ip(self):
         try:
             key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, KEY_PATH)
@@ -892,6 +979,11 @@ class ServerManagerApp(QMainWindow):
         self.close_connection_thread()
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.client.connect((self.host_ip, self.port))
+        self.framed = False
+        if self.state_host != self.host_ip:
+            self.state_mirror = state_sync.StateMirror()
+            self.state_host = self.host_ip
+        self.state_mirror.synced = False
         self.client.sendall("connection request".encode("utf-8"))
         try:
             accepted = self.client.recv(1024).decode("utf-8")
@@ -927,7 +1019,7 @@ class ServerManagerApp(QMainWindow):
             self.send(message)
     
     def receive(self):
-        buf = bytearray()
+        decoder = protocol.MixedDecoder(SERVER_MARKER, b"\n")
         total_file_sizes = 0
         size_so_far = 0
         expecting_file = False
@@ -936,23 +1028,23 @@ class ServerManagerApp(QMainWindow):
         self.file_size = 0
         file_bytes_needed = 0
         last_time = time.time()
+        selector = selectors.DefaultSelector()
+        selector.register(self.client, selectors.EVENT_READ)
         while not self.close_threads.is_set():
             try:
-                if expecting_file:
-                    chunk = self.client.recv(65536)
-                else:
-                    chunk = self.client.recv(4096)
-                if not chunk:
+                # Sleeps until data arrives instead of polling the socket
+                if not selector.select(RECEIVE_WAIT):
+                    continue
+                if not decoder.recv_into(self.client, RECEIVE_SIZE):
                     self.close_threads.set()
                     break
-                buf.extend(chunk)
 
                 if expecting_file:
-                    to_write = buf[:file_bytes_needed]
+                    to_write = decoder.take(file_bytes_needed)
                     if to_write:
                         self.file.write(to_write)
+                        self.file_hash.update(to_write)
                         self.file.flush()
-                        del buf[:len(to_write)]
                         file_bytes_needed -= len(to_write)
                         size_so_far += len(to_write)
                         if time.time() - last_time >= 0.1:
@@ -960,34 +1052,21 @@ class ServerManagerApp(QMainWindow):
                             last_time = time.time()
 
                     if file_bytes_needed == 0:
-                        self.file.close()
-                        self.file = None
+                        self.finish_resource_file()
                         expecting_file = False
-                        self.log_queue.put(f"{self.timestamp()} Downloaded '{self.file_name}'.")
                     else:
                         continue
 
-                while True:
-                    marker = b"SERVER-MESSAGE~~>"
-                    idx = buf.find(marker)
-                    if idx == -1:
-                        # Keep accumulating
-                        break
-
-                    nl = buf.find(b"\n", idx)
-                    if nl == -1:
-                        break
-                    raw_msg = bytes(buf[idx + len(marker):nl])
-                    del buf[:nl + 1]
-                    try:
-                        text = raw_msg.decode("utf-8")
-                    except UnicodeDecodeError:
-                        continue
+                for frame in decoder.frames():
+                    if frame.kind == protocol.LEGACY:
+                        frame = self.parse_server_message(frame.body)
+                    elif frame.kind == protocol.DATA:
+                        frame = protocol.Frame(protocol.DATA, frame.request_id, (frame.body["topic"], frame.body["data"]))
 
-                    if text.startswith("DATA-RETURN"):
-                        data = text.split('~~>')
-                        key, args = data[0][data[0].find('(')+1:data[0].find(')')], json.loads(data[1])
-                        
+                    if frame.kind == protocol.TEXT:
+                        self.log_message_signal.emit(f"{self.timestamp()} {frame.body}")
+                    elif frame.kind == protocol.DATA:
+                        key, args = frame.body
                         if key == "sending-file":
                             filename, filesize, current_index, num_of_resources, total_file_sizes = args
                             self.progress_range_signal.emit(0, total_file_sizes)
@@ -995,138 +1074,34 @@ class ServerManagerApp(QMainWindow):
                             file_bytes_needed = int(filesize)
                             self.download_message_signal.emit(f"{current_index}/{num_of_resources}\n{filename}")
                             self.file = open(self.resources_download_path / self.file_name, "wb")
-                            to_take = min(len(buf), file_bytes_needed)
-                            if to_take:
-                                self.file.write(buf[:to_take])
+                            self.file_hash = hashlib.sha256()
+                            # The file follows its header unframed
+                            to_write = decoder.take(file_bytes_needed)
+                            if to_write:
+                                self.file.write(to_write)
+                                self.file_hash.update(to_write)
                                 self.file.flush()
-                                del buf[:to_take]
-                                file_bytes_needed -= to_take
-                                size_so_far += to_take
+                                file_bytes_needed -= len(to_write)
+                                size_so_far += len(to_write)
                             
                             if file_bytes_needed == 0:
-                                self.file.close()
-                                self.file = None
-                                self.log_message_signal.emit(f"{self.timestamp()} Downloaded '{self.file_name}'.")
+                                self.finish_resource_file()
                                 expecting_file = False
                             else:
                                 expecting_file = True
+                                break
+                        elif key == "file-transfer-complete":
+                            self.download_complete_signal.emit()
+                            total_file_sizes = 0
+                            size_so_far = 0
                         else:
-                            if key == "status":
-                                self.set_status_signal.emit(args)
-                            elif key == "players":
-                                self.set_players_signal.emit(args)
-                            elif key == "worlds-list":
-                                self.set_worlds_list_signal.emit(args)
-                            elif key in ["start", "stop"] and args == ["refresh"]:
-                                self.get_status_signal.emit()
-                            elif key == "available-resources":
-                                if args[0] == self.selected_dropdown_text and args[1] == True:
-                                    self.enable_resources_button_signal.emit()
-                            elif key == "file-transfer-complete":
-                                self.download_complete_signal.emit()
-                                total_file_sizes = 0
-                                size_so_far = 0
-                            elif key == "world-size":
-                                size, world = args
-                                self.download_query_signal.emit(size, world)
-                            elif key == "zipping-world":
-                                total_files = args[0]
-                                self.setup_world_transfer_signal.emit("zipping")
-                                self.progress_range_signal.emit(0, total_files)
-                                self.progress_set_signal.emit(0)
-                            elif key == "starting-transfer":
-                                total_bytes, world, transfer_port = args
-                                self.setup_world_transfer_signal.emit("downloading")
-                                self.progress_range_signal.emit(0, total_bytes)
-                                self.progress_set_signal.emit(0)
-
-                                def write_zip(client: socket.socket):
-                                    save_path = str(self.world_transfer_location) + f"/{world}.zip"
-                                    success = False
-                                    try:
-                                        with open(save_path, 'wb') as zf:
-                                            while not self.close_threads.is_set() and not self.cancelled_download.is_set():
-                                                data = client.recv(64 * 1024 * 1024)
-                                                if not data:
-                                                    break
-                                                zf.write(data)
-                                        success = True
-                                    except Exception as e:
-                                        if os.path.exists(save_path):
-                                            os.remove(save_path)
-                                    finally:
-                                        if not success and os.path.exists(save_path):
-                                            os.remove(save_path)
-                                        client.shutdown(socket.SHUT_RDWR)
-                                        client.close()
-
-                                transfer_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                                transfer_sock.connect((self.host_ip, transfer_port))
-                                threading.Thread(target=write_zip, args=(transfer_sock,)).start()
-                            elif key == "transfer-progress":
-                                processed, file = args
-                                self.progress_set_signal.emit(processed)
-                                self.download_message_signal.emit(file)
-                            elif key == "transfer-complete":
-                                world = args[0]
-                                self.resources_download_path = self.world_transfer_location
-                                self.download_complete_signal.emit()
-                                self.log_queue.put(f"{self.timestamp()} <font color='green'>Transfer of {world} completed.</font>")
-                            elif key == "cancelled-transfer":
-                                world = args[0]
-                                self.download_cancelled_signal.emit()
-                                self.log_queue.put(f"{self.timestamp()} <font color='red'>Transfer of {world} was cancelled.</font>")
-                                if os.path.exists(str(self.world_transfer_location) + f"/{world}.zip"):
-                                    os.remove(str(self.world_transfer_location) + f"/{world}.zip")
-                            elif key == "downloadable-world":
-                                world, download_enabled = args
-                                if world == self.dropdown.currentText():
-                                    self.world_download_button.setEnabled(download_enabled)
-                            elif key == "resource-names":
-                                jars = [name for name in args if name.endswith(".jar")]
-                                zips = [name for name in args if name.endswith(".zip")]
-
-                                font = QFont()
-                                font.setBold(True)
-                                font.setPointSize(20)
-
-                                if len(jars) > 0:
-                                    item = QListWidgetItem("--- Mods ---")
-                                    item.setFlags(Qt.ItemFlag.NoItemFlags)
-                                    item.setFont(font)
-                                    self.resource_list.addItem(item)
-                                    self.resource_list.addItems(jars)
-                                    if len(zips) > 0:
-                                        space = QListWidgetItem(" ")
-                                        space.setFlags(Qt.ItemFlag.NoItemFlags)
-                                        space.setFont(font)
-                                        self.resource_list.addItem(space)
-
-                                if len(zips) > 0:
-                                    item = QListWidgetItem("--- Resources ---")
-                                    item.setFlags(Qt.ItemFlag.NoItemFlags)
-                                    item.setFont(font)
-                                    self.resource_list.addItem(item)
-                                    self.resource_list.addItems(zips)
-                                self.resource_list.setCurrentItem(None)
-                            elif key == "host-version":
-                                version = args[0]
-                                if version != VERSION:
-                                    self.log_queue.put(f"<font color='orange'>WARNING: The host is using version {version}.\nSome features may not work correctly.</font>")
-                            elif key == "closing":
-                                try:
-                                    self.client.close()
-                                except socket.error:
-                                    pass
-                    else:
-                        self.log_message_signal.emit(f"{self.timestamp()} {text}")
+                            self.handle_data(key, args)
                         
+            except BlockingIOError:
+                continue
             except socket.error as e:
-                if e.errno == 10035:
-                    time.sleep(0.1)
-                else:
-                    self.close_threads.set()
-                    break
+                self.close_threads.set()
+                break
             except Exception as e:
                 if self.file:
                     try:
@@ -1137,18 +1112,236 @@ class ServerManagerApp(QMainWindow):
                 self.close_threads.set()
                 break
         
+        selector.close()
         if expecting_file and self.file:
             self.file.close()
         self.switch_to_connect_signal.emit()
 
+    @staticmethod
+    def parse_server_message(text):
+        """Turns a message from before framing was negotiated into the frame it would have been sent as."""
+        if text.startswith("DATA-RETURN"):
+            data = text.split('~~>')
+            key, args = data[0][data[0].find('(')+1:data[0].find(')')], json.loads(data[1])
+            return protocol.Frame(protocol.DATA, 0, (key, args))
+        return protocol.Frame(protocol.TEXT, 0, text)
+
+    def handle_data(self, key, args):
+        if key == "status":
+            self.set_status_signal.emit(args)
+        elif key == "players":
+            self.set_players_signal.emit(args)
+        elif key == "worlds-list":
+            self.set_worlds_list_signal.emit(args)
+        elif key in ["start", "stop"] and args == ["refresh"]:
+            self.get_status_signal.emit()
+        elif key == "available-resources":
+            if args[0] == self.selected_dropdown_text and args[1] == True:
+                self.enable_resources_button_signal.emit()
+        elif key == "starting-resource-transfer":
+            transfer_port, token, streams, file_count, total_size = args
+            self.progress_range_signal.emit(0, total_size)
+            self.progress_set_signal.emit(0)
+            threading.Thread(target=self.receive_resources, args=(transfer_port, token, streams, total_size), daemon=True).start()
+        elif key == "world-size":
+            size, world = args
+            self.download_query_signal.emit(size, world)
+        elif key == "zipping-world":
+            total_files = args[0]
+            self.setup_world_transfer_signal.emit("zipping")
+            self.progress_range_signal.emit(0, total_files)
+            self.progress_set_signal.emit(0)
+        elif key == "starting-transfer":
+            total_bytes, world, transfer_port = args[:3]
+            transfer_id, offset = args[3:5] if len(args) >= 5 else ("", 0)
+            streams, token = args[5:7] if len(args) >= 7 else (1, "")
+            self.setup_world_transfer_signal.emit("downloading")
+            self.progress_range_signal.emit(0, total_bytes)
+            self.progress_set_signal.emit(0)
+            self.transfer_finished.clear()
+            self.transfer_checksum = None
+
+            extract = self.extract_world_transfer
+
+            def write_zip(client: socket.socket):
+                save_path = str(self.world_transfer_location) + f"/{world}.zip"
+                part_path = save_path + transfer_funcs.PART_SUFFIX
+                extract_path = None
+                keep_part = False
+                try:
+                    if extract:
+                        # Extracted straight into a new world folder, so there is no archive left to resume from
+                        extract_path = os.path.join(str(self.world_transfer_location), world)
+                        copy = 2
+                        while os.path.exists(extract_path):
+                            extract_path = os.path.join(str(self.world_transfer_location), f"{world} ({copy})")
+                            copy += 1
+                        extractor = transfer_funcs.ZipStreamExtractor(extract_path)
+                        sha256 = hashlib.sha256()
+                        self.receive_world(client, sha256, extractor.feed)
+                        if not self.close_threads.is_set() and not self.cancelled_download.is_set():
+                            extractor.finish()
+                    elif streams > 1:
+                        resuming = offset > 0 and os.path.exists(part_path)
+                        transfer_funcs.save_partial_transfer(save_path, self.host_ip, transfer_id, offset if resuming else 0)
+                        with open(part_path, 'r+b' if resuming else 'wb') as zf:
+                            zf.truncate(offset if resuming else 0)
+                        ranges = transfer_funcs.split_ranges(offset, total_bytes, streams)
+                        self.receive_world_ranges(save_path, transfer_id, transfer_port, token, ranges)
+                        # The ranges arrive out of order, so the checksum is taken once the file is whole
+                        sha256 = transfer_funcs.file_sha256(part_path)
+                    else:
+                        if transfer_id:
+                            transfer_funcs.save_partial_transfer(save_path, self.host_ip, transfer_id)
+                        resuming = offset > 0 and os.path.exists(part_path)
+                        with open(part_path, 'r+b' if resuming else 'wb') as zf:
+                            sha256 = transfer_funcs.file_sha256(part_path, offset) if resuming else hashlib.sha256()
+                            zf.truncate(offset if resuming else 0)
+                            zf.seek(0, os.SEEK_END)
+                            self.receive_world(client, sha256, zf.write)
+
+                    if self.close_threads.is_set() or self.cancelled_download.is_set():
+                        return
+
+                    # The checksum arrives on the main connection once the host has sent everything
+                    if not self.transfer_finished.wait(30):
+                        keep_part = bool(transfer_id)
+                        self.log_queue.put(f"{self.timestamp()} <font color='red'>Transfer of {world} was interrupted.{" Download it again to resume." if keep_part else ""}</font>")
+                        self.download_cancelled_signal.emit()
+                        return
+                    if self.transfer_checksum == "cancelled":
+                        return
+                    if self.transfer_checksum and sha256.hexdigest() != self.transfer_checksum:
+                        self.log_queue.put(f"{self.timestamp()} <font color='red'>Transfer of {world} failed its checksum. Please download it again.</font>")
+                        self.download_cancelled_signal.emit()
+                        return
+
+                    if extract_path:
+                        self.resources_download_path = extract_path
+                        extract_path = None
+                    else:
+                        os.replace(part_path, save_path)
+                        self.resources_download_path = self.world_transfer_location
+                    self.download_complete_signal.emit()
+                    self.log_queue.put(f"{self.timestamp()} <font color='green'>Transfer of {world} completed.</font>")
+                except Exception as e:
+                    keep_part = bool(transfer_id) and not extract and not self.cancelled_download.is_set()
+                    if not self.cancelled_download.is_set():
+                        self.log_queue.put(f"{self.timestamp()} <font color='red'>Transfer of {world} was interrupted.{" Download it again to resume." if keep_part else ""}</font>")
+                        self.download_cancelled_signal.emit()
+                finally:
+                    if extract_path:
+                        # Anything short of a verified transfer leaves a partial world behind, so it is removed
+                        shutil.rmtree(extract_path, ignore_errors=True)
+                    elif not keep_part:
+                        transfer_funcs.remove_partial_transfer(save_path)
+                    if client:
+                        client.close()
+
+            transfer_sock = None
+            if streams <= 1:
+                transfer_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                transfer_sock.connect((self.host_ip, transfer_port))
+            threading.Thread(target=write_zip, args=(transfer_sock,)).start()
+        elif key == "starting-sync":
+            world, transfer_port = args[:2]
+            self.setup_world_transfer_signal.emit("downloading")
+            self.progress_range_signal.emit(0, 0)
+            self.transfer_finished.clear()
+            self.transfer_checksum = None
+            threading.Thread(target=self.sync_world, args=(world, transfer_port, self.world_sync_folder), daemon=True).start()
+        elif key == "transfer-progress":
+            processed, file = args
+            self.progress_set_signal.emit(processed)
+            self.download_message_signal.emit(file)
+        elif key == "transfer-complete":
+            self.transfer_checksum = args[1] if len(args) > 1 else None
+            self.transfer_finished.set()
+        elif key == "cancelled-transfer":
+            world = args[0]
+            self.transfer_checksum = "cancelled"
+            self.transfer_finished.set()
+            self.download_cancelled_signal.emit()
+            self.log_queue.put(f"{self.timestamp()} <font color='red'>Transfer of {world} was cancelled.</font>")
+            transfer_funcs.remove_partial_transfer(str(self.world_transfer_location) + f"/{world}.zip")
+        elif key == "downloadable-world":
+            world, download_enabled = args
+            if world == self.dropdown.currentText():
+                self.world_download_button.setEnabled(download_enabled)
+        elif key == "resource-names":
+            # Hosts that predate resource hashes only send the names
+            self.resource_details = {entry[0]: tuple(entry[1:]) for entry in args if isinstance(entry, list)}
+            names = [entry[0] if isinstance(entry, list) else entry for entry in args]
+            jars = [name for name in names if name.endswith(".jar")]
+            zips = [name for name in names if name.endswith(".zip")]
+
+            font = QFont()
+            font.setBold(True)
+            font.setPointSize(20)
+
+            if len(jars) > 0:
+                item = QListWidgetItem("--- Mods ---")
+                item.setFlags(Qt.ItemFlag.NoItemFlags)
+                item.setFont(font)
+                self.resource_list.addItem(item)
+                self.resource_list.addItems(jars)
+                if len(zips) > 0:
+                    space = QListWidgetItem(" ")
+                    space.setFlags(Qt.ItemFlag.NoItemFlags)
+                    space.setFont(font)
+                    self.resource_list.addItem(space)
+
+            if len(zips) > 0:
+                item = QListWidgetItem("--- Resources ---")
+                item.setFlags(Qt.ItemFlag.NoItemFlags)
+                item.setFont(font)
+                self.resource_list.addItem(item)
+                self.resource_list.addItems(zips)
+            self.resource_list.setCurrentItem(None)
+        elif key == "pong":
+            self.latency_signal.emit((time.perf_counter() - float(args[0])) * 1000)
+        elif key == "state-snapshot":
+            self.render_state(self.state_mirror.load(args))
+        elif key == "state-diff":
+            resumed = not self.state_mirror.synced
+            changed = self.state_mirror.apply(args)
+            if changed is None:
+                # Missed a change, so start again from a full copy
+                self.state_mirror = state_sync.StateMirror()
+                self.subscribe_state()
+            elif resumed:
+                # The page was cleared when the connection dropped, so everything is drawn again
+                self.render_state(set(self.state_mirror.values))
+            else:
+                self.render_state(changed)
+        elif key == protocol.FRAMING_TOPIC:
+            # Everything after the acknowledgement, in both directions, is framed
+            self.framed = True
+        elif key == "host-version":
+            version = args[0]
+            if version != VERSION:
+                self.log_queue.put(f"<font color='orange'>WARNING: The host is using version {version}.\nSome features may not work correctly.</font>")
+        elif key == "closing":
+            try:
+                self.client.close()
+            except socket.error:
+                pass
+
     def display_delay_messages(self):
         for i, label in enumerate(self.connection_delabels):
             label.setText(self.connection_delay_messages[i])
     
     def send(self, message):
-        self.client.sendall(f"CLIENT-MESSAGE~~>{message}".encode("utf-8"))
+        if self.framed:
+            self.client.sendall(protocol.encode_frame(protocol.TEXT, 0, message))
+        else:
+            self.client.sendall(f"CLIENT-MESSAGE~~>{message}".encode("utf-8"))
     
     def send_request(self, topic, *data):
+        if self.framed:
+            # Framed arguments are sent as a list, so they can contain commas
+            self.client.sendall(protocol.encode_request(next(self.request_ids) % 2**32, topic, data))
+            return
         args = ",".join(data)
         if args != "":
             args = "," + args
@@ -1160,6 +1353,9 @@ class ServerManagerApp(QMainWindow):
     def send_name(self):
         name = self.name_entry.text()
         if name != "":
+            self.display_name = name
+            self.save_display_name()
+            self.dashboard_name_entry.setText(name)
             self.send(name)
             self.delay(1)
             self.switch_to_server_manager()
@@ -1172,6 +1368,8 @@ class ServerManagerApp(QMainWindow):
         self.stacked_layout.setCurrentIndex(0)
     
     def switch_to_connect_page(self):
+        self.ping_timer.stop()
+        self.latency_label.setText("")
         self.close_threads.set()
         self.close_connection_thread()
         if self.receive_thread:
@@ -1198,8 +1396,111 @@ class ServerManagerApp(QMainWindow):
     
     def refresh_saved_servers(self):
         for server in self.saved_server_buttons:
-            server.get_info_status()
+            server.get_info_status(self.status_prober.cached(server.server_ip, server.server_port))
+        self.status_prober.probe_all([(server.server_ip, server.server_port) for server in self.saved_server_buttons])
+
+    def set_probe_result(self, ip, port, result):
+        for server in self.saved_server_buttons:
+            if server.server_ip == ip and server.server_port == port:
+                server.set_probe_result(result)
     
+    def switch_to_dashboard_page(self):
+        # Links stay open after leaving the page, so coming back or switching hosts is instant
+        self.host_pool.sync(list(dict.fromkeys(server["ip"] for server in self.saved_servers)), self.display_name or os.environ.get("USERNAME", "Player"))
+        current = self.dashboard_hosts.currentItem()
+        selected = current.data(Qt.ItemDataRole.UserRole) if current else None
+        self.dashboard_hosts.clear()
+        everyone = QListWidgetItem("All Hosts")
+        self.dashboard_hosts.addItem(everyone)
+        self.dashboard_hosts.setCurrentItem(everyone)
+        for ip in dict.fromkeys(server["ip"] for server in self.saved_servers):
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, ip)
+            self.dashboard_hosts.addItem(item)
+            self.render_dashboard_host(item)
+            if ip == selected:
+                self.dashboard_hosts.setCurrentItem(item)
+        self.show_dashboard_host()
+        self.stacked_layout.setCurrentIndex(8)
+
+    def dashboard_host_name(self, ip):
+        return ", ".join(server["name"] for server in self.saved_servers if server["ip"] == ip) or ip
+
+    def dashboard_item(self, ip):
+        for row in range(1, self.dashboard_hosts.count()):
+            item = self.dashboard_hosts.item(row)
+            if item.data(Qt.ItemDataRole.UserRole) == ip:
+                return item
+        return None
+
+    def render_dashboard_host(self, item: QListWidgetItem):
+        ip = item.data(Qt.ItemDataRole.UserRole)
+        link = self.host_pool.view(ip)
+        if link is None or not link.connected:
+            details = "Manager Offline"
+        elif link.status[0] == "online":
+            _, version, world = link.status
+            details = f"{world} - {version}  |  {len(link.players)} online"
+        elif link.status[0] == "pinging":
+            details = "Pinging..."
+        else:
+            details = "Server Offline"
+        if link is not None and link.latency is not None:
+            details += f"  |  {round(link.latency)} ms"
+        item.setText(f"{self.dashboard_host_name(ip)}\n{details}")
+
+    def selected_dashboard_host(self):
+        item = self.dashboard_hosts.currentItem()
+        return item.data(Qt.ItemDataRole.UserRole) if item else None
+
+    def show_dashboard_host(self):
+        ip = self.selected_dashboard_host()
+        self.dashboard_message_entry.setEnabled(ip is not None)
+        self.dashboard_manage_button.setEnabled(ip is not None)
+        self.dashboard_message_entry.setPlaceholderText("Send Message" if ip else "Choose a host to chat with")
+        if ip is None:
+            links = [link for link in (self.host_pool.view(ip) for ip in dict.fromkeys(server["ip"] for server in self.saved_servers)) if link]
+            self.dashboard_players_label.setText(f"Players: {', '.join(sorted({player for link in links for player in link.players})) or 'None'}")
+            # Every host's chat in one list, oldest first
+            lines = sorted((sent, f"<b>{html.escape(self.dashboard_host_name(link.ip))}</b> {text}") for link in links for sent, text in link.chat)
+        else:
+            link = self.host_pool.view(ip)
+            self.dashboard_players_label.setText(f"Players: {', '.join(link.players) if link and link.players else 'None'}")
+            lines = list(link.chat) if link else []
+        self.dashboard_chat.setHtml("".join(f'<p style="margin: 0;">{time.strftime("[%H:%M]", time.localtime(sent))} {text}</p>' for sent, text in lines[-host_links.CHAT_HISTORY:]))
+        scrollbar = self.dashboard_chat.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def update_dashboard(self, ip, names):
+        item = self.dashboard_item(ip)
+        if item is None:
+            return
+        if names & {"connection", "status", "players", "latency"}:
+            self.render_dashboard_host(item)
+        if names & {"connection", "players", "chat"} and self.selected_dashboard_host() in (ip, None):
+            self.show_dashboard_host()
+
+    def send_dashboard_message(self):
+        ip = self.selected_dashboard_host()
+        message = self.dashboard_message_entry.text()
+        if ip and message != "":
+            self.dashboard_message_entry.clear()
+            self.host_pool.send_chat(ip, message)
+
+    def set_dashboard_name(self):
+        name = self.dashboard_name_entry.text().strip()
+        if name and name != self.display_name:
+            self.display_name = name
+            self.save_display_name()
+            self.name_entry.setText(name)
+            self.host_pool.sync(list(dict.fromkeys(server["ip"] for server in self.saved_servers)), name)
+
+    def manage_dashboard_host(self):
+        ip = self.selected_dashboard_host()
+        if ip:
+            self.stacked_layout.setCurrentIndex(0)
+            self.start_connection_thread(ip)
+
     def switch_to_mode_page(self):
         self.connecting_label.setText("Connecting...")
         self.connecting_label.setObjectName("ConnectingText")
@@ -1221,7 +1522,7 @@ class ServerManagerApp(QMainWindow):
         self.server_name_prompt.setFocus()
 
     def switch_to_resource_selection_page(self):
-        self.send_request("get-resource-names", self.dropdown.currentText())
+        self.send_request("get-resource-names", self.dropdown.currentText(), "details")
         self.resource_list.clear()
         self.stacked_layout.setCurrentIndex(7)
 
@@ -1232,8 +1533,12 @@ class ServerManagerApp(QMainWindow):
                 self.update_log_signal.emit(message)
 
     def first_connect(self):
-        self.get_worlds_list()
-        self.get_status()
+        # Hosts from before framing ignore the request and keep using the old messages
+        self.send_request(protocol.FRAMING_REQUEST, str(protocol.VERSION))
+        self.subscribe_state()
+        QTimer.singleShot(LEGACY_STATE_DELAY, self.request_legacy_state)
+        self.send_ping()
+        self.ping_timer.start(PING_INTERVAL)
 
         version_name, tag_version, link = latest_app_info()
         if version_name:
@@ -1241,6 +1546,40 @@ class ServerManagerApp(QMainWindow):
                 self.log_queue.put(f"<br>{self.timestamp()} {version_name} is available!")
                 self.log_queue.put(f"{self.timestamp()} Click the version number in the corner to update.<br>")
 
+    def subscribe_state(self):
+        # Picks up from the last state seen from this host, if it still has the changes since then
+        self.send_request("subscribe-state", self.state_mirror.id, str(self.state_mirror.version))
+
+    def request_legacy_state(self):
+        # Hosts from before state syncing ignore the subscription
+        if self.state_mirror.synced:
+            return
+        try:
+            self.get_worlds_list()
+            self.get_status()
+        except OSError:
+            pass
+
+    def render_state(self, names):
+        values = self.state_mirror.values
+        # The status shows the world's details, so the worlds go first
+        if names & {"worlds", "world-order"}:
+            self.set_worlds_list_signal.emit([values.get("worlds", {}), values.get("world-order", [])])
+        if "status" in names:
+            status = values["status"]
+            self.set_status_signal.emit([status["status"], status["version"], status["world"]])
+        elif "players" in names and values.get("status", {}).get("status") == "online":
+            self.set_players_signal.emit(list(values.get("players", [])))
+
+    def send_ping(self):
+        try:
+            self.send_request("ping", f"{time.perf_counter():.6f}")
+        except OSError:
+            pass
+    
+    def set_latency(self, ms):
+        self.latency_label.setText(f"Ping: {round(ms)} ms")
+    
     def get_status(self):
         self.set_status(["pinging",None,None])
         self.send_request("get-status")
@@ -1274,7 +1613,10 @@ class ServerManagerApp(QMainWindow):
             self.version_label.setText(f"Version: {version} {'Fabric' * self.worlds[world]['fabric']}")
             self.world_label.setText(f"World: {world}")
             self.refresh_button.setEnabled(True)
-            self.get_players()
+            if self.state_mirror.synced:
+                self.set_players(list(self.state_mirror.values.get("players", [])))
+            else:
+                self.get_players()
             self.refresh_status_button.setEnabled(True)
             self.start_button.setEnabled(False)
             self.stop_button.setEnabled(True)
@@ -1350,9 +1692,99 @@ class ServerManagerApp(QMainWindow):
             self.download_button.hide()
             self.cancel_download_button.hide()
             self.download_progress.show()
-            self.downloads_message.setText("Downloading Resources...")
+            self.downloads_message.setText("Checking Existing Files...")
             self.download_file_label.setText("")
-            self.send_request("download-resources", self.dropdown.currentText(), *resources)
+            world = self.dropdown.currentText()
+            # Hashing existing files can take a while for big mod sets, so it is kept off the window's thread
+            threading.Thread(target=lambda: self.resources_checked_signal.emit(world, self.reuse_resources(resources)), daemon=True).start()
+
+    def request_resources(self, world, resources):
+        if not resources:
+            self.download_complete()
+            return
+
+        self.downloads_message.setText("Downloading Resources...")
+        if self.resource_details:
+            # Hosts that send resource hashes also have the separate data channel
+            self.send_request("download-resources-stream", world, str(transfer_funcs.RESOURCE_STREAMS), *resources)
+        else:
+            self.send_request("download-resources", world, *resources)
+    
+    def reuse_resources(self, resources):
+        """Fills in resources the client already has, either in the download folder or in the shared cache,
+        and returns the ones that still need to be downloaded."""
+        needed = []
+        for name in resources:
+            if name not in self.resource_details:
+                needed.append(name)
+                continue
+            
+            size, sha256 = self.resource_details[name]
+            destination = str(self.resources_download_path / name)
+            try:
+                if transfer_funcs.has_resource(destination, size, sha256):
+                    self.log_queue.put(f"{self.timestamp()} '{name}' is already up to date.")
+                elif cached := transfer_funcs.cached_resource(file_funcs.RESOURCE_CACHE, size, sha256):
+                    transfer_funcs.copy_cached_resource(cached, destination)
+                    self.log_queue.put(f"{self.timestamp()} Copied '{name}' from previously downloaded files.")
+                else:
+                    needed.append(name)
+            except OSError:
+                needed.append(name)
+        return needed
+    
+    def finish_resource_file(self):
+        self.file.close()
+        self.file = None
+        self.check_resource_file(self.file_name, str(self.resources_download_path / self.file_name), self.file_hash.hexdigest())
+    
+    def check_resource_file(self, name, path, sha256):
+        details = self.resource_details.get(name)
+        if details and sha256 != details[1]:
+            # Left in place, the game would load it and the next download would take it as present
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.log_queue.put(f"{self.timestamp()} <font color='red'>'{name}' doesn't match the host's copy. Please download it again.</font>")
+            return
+        
+        self.log_queue.put(f"{self.timestamp()} Downloaded '{name}'.")
+        if details:
+            try:
+                transfer_funcs.add_cached_resource(file_funcs.RESOURCE_CACHE, path, details[1])
+            except OSError:
+                pass
+    
+    def receive_resources(self, transfer_port, token, streams, total_size):
+        received = [0, time.time()]
+        lock = threading.Lock()
+
+        def progress(size):
+            with lock:
+                received[0] += size
+                if time.time() - received[1] >= 0.1:
+                    received[1] = time.time()
+                    self.progress_set_signal.emit(min(received[0], total_size))
+
+        def file_received(name, path, sha256):
+            self.download_message_signal.emit(name)
+            self.check_resource_file(name, path, sha256)
+
+        def receive_stream():
+            with socket.create_connection((self.host_ip, transfer_port)) as data_sock:
+                data_sock.sendall(token.encode())
+                return transfer_funcs.receive_resource_files(data_sock, str(self.resources_download_path), file_received, progress, self.cancelled_download)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=streams) as pool:
+                finished = all(list(pool.map(lambda _: receive_stream(), range(streams))))
+            if finished and not self.close_threads.is_set():
+                self.download_complete_signal.emit()
+        except Exception as e:
+            if not self.cancelled_download.is_set():
+                self.log_queue.put(f"{self.timestamp()} <font color='red'>Resource download failed: {str(e)}</font>")
+                self.download_cancelled_signal.emit()
     
     def download_world_setup(self, mode="downloading"):
         self.cancelled_download.clear()
@@ -1447,8 +1879,26 @@ class ServerManagerApp(QMainWindow):
                                          QPushButton:pressed {
                                              background-color: #660000;
                                          }""")
+        sync = box.addButton("Sync Existing Copy", QMessageBox.ButtonRole.ActionRole)
+        extract = QCheckBox("Extract while downloading")
+        extract.setToolTip("Unpacks the world as it arrives instead of saving a zip. Interrupted downloads can't be resumed.")
+        extract.setChecked(self.extract_world_transfer)
+        box.setCheckBox(extract)
+        streams = QComboBox()
+        streams.setToolTip("Splitting the download across several connections can be much faster for hosts that are far away.")
+        for count in TRANSFER_STREAM_CHOICES:
+            streams.addItem("1 connection" if count == 1 else f"{count} parallel connections", count)
+        streams.setCurrentIndex(max(0, streams.findData(self.transfer_streams)))
+        layout = box.layout()
+        layout.addWidget(streams, layout.rowCount(), 0, 1, layout.columnCount())
         button = box.exec()
-        if button == ok:
+        self.extract_world_transfer = extract.isChecked()
+        if streams.currentData() != self.transfer_streams:
+            self.transfer_streams = streams.currentData()
+            self.save_transfer_streams()
+        if box.clickedButton() is sync:
+            self.start_world_sync(world)
+        elif button == ok:
             download_folder = file_funcs.pick_folder(self, starting_path=(self.world_transfer_location or ""), dialog_title="World Download Location")
             if not download_folder:
                 return
@@ -1464,9 +1914,107 @@ class ServerManagerApp(QMainWindow):
                 box.exec()
                 return
             
-            self.send_request(f"begin-world-transfer,{world}")
+            # A partial download of this world from this host is resumed where it left off
+            offset, transfer_id = transfer_funcs.load_partial_transfer(download_folder + f"/{world}.zip", self.host_ip)
             self.world_transfer_location = download_folder
+            # Extracting needs the archive in order, so it always uses a single stream
+            streams = 1 if self.extract_world_transfer else self.transfer_streams
+            if transfer_id and not self.extract_world_transfer:
+                self.send_request("begin-world-transfer", world, str(offset), transfer_id, str(streams))
+            elif streams > 1:
+                self.send_request("begin-world-transfer", world, "0", "", str(streams))
+            else:
+                self.send_request("begin-world-transfer", world)
     
+    def receive_world(self, client: socket.socket, sha256, write):
+        """Reads a world transfer into one reused buffer, hashing each chunk before handing it to write."""
+        buffer = bytearray(transfer_funcs.RECEIVE_BUFFER_SIZE)
+        view = memoryview(buffer)
+        received = 0
+        while not self.close_threads.is_set() and not self.cancelled_download.is_set():
+            size = client.recv_into(view)
+            if not size:
+                break
+            chunk = view[:size]
+            sha256.update(chunk)
+            write(chunk)
+            received += size
+        return received
+
+    def receive_world_ranges(self, save_path, transfer_id, transfer_port, token, ranges):
+        """Downloads each range of the archive over its own connection, writing them into place in the .part file.
+        Progress is saved as the part received without gaps, which is where a later download resumes."""
+        part_path = save_path + transfer_funcs.PART_SUFFIX
+        positions = [start for start, _ in ranges]
+        last_saved = [time.time()]
+        lock = threading.Lock()
+
+        def progress(index, position):
+            with lock:
+                positions[index] = position
+                if time.time() - last_saved[0] >= 1:
+                    last_saved[0] = time.time()
+                    transfer_funcs.save_partial_transfer(save_path, self.host_ip, transfer_id, transfer_funcs.contiguous_position(ranges, positions))
+
+        def receive_range(index):
+            start, end = ranges[index]
+            with socket.create_connection((self.host_ip, transfer_port)) as data_sock:
+                data_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+                data_sock.sendall(token.encode() + transfer_funcs.RANGE_INDEX.pack(index))
+                transfer_funcs.receive_range(data_sock, part_path, start, end, lambda position: progress(index, position), self.cancelled_download)
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                list(pool.map(receive_range, range(len(ranges))))
+        finally:
+            with lock:
+                transfer_funcs.save_partial_transfer(save_path, self.host_ip, transfer_id, transfer_funcs.contiguous_position(ranges, positions))
+
+    def start_world_sync(self, world):
+        world_folder = file_funcs.pick_folder(self, starting_path=(self.world_transfer_location or ""), dialog_title=f"Your Copy of {world}")
+        if not world_folder:
+            return
+        if not os.path.isfile(os.path.join(world_folder, "level.dat")):
+            self.log_queue.put(f"{self.timestamp()} <font color='red'>That folder is not a Minecraft world.</font>")
+            return
+        
+        self.world_sync_folder = world_folder
+        self.send_request("begin-world-sync", world)
+
+    def sync_world(self, world, transfer_port, world_folder):
+        delta_path = os.path.join(os.path.dirname(world_folder), f".{world}.sync.zip")
+        try:
+            self.download_message_signal.emit("Comparing world files...")
+            manifest = transfer_funcs.build_world_manifest(world_folder)
+            received = 0
+            sha256 = hashlib.sha256()
+            with socket.create_connection((self.host_ip, transfer_port)) as transfer_sock:
+                transfer_funcs.send_manifest(transfer_sock, manifest)
+                self.download_message_signal.emit("Downloading changes...")
+                with open(delta_path, "wb") as f:
+                    received = self.receive_world(transfer_sock, sha256, f.write)
+            
+            if self.close_threads.is_set() or self.cancelled_download.is_set():
+                return
+            if not self.transfer_finished.wait(30):
+                raise ConnectionResetError("Connection to the host was lost.")
+            if self.transfer_checksum == "cancelled":
+                return
+            if self.transfer_checksum and sha256.hexdigest() != self.transfer_checksum:
+                raise ValueError("The downloaded changes failed their checksum.")
+            
+            self.download_message_signal.emit("Applying changes...")
+            changed, patched, deleted = transfer_funcs.apply_world_delta(world_folder, delta_path)
+            self.resources_download_path = world_folder
+            self.download_complete_signal.emit()
+            self.log_queue.put(f"{self.timestamp()} <font color='green'>Synced {world} by downloading {file_funcs.format_size(received)}. Updated {len(changed)} files and {len(patched)} region files, and removed {len(deleted)} files.</font>")
+        except Exception as e:
+            self.log_queue.put(f"{self.timestamp()} <font color='red'>Sync of {world} failed: {str(e)}</font>")
+            self.download_cancelled_signal.emit()
+        finally:
+            if os.path.exists(delta_path):
+                os.remove(delta_path)
+
     def timestamp(self):
         t = time.localtime(time.time())
         hour = t.tm_hour
@@ -1506,6 +2054,8 @@ class ServerManagerApp(QMainWindow):
         if server_button in self.saved_server_buttons:
             self.saved_server_buttons.remove(server_button)
         self.delete_saved_server(server_button.server_name, server_button.server_ip)
+        if not any(server["ip"] == server_button.server_ip for server in self.saved_servers):
+            self.host_pool.disconnect(server_button.server_ip)
         
         
         row_layout.removeWidget(server_button)
@@ -1515,7 +2065,7 @@ class ServerManagerApp(QMainWindow):
         delete_button.deleteLater()
         row_layout.deleteLater()
 
-        server_button.schedule_deletion()
+        server_button.deleteLater()
     
     def add_server(self):
         name = self.server_name_prompt.text()
@@ -1624,6 +2174,8 @@ class ServerManagerApp(QMainWindow):
         except:
             pass
         self.close_threads.set()
+        self.status_prober.stop()
+        self.host_pool.stop()
         if self.receive_thread:
             self.receive_thread.join()
         if self.message_thread:
@@ -10,11 +10,12 @@ import glob
 import shutil
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pyperclip import copy
 from PIL import Image
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QStackedLayout, QGridLayout, QWidget, QTextBrowser, QCheckBox, QFrame, QSizePolicy, QPlainTextEdit, QListWidget, QMenu, QListWidgetItem, QTabWidget, QMessageBox, QProgressDialog, QInputDialog, QStyle
 from PyQt6.QtGui import QFont, QIcon, QPixmap, QPainter, QPaintEvent, QDesktopServices, QColor, QCursor, QCloseEvent, QIntValidator
-from PyQt6.QtCore import Qt, QRect, pyqtSignal, QTimer, pyqtSlot, QUrl, QPoint, QCoreApplication
+from PyQt6.QtCore import Qt, QRect, pyqtSignal, QTimer, pyqtSlot, QUrl, QPoint, QCoreApplication, QObject
 
 import queries
 import file_funcs
@@ -22,9 +23,18 @@ import websock_mgmt
 import html
 import supervisor
 import nbt_funcs
+import backup_funcs
+import maintenance
+import transfer_funcs
+import pack_server
+import host_server
+import status_service
+import state_sync
+import request_limits
 
 VERSION = "v2.10.14"
 DEBUG_LOGS = False
+TRANSFER_ACCEPT_TIMEOUT = 60
 
 if getattr(sys, "frozen", False):
     BASE_DIR = Path(sys.executable).parent
@@ -82,17 +92,153 @@ class HoverButton(QPushButton):
         self.changeHovering.emit(False)
         super().leaveEvent(event)
 
+class TransferWorker(QObject):
+    """Sends one world transfer on its own thread, reporting back to the GUI through signals."""
+    progress = pyqtSignal(int, str) # percent, label
+    finished = pyqtSignal()
+
+    def __init__(self, host: "ServerManagerApp", world, client: socket.socket, resume=None, streams=1):
+        super().__init__()
+        self.host = host
+        self.world = world
+        self.client = client
+        self.resume = resume
+        self.streams = max(1, min(streams, transfer_funcs.MAX_TRANSFER_STREAMS))
+        self.cancelled = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        host = self.host
+        world = self.world
+        client = self.client
+        archive = None
+        transfer_sock = None
+        try:
+            host.log_queue.put(f"{host.clients.get(client)} initiated a world transfer for {world}.")
+            
+            world_path = Path(host.server_path) / "worlds" / world
+            host.transfer_cache.evict()
+            offset, transfer_id = self.resume or (0, "")
+            archive = host.transfer_cache.acquire_transfer(transfer_id) if transfer_id else None
+            if archive and (archive.world != world or (archive.finished.is_set() and offset > archive.size)):
+                host.transfer_cache.release(archive)
+                archive = None
+            
+            if archive:
+                host.log_queue.put(f"Resuming transfer of {world} from {file_funcs.format_size(offset)}.")
+            else:
+                offset = 0
+                if host.cached_status().status == "online":
+                    # Region files change under a running world, so it can't be archived
+                    host.tell(client, "<font color='red'>Cannot initiate world transfer while server is running.</font>")
+                    raise InterruptedError("The server is running")
+                archive, created = host.transfer_cache.acquire_world(world, world_path)
+                if created:
+                    # Built once, and shared with anyone else downloading the world in the same state
+                    host.maintenance.submit(f"archive of '{world}'", host.build_transfer_archive, archive, world_path)
+                else:
+                    host.log_queue.put(f"Reusing the prepared archive of {world}.")
+            
+            if self.streams > 1:
+                # Ranges need the final size, so split transfers wait for the archive to be finished
+                host.send_data("zipping-world", [0], client)
+                self.progress.emit(0, f"Preparing {world}...")
+                while not archive.finished.wait(0.5):
+                    if self.cancelled.is_set():
+                        raise InterruptedError("Transfer cancelled by host")
+                if archive.failed:
+                    raise InterruptedError("The archive could not be prepared")
+            
+            # While the archive is still being built, progress is measured against the uncompressed world
+            total_bytes = archive.size if archive.finished.is_set() else file_funcs.get_total_size(world_path)
+            transfer_sock = transfer_funcs.TransferSocket(host.host_ip, backlog=self.streams)
+            token = transfer_funcs.new_transfer_token() if self.streams > 1 else ""
+            host.log_queue.put("Transferring world...")
+            host.send_data("starting-transfer", [total_bytes, world, transfer_sock.port, archive.transfer_id, offset, self.streams, token], client)
+
+            last_update = [time.time(), offset]
+            def prog_update(sent):
+                current_time = time.time()
+                if current_time - last_update[0] > 1:
+                    rate = (sent - last_update[1]) / (current_time - last_update[0])
+                    last_update[0], last_update[1] = current_time, sent
+                    total = archive.size if archive.finished.is_set() else total_bytes
+                    eta = file_funcs.format_duration((total - sent) / rate) if rate > 0 and total > sent else "--"
+                    self.progress.emit(min(100, int((sent / total) * 100)) if total else 0,
+                                       f"Transferring {world}...<br>{file_funcs.format_size(sent)} sent at {file_funcs.format_size(rate)}/s, {eta} left")
+                    host.send_data("transfer-progress", [sent, f"{file_funcs.format_size(rate)}/s, {eta} left"], client)
+
+            throttle = host.bandwidth.throttle_for_transfer()
+            if self.streams > 1:
+                self.send_ranges(transfer_sock, archive, offset, token, prog_update, throttle)
+            else:
+                transfer_sock.waitfor(client.getpeername()[0], timeout=TRANSFER_ACCEPT_TIMEOUT)
+                transfer_funcs.send_archive(transfer_sock.transfer_client, archive.path, offset, archive.finished, prog_update,
+                                            self.cancelled, throttle, archive.started)
+            if archive.failed:
+                raise InterruptedError("The archive could not be prepared")
+            
+            self.progress.emit(100, f"Transferring {world}...")
+            host.send_data("transfer-complete", [world, archive.sha256, archive.size], client)
+            host.log_queue.put("<font color='green'>Transfer complete!</font>")
+        
+        except socket.timeout:
+            host.log_queue.put(f"<font color='red'>Cancelled transfer of '{world}'. The client did not connect for the download.</font>")
+        except InterruptedError:
+            host.send_data("cancelled-transfer", world, client)
+            host.log_queue.put(f"<font color='red'>Cancelled transfer of '{world}'.</font>")
+        except (ConnectionResetError, BrokenPipeError):
+            host.log_queue.put(f"<font color='red'>Lost connection during the transfer of '{world}'. It can be resumed for the next {host.transfer_cache.max_age // 60} minutes.</font>")
+        except Exception as e:
+            host.log_queue.put(f"<font color='red'>Transfer error: {str(e)}</font>")
+        finally:
+            if transfer_sock:
+                transfer_sock.close()
+            if archive:
+                host.transfer_cache.release(archive)
+            self.finished.emit()
+
+    def send_ranges(self, transfer_sock: transfer_funcs.TransferSocket, archive, offset, token, progress_function, throttle):
+        """Splits the rest of the archive into one range per stream. Each of the client's connections opens
+        with the token and the index of the range it wants, and the ranges are sent side by side."""
+        ranges = transfer_funcs.split_ranges(offset, archive.size, self.streams)
+        sent = [offset]
+        lock = threading.Lock()
+
+        def range_progress(amount):
+            with lock:
+                sent[0] += amount
+                progress_function(sent[0])
+
+        client_ip = self.client.getpeername()[0]
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="transfer") as pool:
+            senders = []
+            for _ in ranges:
+                data_client = transfer_sock.accept_token(client_ip, token, timeout=TRANSFER_ACCEPT_TIMEOUT)
+                index = transfer_funcs.RANGE_INDEX.unpack(transfer_funcs.receive_exactly(data_client, transfer_funcs.RANGE_INDEX.size))[0]
+                if index >= len(ranges):
+                    raise ValueError("The client asked for a range that doesn't exist")
+                start, end = ranges[index]
+                senders.append(pool.submit(transfer_funcs.send_archive_range, data_client, archive.path, start, end,
+                                           range_progress, self.cancelled, throttle))
+            for sender in senders:
+                sender.result()
+
 class ServerManagerApp(QMainWindow):
     get_status_signal = pyqtSignal()
-    set_status_signal = pyqtSignal(list)
-    update_players_list_signal = pyqtSignal(list)
+    status_snapshot_signal = pyqtSignal(object, bool) # snapshot, whether it answers a refresh
     start_server_signal = pyqtSignal(list) # [client, world_name]
     stop_server_signal = pyqtSignal(object)
     wait_for_server_shutdown_signal = pyqtSignal()
     stats_signal = pyqtSignal(object) # For memory stats
     close_manager_signal = pyqtSignal(bool)
     update_properties_signal = pyqtSignal(str, str, bool)
-    transfer_signal = pyqtSignal(str, object)
+    transfer_signal = pyqtSignal(str, object, object, int) # world, client, (offset, transfer id) or None, streams
 
     def __init__(self):
         super().__init__()
@@ -105,9 +251,8 @@ class ServerManagerApp(QMainWindow):
         self.host_ip = ""
         self.port = 5555
         self.server_port = "25565"
-        self.server = None # server socket
+        self.host_server = host_server.HostServer(self, request_limits.RequestLimiter())
         self.java_version = ""
-        self.receive_thread = threading.Thread(target=self.receive)
         self.message_timer = QTimer(self)
         self.message_timer.timeout.connect(self.check_messages)
         self.ips = {}
@@ -144,15 +289,14 @@ class ServerManagerApp(QMainWindow):
 
         # Signals
         self.get_status_signal.connect(self.get_status)
-        self.set_status_signal.connect(self.set_status)
-        self.update_players_list_signal.connect(self.update_players_list)
+        self.status_snapshot_signal.connect(self.show_status)
         self.start_server_signal.connect(self.client_start_server)
         self.stop_server_signal.connect(self.client_stop_server)
         self.wait_for_server_shutdown_signal.connect(self.wait_for_server_shutdown)
         self.stats_signal.connect(self.update_stats)
         self.close_manager_signal.connect(self.close_manager)
         self.update_properties_signal.connect(self.update_saved_properties)
-        self.transfer_signal.connect(self.transfer_world)
+        self.transfer_signal.connect(self.start_transfer)
 
         self.supervisor_connector = supervisor.SupervisorConnector(self.log_queue,
                                                                    self.server_log_queue,
@@ -162,6 +306,15 @@ class ServerManagerApp(QMainWindow):
                                                                    self.close_manager_signal)
         self.waiting_for_server_shutdown = threading.Event()
         self.async_runner = supervisor.AsyncRunner()
+        self.maintenance = maintenance.MaintenanceRunner(log_function=self.log_queue.put)
+        self.transfer_cache = transfer_funcs.TransferCache(str(Path(os.environ.get("TEMP", ".")) / "world_transfers"))
+        self.transfer_workers = set()
+        self.bandwidth = transfer_funcs.BandwidthLimiter()
+        self.pack_server = None
+        self.status_service = status_service.StatusService(self.query_status, self.query_players, self.status_updated)
+        self.state = state_sync.StateStore()
+        self.state_subscribers = set()
+        self.request_results = request_limits.SharedResults()
 
         # Minecraft Server Management Protocol Listener
         self.bus = None
@@ -684,6 +837,13 @@ class ServerManagerApp(QMainWindow):
         backup_button = QPushButton("Save Backup")
         backup_button.clicked.connect(self.backup_world)
         backup_button.setObjectName("yellowButton")
+        snapshot_button = QPushButton("Save Snapshot")
+        snapshot_button.clicked.connect(self.save_snapshot)
+        snapshot_button.setObjectName("yellowButton")
+        duplicate_world_button = QPushButton("Duplicate World")
+        duplicate_world_button.clicked.connect(self.duplicate_world)
+        verify_backups_button = QPushButton("Verify Backups")
+        verify_backups_button.clicked.connect(lambda: self.verify_backups())
         cancel_button = QPushButton("Cancel")
         cancel_button.setObjectName("smallRedButton")
         cancel_button.clicked.connect(self.show_main_page)
@@ -691,8 +851,11 @@ class ServerManagerApp(QMainWindow):
         top_box.addWidget(add_world_button)
         top_box.addWidget(update_world_button)
         top_box.addWidget(self.prune_world_button)
+        top_box.addWidget(duplicate_world_button)
         top_box.addWidget(remove_world_button)
         top_box.addWidget(backup_button)
+        top_box.addWidget(snapshot_button)
+        top_box.addWidget(verify_backups_button)
         bot_box.addWidget(cancel_button)
 
         center_layout.addLayout(top_box)
@@ -1600,6 +1763,7 @@ class ServerManagerApp(QMainWindow):
     def show_main_page(self, ignore_load=False):
         if not ignore_load:
             saved_ip, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings = file_funcs.load_settings(self.log_queue, self.file_lock)
+            self.publish_worlds()
         
         self.check_messages()
         self.stacked_layout.setCurrentIndex(0)
@@ -1757,208 +1921,194 @@ class ServerManagerApp(QMainWindow):
         self.create_server_button.setEnabled(new_text != "")
 
     def start_manager_server(self):
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server.settimeout(0.1)
         if self.host_ip == "":
             self.show_ip_entry_page()
             self.default_ip_check.setChecked(False)
             return
-        try:
-            self.server.bind((self.host_ip, self.port))
-            self.server.listen()
-        except:
+        if not self.host_server.start(self.host_ip, self.port):
             self.prepare_ip_page(failed=True)
             return
         self.ip_button.setText(f"IP: {self.host_ip}")
         self.show_main_page()
         self.first_load()
-        self.receive_thread = threading.Thread(target=self.receive)
-        self.receive_thread.start()
         self.message_timer.start(1000)
     
-    def receive(self):
-        handlers = []
-        while not self.stop_threads.is_set():
-            try:
-                client, address = self.server.accept()
-                intention = client.recv(1024).decode("utf-8")
-                if intention == "connection request":
-                    client_thread = threading.Thread(target=self.handle_client, args=(client, address))
-                    handlers.append(client_thread)
-                    client_thread.start()
-            except socket.timeout as e:
-                pass
-            except socket.error as e:
-                break
-        
-        for thread in handlers:
-            thread.join()
-    
-    def handle_client(self, client: socket.socket, address):
-        skip_receive = False
-        messages = []
-        ip, port = address
-        if self.ips.get(ip) is not None:
-            self.clients[client] = self.ips.get(ip)
-            client.sendall("accept".encode("utf-8"))
-        else:
-            # Get display name
-            client.sendall("identify".encode("utf-8"))
-            stop = False
-            while not stop and not self.stop_threads.is_set():
-                try:
-                    message = client.recv(1024).decode('utf-8')
-                    if not message:
-                        client.close()
-                        return
-
-                    messages += message.split("CLIENT-MESSAGE~~>")[1:]
-
-                    self.clients[client] = messages.pop(0)
-                    self.ips[ip] = self.clients[client]
-                    file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
-                    stop = True
-                except socket.error as e:
-                    if e.errno == 10035: # Non blocking socket error
-                        pass
-                    else:
-                        client.close()
-                        return
-                
-                time.sleep(1)
+    def client_name(self, ip):
+        return self.ips.get(ip)
+
+    def name_client(self, client, name):
+        ip = client.getpeername()[0]
+        self.clients[client] = name
+        if self.ips.get(ip) != name:
+            self.ips[ip] = name
+            file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
 
+    def client_joined(self, client):
         self.send_data("host-version", VERSION, client)
         
         self.log_queue.put(f"<font color='#5050de'>{html.escape(self.clients[client])} has joined the room!</font>")
         self.tell(client, f"You have joined the room!")
-        for send_client, _ in self.clients.items():
+        for send_client, _ in list(self.clients.items()):
             if send_client is not client:
                 self.tell(send_client, f"<font color='#5050de'>{html.escape(self.clients[client])} has joined the room!</font>")
-        
-        self.delay(1)
 
-        while not self.stop_threads.is_set() and not skip_receive:
-            try:
-                new_message = client.recv(1024).decode('utf-8')
-                if not new_message:
-                    break
+    def client_left(self, client):
+        self.state_subscribers.discard(client)
+        self.log_queue.put(f"<font color='#5050de'>{html.escape(self.clients[client])} has left the room.</font>")
+        self.broadcast(f"<font color='#5050de'>{html.escape(self.clients[client])} has left the room.</font>")
+        self.clients.pop(client)
 
-                messages += new_message.split("CLIENT-MESSAGE~~>")[1:]
+    def handle_chat(self, client, message):
+        self.log_queue.put(f'<font color="#5050de">{html.escape(self.clients[client])}: {message}</font>')
+        self.broadcast(message, client)
+
+    def handle_request(self, client, request, args):
+        if request == "get-status":
+            # self.log_queue.put(f"{html.escape(self.clients[client])} queried the server status.")
+            self.send_data("status", self.cached_status().status_info(), client)
+        elif request == "get-players":
+            snapshot = self.cached_status()
+            # self.log_queue.put(f"{html.escape(self.clients[client])} queried the active players.")
+            if snapshot.status == "online":
+                self.send_data("players", list(snapshot.players), client)
+            else:
+                self.tell(client, "The server has closed.")
+                self.send_data("status", snapshot.status_info(), client)
+        elif request == "get-worlds-list":
+            self.send_data("worlds-list", self.query_worlds(), client)
+        elif request == "subscribe-state":
+            # Sent with the last state the client saw, so a reconnecting client only gets what it missed
+            store_id = args[0] if args else ""
+            version = int(args[1]) if len(args) > 1 and args[1].isdigit() else 0
+            with self.state.lock:
+                updates = self.state.changes_since(store_id, version)
+                if updates is None:
+                    self.send_data("state-snapshot", self.state.snapshot(), client)
+                else:
+                    self.send_data("state-diff", {"id": self.state.id, "updates": updates}, client)
+                self.state_subscribers.add(client)
+        elif request in ["start-server", "stop-server"]:
+            self.log_queue.put(f"{html.escape(self.clients[client])} requested to {request[:request.find('-')]} the server.")
+            if request == "stop-server":
+                self.stop_server_signal.emit(client)
+            elif request == "start-server":
+                self.start_server_signal.emit([client, args[0]])
+        elif request == "restart-server":
+            self.tell(client, "<font color='red'>The host manager no longer supports restarting worlds in the current version.</font>")
+            self.tell(client, "You are using an outdated client version. You can find the latest release at https://www.github.com/Peter-Vanderhyde/Minecraft-Manager/releases.")
+        elif request == "check-resources":
+            world_folder_path = self.server_path + "\\worlds\\" + args[0]
+            has_resources, resource_paths = self.request_results.get(("resources", world_folder_path), request_limits.RESOURCES_TTL,
+                                                                     file_funcs.get_available_resources, world_folder_path)
+            self.send_data("available-resources", [args[0], has_resources], client)
+        elif request == "download-resources":
+            world = args[0]
+            resources = args[1:]
+            world_folder_path = self.server_path + "\\worlds\\" + world
+            has_resources, resource_paths = file_funcs.get_available_resources(world_folder_path, resources)
+            if not has_resources:
+                return
 
-                if "CLOSING" in messages:
-                    break
-                while len(messages) != 0:
-                    message = messages.pop(0)
-                    if message == "":
-                        continue
-
-                    if not message.startswith("MANAGER-REQUEST"):
-                        self.log_queue.put(f'<font color="#5050de">{html.escape(self.clients[client])}: {message}</font>')
-                        self.broadcast(message, client)
-                    else:
-                        data = message.split('~~>')[-1].split(',')
-                        request, args = data[0], data[1:]
-                        if request == "get-status":
-                            # self.log_queue.put(f"{html.escape(self.clients[client])} queried the server status.")
-                            result = self.query_status()
-                            # self.log_queue.put(f"Server status is: {result[0]}.")
-                            self.set_status_signal.emit(result)
-                            self.send_data("status", result)
-                        elif request == "get-players":
-                            status = self.query_status()
-                            # self.log_queue.put(f"{html.escape(self.clients[client])} queried the active players.")
-                            if status[0] == "online":
-                                players = self.query_players()
-                                self.update_players_list_signal.emit(players)
-                            else:
-                                self.set_status_signal.emit(status)
-                                self.tell(client, "The server has closed.")
-                                self.send_data("status", status)
-                        elif request == "get-worlds-list":
-                            self.send_data("worlds-list", self.query_worlds(), client)
-                        elif request in ["start-server", "stop-server"]:
-                            self.log_queue.put(f"{html.escape(self.clients[client])} requested to {request[:request.find('-')]} the server.")
-                            if request == "stop-server":
-                                self.stop_server_signal.emit(client)
-                            elif request == "start-server":
-                                self.start_server_signal.emit([client, args[0]])
-                        elif request == "restart-server":
-                            self.tell(client, "<font color='red'>The host manager no longer supports restarting worlds in the current version.</font>")
-                            self.tell(client, "You are using an outdated client version. You can find the latest release at https://www.github.com/Peter-Vanderhyde/Minecraft-Manager/releases.")
-                        elif request == "check-resources":
-                            world_folder_path = self.server_path + "\\worlds\\" + args[0]
-                            has_resources, resource_paths = file_funcs.get_available_resources(world_folder_path)
-                            self.send_data("available-resources", [args[0], has_resources], client)
-                        elif request == "download-resources":
-                            world = args[0]
-                            resources = args[1:]
-                            world_folder_path = self.server_path + "\\worlds\\" + world
-                            has_resources, resource_paths = file_funcs.get_available_resources(world_folder_path, resources)
-                            if not has_resources:
-                                continue
-                            
-                            total_size = sum(os.path.getsize(file) for file in resource_paths)
-                            for i, file in enumerate(resource_paths):
-                                filesize = os.path.getsize(file)
-                                filename = os.path.basename(file)
-                                header = [filename, filesize, i + 1, len(resource_paths), total_size]
-                                self.send_data("sending-file", header, client)
-                                with open(file, "rb") as f:
-                                    client.sendfile(f)
-                            self.send_data("file-transfer-complete", "", client)
-                        elif request == "get-world-size":
-                            if self.query_status()[0] == "online":
-                                self.tell(client, "<font color='red'>Cannot initiate world transfer while server is running.</font>")
-                                continue
-
-                            size = file_funcs.get_total_size(os.path.join(self.server_path, "worlds", args[0]))
-                            size_mb = size // (1024 * 1024)
-                            self.send_data("world-size", [size_mb, args[0]], client)
-                        elif request == "begin-world-transfer":
-                            world = args[0]
-                            self.transfer_signal.emit(world, client)
-                        elif request == "check-download-enabled":
-                            world = args[0]
-                            self.send_data("downloadable-world", [world, world not in self.disabled_download_worlds], client)
-                        elif request == "get-resource-names":
-                            world_folder_path = self.server_path + "\\worlds\\" + args[0]
-                            has_resources, resource_paths = file_funcs.get_available_resources(world_folder_path)
-                            if has_resources:
-                                names = [os.path.basename(file_path) for file_path in resource_paths]
-                                self.send_data("resource-names", names, client)
-                        elif request == "closing":
-                            try:
-                                client.close()
-                            except socket.error:
-                                pass
+            total_size = sum(os.path.getsize(file) for file in resource_paths)
+            throttle = self.bandwidth.throttle_for_transfer()
+            for i, file in enumerate(resource_paths):
+                filesize = os.path.getsize(file)
+                filename = os.path.basename(file)
+                header = [filename, filesize, i + 1, len(resource_paths), total_size]
+                self.send_data("sending-file", header, client)
+                client.send_file(file, throttle)
+            self.send_data("file-transfer-complete", "", client)
+        elif request == "download-resources-stream":
+            world, streams = args[0], int(args[1])
+            resources = args[2:]
+            world_folder_path = self.server_path + "\\worlds\\" + world
+            has_resources, resource_paths = file_funcs.get_available_resources(world_folder_path, resources)
+            if not has_resources:
+                return
+            threading.Thread(target=self.send_resources, args=(client, resource_paths, streams), daemon=True).start()
+        elif request == "get-world-size":
+            if self.cached_status().status == "online":
+                self.tell(client, "<font color='red'>Cannot initiate world transfer while server is running.</font>")
+                return
 
-            except socket.error as e:
-                if e.errno == 10035: # Non blocking socket error
-                    pass
+            world_path = os.path.join(self.server_path, "worlds", args[0])
+            size = self.request_results.get(("world-size", world_path), request_limits.WORLD_SIZE_TTL, file_funcs.get_total_size, world_path)
+            size_mb = size // (1024 * 1024)
+            self.send_data("world-size", [size_mb, args[0]], client)
+        elif request == "begin-world-transfer":
+            world = args[0]
+            resume = (int(args[1]), args[2]) if len(args) >= 3 else None
+            streams = int(args[3]) if len(args) >= 4 else 1
+            self.transfer_signal.emit(world, client, resume, streams)
+        elif request == "begin-world-sync":
+            world = args[0]
+            if world in self.disabled_download_worlds:
+                self.tell(client, "<font color='red'>This world is not available for download.</font>")
+                return
+            if self.cached_status().status == "online":
+                self.tell(client, "<font color='red'>Cannot initiate world transfer while server is running.</font>")
+                self.send_data("cancelled-transfer", world, client)
+                return
+            # Mostly waits on the client, so it gets its own thread rather than holding a maintenance worker
+            threading.Thread(target=self.sync_world, args=(world, client), daemon=True).start()
+        elif request == "check-download-enabled":
+            world = args[0]
+            self.send_data("downloadable-world", [world, world not in self.disabled_download_worlds], client)
+        elif request == "get-resource-names":
+            world_folder_path = self.server_path + "\\worlds\\" + args[0]
+            has_resources, resource_paths = self.request_results.get(("resources", world_folder_path), request_limits.RESOURCES_TTL,
+                                                                     file_funcs.get_available_resources, world_folder_path)
+            if has_resources:
+                if "details" in args[1:]:
+                    # Newer clients use the sizes and hashes to skip files they already have
+                    names = transfer_funcs.resource_details(resource_paths)
                 else:
-                    print(e)
-                    break
-            except Exception as e:
-                print(e)
-                break
-
-            time.sleep(0.5)
-        
-        client.close()
-        self.log_queue.put(f"<font color='#5050de'>{html.escape(self.clients[client])} has left the room.</font>")
-        self.broadcast(f"<font color='#5050de'>{html.escape(self.clients[client])} has left the room.</font>")
-        self.clients.pop(client)
+                    names = [os.path.basename(file_path) for file_path in resource_paths]
+                self.send_data("resource-names", names, client)
+        elif request == "closing":
+            try:
+                client.close()
+            except socket.error:
+                pass
 
     def send_data(self, topic, data, client=None):
         if not isinstance(data, (list, tuple, dict)):
             data = [data]
         if client:
-            self.tell(client, f"DATA-RETURN({topic})~~>{json.dumps(data)}")
+            client.send_data(topic, data)
         else:
-            self.broadcast(f"DATA-RETURN({topic})~~>{json.dumps(data)}")
+            for client in list(self.clients):
+                if topic in state_sync.SYNCED_TOPICS and client in self.state_subscribers:
+                    # Subscribed clients get the change through publish_state instead
+                    continue
+                try:
+                    client.send_data(topic, data)
+                except Exception:
+                    pass
     
+    def publish_state(self, values):
+        # Held while sending, so subscribers get the changes in version order
+        with self.state.lock:
+            update = self.state.update(values)
+            if update is None:
+                return
+            for client in list(self.state_subscribers):
+                try:
+                    client.send_data("state-diff", {"id": self.state.id, "updates": [update]})
+                except Exception:
+                    pass
+
+    def publish_worlds(self):
+        self.publish_state({"worlds": self.worlds, "world-order": self.world_order})
+        self.send_data("worlds-list", self.query_worlds())
+
+    def forget_world_results(self, world):
+        """Drops the world's shared request results after its files change, so clients aren't sent old ones."""
+        self.request_results.forget(("resources", self.server_path + "\\worlds\\" + world))
+        self.request_results.forget(("world-size", os.path.join(self.server_path, "worlds", world)))
+
     def broadcast(self, message, owner=None, admin_message=False):
-        for client, name in self.clients.items():
+        for client, name in list(self.clients.items()):
             try:
                 if owner:
                     if client is owner:
@@ -1974,7 +2124,7 @@ class ServerManagerApp(QMainWindow):
                 pass
     
     def tell(self, client, message):
-        client.sendall(f"SERVER-MESSAGE~~>{message}\n".encode("utf-8"))
+        client.send_text(message)
     
     def check_messages(self):
         while not self.log_queue.empty():
@@ -2035,7 +2185,13 @@ class ServerManagerApp(QMainWindow):
     
     def first_load(self):
         self.verify_world_formatting() # Update outdated formatting from previous versions
+        self.maintenance.configure(self.universal_settings["maintenance"])
+        self.transfer_cache.configure(self.universal_settings["transfer cache"])
+        self.bandwidth.configure(self.universal_settings["transfer bandwidth"])
+        self.start_pack_server()
+        self.status_service.start()
         self.set_worlds_list()
+        self.publish_worlds()
         timer = QTimer(self)
         timer.setSingleShot(True)
         timer.timeout.connect(self.connect_supervisor)
@@ -2076,9 +2232,53 @@ class ServerManagerApp(QMainWindow):
             }
             outdated = True
         
+        if "backup retention" not in self.universal_settings:
+            self.universal_settings["backup retention"] = dict(backup_funcs.DEFAULT_RETENTION)
+            outdated = True
+        
+        if "maintenance" not in self.universal_settings:
+            self.universal_settings["maintenance"] = dict(maintenance.DEFAULT_MAINTENANCE)
+            outdated = True
+        
+        if "transfer bandwidth" not in self.universal_settings:
+            self.universal_settings["transfer bandwidth"] = {"per transfer limit mb": 0, "total limit mb": 0, "limit while players online mb": 2}
+            outdated = True
+        
+        if "transfer cache" not in self.universal_settings:
+            self.universal_settings["transfer cache"] = {"max age minutes": 30, "disk budget gb": 10}
+            outdated = True
+        
+        if "resource pack server" not in self.universal_settings:
+            self.universal_settings["resource pack server"] = dict(pack_server.DEFAULT_PACK_SERVER)
+            outdated = True
+        
         if outdated:
             file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
         
+    def start_pack_server(self):
+        settings = self.universal_settings["resource pack server"]
+        if not settings.get("enabled", True):
+            return
+        try:
+            self.pack_server = pack_server.ResourcePackServer(self.path(self.server_path, "worlds"), self.host_ip, int(settings.get("port", pack_server.PACK_SERVER_PORT)))
+            self.pack_server.start()
+        except OSError as e:
+            self.pack_server = None
+            self.log_queue.put(f"<font color='orange'>WARNING: Could not start the resource pack server: {str(e)}</font>")
+    
+    def resource_pack_for(self, world):
+        """The (url, sha1) of the pack the server should hand to joining players, or None to leave it unset."""
+        if not self.pack_server:
+            return None
+        try:
+            path = pack_server.choose_pack(self.path(self.server_path, "worlds", world))
+            if not path:
+                return None
+            sha1 = pack_server.pack_sha1(path)
+        except OSError:
+            return None
+        self.log_queue.put(f"Serving '{os.path.basename(path)}' as the resource pack for {world}.")
+        return self.pack_server.pack_url(world, path), sha1
     
     def message_entered(self):
         message = self.message_entry.text()
@@ -2111,7 +2311,7 @@ class ServerManagerApp(QMainWindow):
     def api_connection(self, success):
         if success:
             waited = 0
-            while waited < 10 and self.query_status()[0] != "online":
+            while waited < 10 and self.status_service.refresh(wait=True).status != "online":
                 self.delay(1)
                 waited += 1
             self.get_status_signal.emit()
@@ -2142,9 +2342,7 @@ class ServerManagerApp(QMainWindow):
         if error:
             if error == "already online":
                 self.tell(client, "Server already running.")
-                updated_status = self.query_status()
-                self.set_status_signal.emit(updated_status)
-                self.send_data("status", updated_status)
+                self.send_data("status", self.status_service.snapshot().status_info(), client)
             else:
                 self.tell(client, error)
     
@@ -2153,9 +2351,7 @@ class ServerManagerApp(QMainWindow):
         if error:
             if error == "already offline":
                 self.tell(client, "Server already stopped.")
-                updated_status = self.query_status()
-                self.set_status_signal.emit(updated_status)
-                self.send_data("status", updated_status)
+                self.send_data("status", self.status_service.snapshot().status_info(), client)
             else:
                 self.tell(client, error)
     
@@ -2170,11 +2366,12 @@ class ServerManagerApp(QMainWindow):
                 if not self.bus_shutdown_complete.is_set():
                     self.shutdown_bus()
             
-            status, _, _ = self.query_status()
-            if status == "online":
+            if self.status_service.refresh(wait=True).status == "online":
                 self.log_queue.put("Server is already online.")
                 return "already online"
             
+            # The world grows while it runs
+            self.forget_world_results(world)
             version, gamemode, difficulty, fabric, level_type = None, None, None, None, None
             if self.worlds.get(world):
                 version = self.worlds[world].get("version")
@@ -2226,6 +2423,9 @@ class ServerManagerApp(QMainWindow):
                             self.log_queue.put(f"Generating {level_type} world with random seed...")
                     self.delay(1)
 
+                    if os.path.isdir(path) and not self.unshare_world_files(path):
+                        raise RuntimeError("Some of its files are still shared with a snapshot.")
+
                     older_files = ["banned-players.txt", "banned-ips.txt", "ops.txt", "white-list.txt", "server.log"]
                     for file in older_files:
                         try:
@@ -2288,12 +2488,14 @@ class ServerManagerApp(QMainWindow):
                     if self.is_api_compatible(version):
                         api_version = self.get_api_version(version)
                         file_funcs.get_api_settings(self.server_path, api_version)
-                    if not file_funcs.prepare_server_settings(world, version, gamemode, difficulty, fabric, level_type, self.server_path, self.log_queue, seed):
+                    if not file_funcs.prepare_server_settings(world, version, gamemode, difficulty, fabric, level_type, self.server_path, self.log_queue, seed, self.resource_pack_for(world),
+                                                              self.pack_server.base_url() if self.pack_server else None):
                         raise RuntimeError("Failed to prepare settings.")
                     else:
                         if seed is not None:
                             self.worlds[world].pop("seed")
                             file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
+                            self.publish_worlds()
                 
                     with open(self.path(self.server_path, "run.bat"), 'r') as f:
                         args = f.read()
@@ -2402,9 +2604,10 @@ class ServerManagerApp(QMainWindow):
             raise Exception("Invalid closing mode: ", mode)
 
         if mode == "auto":
-            if self.query_status()[0] == "offline":
+            snapshot = self.status_service.refresh(wait=True)
+            if snapshot.status == "offline":
                 mode = "immediate"
-            elif len(self.query_players()) > 0:
+            elif len(snapshot.players) > 0:
                 self.log_queue.put("Giving players 10 seconds notice...")
                 mode = "delayed"
             else:
@@ -2413,7 +2616,7 @@ class ServerManagerApp(QMainWindow):
         self.supervisor_send({"type": "close", "mode": mode})
     
     def stop_server(self):
-        status, _, world = self.query_status()
+        status, _, world = self.status_service.refresh(wait=True).status_info()
         if status == "offline":
             self.log_queue.put("Server is already offline.")
             return "already offline"
@@ -2513,13 +2716,31 @@ class ServerManagerApp(QMainWindow):
     def query_worlds(self):
         return (self.worlds, self.world_order)
 
-    def get_status(self):
-        self.set_status(["pinging",None,None])
-        status = self.query_status()
-        self.set_status(status)
-        self.send_data("status", status)
+    def cached_status(self):
+        snapshot = self.status_service.snapshot()
+        if snapshot.version == 0:
+            # Nothing has been polled yet
+            snapshot = self.status_service.refresh(wait=True)
+        return snapshot
+
+    def status_updated(self, snapshot, changed, requested):
+        # Called from the status service's thread
+        # Worked out on every change, so the cap is lifted as soon as the server stops or crashes
+        self.bandwidth.set_players_online(snapshot.status == "online" and len(snapshot.players) > 0)
+        self.status_snapshot_signal.emit(snapshot, requested)
+        self.publish_state({"status": {"status": snapshot.status, "version": snapshot.server_version, "world": snapshot.world},
+                            "players": list(snapshot.players)})
+        if changed & {"status", "server_version", "world"}:
+            self.send_data("status", snapshot.status_info())
+        if "players" in changed and snapshot.status == "online":
+            self.send_data("players", list(snapshot.players))
+
+    def show_status(self, snapshot, requested):
+        self.curr_players = list(snapshot.players)
+        self.set_status(snapshot.status_info())
         if self.status == "online":
-            if self.is_api_compatible(self.running_version()):
+            # Only refreshes start the API connection, so one isn't made to a server that is shutting down
+            if requested and self.is_api_compatible(self.running_version()):
                 if not self.bus and self.bus_shutdown_complete.is_set():
                     self.create_bus(self.get_api_version(self.running_version()))
             self.chat_tabs.tabBar().setTabEnabled(2, True)
@@ -2527,20 +2748,18 @@ class ServerManagerApp(QMainWindow):
             self.message_entry.show()
             self.chat_tabs.tabBar().setTabEnabled(2, False)
 
+    def get_status(self):
+        self.set_status(["pinging",None,None])
+        self.status_service.refresh()
 
     def get_players(self):
         # Used with the player refresh button
-        status = self.query_status()
-        if status[0] == "online":
-            self.curr_players = self.query_players()
-            self.update_players_list()
-        else:
-            self.set_status(status)
-            self.send_data("status", status)
+        self.status_service.refresh()
     
     def update_status(self, info):
         # Updates through API heartbeat
         status, version = info
+        self.status_service.update(status="online" if status else "offline", server_version=version)
         if status:
             self.status = "online"
             self.server_status_label.hide()
@@ -2586,7 +2805,7 @@ class ServerManagerApp(QMainWindow):
                 self.version_label.setText(f"Version: {version}")
             self.world_label.setText(f"World: {world}")
             self.refresh_button.setEnabled(True)
-            self.get_players()
+            self.update_players_list()
             self.refresh_status_button.setEnabled(True)
             self.start_button.setEnabled(False)
             self.stop_button.setEnabled(True)
@@ -2622,11 +2841,9 @@ class ServerManagerApp(QMainWindow):
     
     def set_players(self, new_player_list):
         # Sets the players through the API heartbeat
-        self.curr_players = [player["name"] for player in new_player_list]
-        self.update_players_list()
+        self.status_service.update(players=[player["name"] for player in new_player_list])
 
     def update_players_list(self):
-        self.send_data("players", self.curr_players)
         self.players_info_box.clear()
         if len(self.curr_players) == 0:
             item = QListWidgetItem("No players online")
@@ -2668,21 +2885,19 @@ class ServerManagerApp(QMainWindow):
         return msg
     
     def remove_player(self, player_obj: dict):
-        if player_obj.get("name") not in self.curr_players:
+        if player_obj.get("name") not in self.status_service.snapshot().players:
             return
         
-        self.curr_players.remove(player_obj["name"])
-        self.update_players_list()
+        self.status_service.remove_player(player_obj["name"])
         formatted_text = self.color_segments([player_obj['name'], " disconnected ", "from the server."], ["purple", "red", None])
         self.log_queue.put(formatted_text)
         self.broadcast(formatted_text)
     
     def add_player(self, player_obj: dict):
-        if player_obj.get("name") in self.curr_players:
+        if player_obj.get("name") in self.status_service.snapshot().players:
             return
         
-        self.curr_players.append(player_obj["name"])
-        self.update_players_list()
+        self.status_service.add_player(player_obj["name"])
         formatted_text = self.color_segments([player_obj['name'], " joined ", "the server."], ["purple", "green", None])
         self.log_queue.put(formatted_text)
         self.broadcast(formatted_text)
@@ -2732,12 +2947,13 @@ class ServerManagerApp(QMainWindow):
                 self.dropdown.clear()
                 file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
                 saved_ip, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings = file_funcs.load_settings(self.log_queue, self.file_lock)
+                self.publish_worlds()
                 self.clear_log_queue()
             else:
                 self.server_path = path
                 file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
             
-            if self.receive_thread and self.receive_thread.is_alive():
+            if self.host_server.running():
                 self.show_main_page(ignore_load=True)
             else:
                 self.start_manager_server()
@@ -2763,6 +2979,7 @@ class ServerManagerApp(QMainWindow):
         self.world_order = []
         self.disabled_download_worlds = set()
         file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
+        self.publish_worlds()
         
         self.ip_button.setEnabled(False)
         self.refresh_button.setEnabled(False)
@@ -2840,10 +3057,10 @@ class ServerManagerApp(QMainWindow):
     def set_ip(self):
         ip = self.hosting_ip_entry.text()
         if ip:
-            if ip == self.host_ip and self.receive_thread.is_alive():
+            if ip == self.host_ip and self.host_server.running():
                 self.show_main_page(ignore_load=True)
                 return
-            elif self.receive_thread.is_alive():
+            elif self.host_server.running():
                 self.stop_server_threads()
                 self.stop_threads.clear()
                 self.clear_log_queue()
@@ -2870,11 +3087,14 @@ class ServerManagerApp(QMainWindow):
         world_folders = glob.glob(self.path(self.server_path, "worlds", "*/"))
         if world_path in world_folders:
             try:
-                if self.world == os.path.basename(world_path) and self.query_status()[0] == "online":
+                if self.world == os.path.basename(world_path) and self.status_service.snapshot().status == "online":
                     self.log_queue.put(f"<font color='red'>ERROR: Unable to backup world folder while world is being run.</font>")
                     self.show_main_page()
                     return False
                 
+                job = f"{"transfer" if streaming else "backup"} of '{os.path.basename(world_path)}'"
+                # Filled with each file's CRC and size as it is read, to check the finished zip against
+                manifest = {}
                 current_date = datetime.now().strftime("%m-%d-%y")
                 new_path = f"{self.path(self.server_path, 'backups', os.path.basename(world_path))}_{current_date}.zip"
                 if os.path.exists(new_path):
@@ -2887,18 +3107,25 @@ class ServerManagerApp(QMainWindow):
                     self.show_main_page()
                     self.delay(0.5)
                     new_path = f"{new_path}({str(index)}).zip"
-                    if not file_funcs.backup_world(world_path, new_path, self, progress_function):
+                    if not self.run_backup_job(job, world_path, new_path, progress_function, manifest):
                         self.log_queue.put(f"<font color='red'>Cancelled {"transfer" if streaming else "backup"} of '{os.path.basename(world_path)}'.</font>")
                         return False
                 else:
                     self.log_queue.put(f"<font color='green'>Copying files. Please wait...</font>")
                     self.show_main_page()
                     self.delay(0.5)
-                    if not file_funcs.backup_world(world_path, new_path, self, progress_function):
+                    if not self.run_backup_job(job, world_path, new_path, progress_function, manifest):
                         self.log_queue.put(f"<font color='red'>Cancelled {"transfer" if streaming else "backup"} of '{os.path.basename(world_path)}'.</font>")
                         return False
                 
                 self.log_queue.put(f"<font color='green'>{"Completed transfer of" if streaming else "Saved backup of"} '{os.path.basename(world_path)}'.</font>")
+                if not streaming:
+                    backup_funcs.record_backup(new_path, os.path.basename(world_path))
+                    problems = backup_funcs.write_manifest(new_path, manifest)
+                    if problems:
+                        self.log_queue.put(f"<font color='red'>ERROR: Backup '{os.path.basename(new_path)}' was not written correctly. {problems[0]}</font>")
+                    self.prune_old_backups()
+                    self.verify_backups([new_path])
                 return new_path
             except Exception as e:
                 print(e)
@@ -2917,131 +3144,300 @@ class ServerManagerApp(QMainWindow):
             self.log_queue.put(f"<font color='red'>ERROR: Invalid world folder.</font>")
             self.show_main_page()
             return False
-    
-    def transfer_world(self, world, client: socket.socket):
+
+    def run_backup_job(self, job, world_path, backup_zip_path, progress_function=None, manifest=None):
+        self.maintenance.start(job)
         try:
-            self.log_queue.put(f"{self.clients.get(client)} initiated a world transfer for {world}.")
-            
-            # 1. Zip the world to a temporary location first (Extremely fast)
-            self.log_queue.put("Zipping world files...")
-            world_path = Path(self.server_path) / "worlds" / world
-            temp_zip_dir = Path(os.environ.get("TEMP", "."))
-            archive_path = str(temp_zip_dir / f"tmp_{world}.zip")
-            total_files = 0
-            for _, _, files in os.walk(world_path):
-                total_files += len(files)
-            self.send_data("zipping-world", [total_files], client)
-            def prog_update(progress, name):
-                self.send_data("transfer-progress", [progress, name], client)
-            success = file_funcs.backup_world(world_path, archive_path, self, prog_update)
-            if not success:
-                self.log_queue.put(f"<font color='red'>Cancelled transfer of '{os.path.basename(world_path)}'.</font>")
-                self.send_data("cancelled-transfer", world, client)
-                return False
+            return file_funcs.backup_world(world_path, backup_zip_path, self, progress_function, self.maintenance, job, manifest)
+        finally:
+            self.maintenance.finish(job)
 
-            # Using stat().st_size forces 64-bit precision tracking on modern operating systems
-            total_bytes = int(Path(archive_path).stat().st_size)
+    def prune_old_backups(self):
+        policy = self.universal_settings.get("backup retention", backup_funcs.DEFAULT_RETENTION)
+        try:
+            removed = backup_funcs.apply_retention(self.path(self.server_path, "backups"), policy)
+        except OSError as e:
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to clean up old backups. {e}</font>")
+            return
 
-            class TransferSocket:
-                def __init__(self, host_ip):
-                    self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    self.sock.bind((host_ip, 0))
-                    self.port = self.sock.getsockname()[1]
-                    self.transfer_client = None
-                
-                def waitfor(self, client_ip):
-                    self.sock.listen(1)
-                    while True:
-                        client, address = self.sock.accept()
-                        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-                        client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
-                        if address[0] == client_ip:
-                            self.transfer_client = client
-                            break
-                        client.close()
-
-            transfer_sock = TransferSocket(self.host_ip)
-            # Pass total_bytes instead of total_files
-            self.log_queue.put("Transferring world...")
-            self.send_data("starting-transfer", [total_bytes, world, transfer_sock.port], client)
-            transfer_sock.waitfor(client.getpeername()[0])
-
-            dialog_box = QProgressDialog(
-                f"Transferring {world}...",
-                "Cancel",
-                0,
-                100,
-                self  # Assuming 'self' is the parent QWidget. 
-            )
-            dialog_box.setWindowTitle("World Transfer")
-            dialog_box.setMinimumDuration(500)
-            dialog_box.setStyleSheet("""
-                QLabel { color: green; }
-                QPushButton { color: lightcoral; background-color: darkred; }
-            """)
-            dialog_box.setModal(True)
-
-            # 2. Stream using OS-level zero-copy (sendfile) in 2MB chunks
-            bytes_sent = 0
-            last_progress_time = 0
-            chunk_size = 2 * 1024 * 1024  # 2 MB chunks for optimal network pipeline
-            
-            try:
-                with open(archive_path, 'rb') as f:
-                    while bytes_sent < total_bytes:
-                        if dialog_box.wasCanceled():
-                            dialog_box.setCancelButton(None)
-                            dialog_box.setLabelText("Cancelling...")
-                            raise InterruptedError("Transfer cancelled by host")
-                        
-                        # sendfile() passes the file descriptor directly to the OS kernel.
-                        # It returns the actual number of bytes sent.
-                        # sent = transfer_sock.transfer_client.sendfile(f, offset=bytes_sent, count=chunk_size)
-                        sent = transfer_sock.transfer_client.sendfile(
-                            f, offset=bytes_sent, count=65536*100
-                        )
-                        
-                        if sent == 0:
-                            break  # EOF or connection closed abruptly
-                        
-                        bytes_sent += sent
-                        
-                        # Throttle UI and Network updates to keep the event loop fast
-                        current_time = time.time()
-                        if current_time - last_progress_time > 1:  # Max 10 updates per second
+        if removed:
+            self.log_queue.put(f"Removed {len(removed)} old backup{'s' * (len(removed) != 1)} outside of the retention policy.")
 
-                            dialog_box.setValue(int((bytes_sent / total_bytes) * 100))
-                            QApplication.processEvents()
-                            
-                            self.send_data("transfer-progress", [bytes_sent, world], client)
-                            last_progress_time = current_time
-                    
-                    # Ensure the progress bar hits exactly 100% at the end
-                    dialog_box.setValue(100)
-                    QApplication.processEvents()
-                
-                self.send_data("transfer-complete", world, client)
-                self.log_queue.put("<font color='green'>Transfer complete!</font>")
-            
-            except InterruptedError:
-                self.send_data("cancelled-transfer", world, client)
-                self.log_queue.put(f"<font color='red'>Cancelled transfer of '{os.path.basename(world_path)}'.</font>")
-            except (ConnectionResetError, BrokenPipeError):
-                dialog_box.cancel()
-                self.send_data("cancelled-transfer", world, client)
-                self.log_queue.put(f"<font color='red'>Cancelled transfer of '{os.path.basename(world_path)}'.</font>")
+    def verify_backups(self, backup_paths=None):
+        # Re-reads backups in the background so a corrupt archive is found before it is needed
+        if backup_paths is None:
+            backup_folder = self.path(self.server_path, "backups")
+            backup_paths = [self.path(backup_folder, name) for name in backup_funcs.load_backup_index(backup_folder)]
+            self.log_queue.put(f"Verifying {len(backup_paths)} backup{'s' * (len(backup_paths) != 1)} in the background.")
+            self.show_main_page()
+
+        threading.Thread(target=self.verify_backups_thread, args=(backup_paths,), daemon=True).start()
+
+    def verify_backups_thread(self, backup_paths):
+        # Reads on this thread alone, so the maintenance workers stay free for backups and transfer archives
+        maintenance.lower_thread_priority()
+        failed = 0
+        for backup_path in backup_paths:
+            if not os.path.isfile(backup_path):
+                continue
+            job = f"verification of '{os.path.basename(backup_path)}'"
+            self.maintenance.start(job)
+            try:
+                passed, problems = backup_funcs.verify_backup(backup_path, 1, self.maintenance.throttle_for(job))
             finally:
-            # Clean up the temporary zip archive
-                if 'archive_path' in locals() and os.path.exists(archive_path):
-                    os.remove(archive_path)
-                transfer_sock.transfer_client.close()
+                self.maintenance.finish(job)
+            backup_funcs.record_verification(backup_path, passed)
+            if not passed:
+                failed += 1
+                self.log_queue.put(f"<font color='red'>ERROR: Backup '{os.path.basename(backup_path)}' failed verification. {problems[0] if problems else ''}</font>")
+
+        if len(backup_paths) > 1 and not failed:
+            self.log_queue.put(f"<font color='green'>Verified {len(backup_paths)} backups.</font>")
+        elif len(backup_paths) == 1 and not failed:
+            self.log_queue.put(f"<font color='green'>Verified backup '{os.path.basename(backup_paths[0])}'.</font>")
+
+    def snapshot_world(self, world):
+        # Instant restore point. Reflinks where the drive supports them, otherwise hardlinks
+        # that are unshared before the world is next written to.
+        world_path = self.path(self.server_path, "worlds", world)
+        if not os.path.isdir(world_path):
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to find the '{world}' world folder.</font>")
+            return False
 
+        if self.world == world and self.status_service.snapshot().status == "online":
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to snapshot world folder while world is being run.</font>")
+            return False
+
+        last_updated = time.time()
+        def keep_responsive(processed, name):
+            nonlocal last_updated
+            if time.time() - last_updated >= 0.25:
+                last_updated = time.time()
+                QApplication.processEvents()
+
+        try:
+            snapshot_path, method = backup_funcs.snapshot_world(world_path, self.path(self.server_path, "snapshots"), keep_responsive)
         except Exception as e:
-            if 'archive_path' in locals() and os.path.exists(archive_path):
-                os.remove(archive_path)
-            self.log_queue.put(f"<font color='red'>Transfer error: {str(e)}</font>")
-        
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to snapshot '{world}'. {e}</font>")
+            return False
+
+        if method == "copy":
+            self.log_queue.put(f"<font color='orange'>Drive does not support cloning. '{world}' snapshot was fully copied.</font>")
+        self.log_queue.put(f"<font color='green'>Saved snapshot of '{world}' to {os.path.basename(snapshot_path)}.</font>")
+        return snapshot_path
+
+    def snapshot_before_update(self, world):
+        """Instant safety copy in case the new version breaks the world. Returns False if it couldn't
+        be saved and the user doesn't want to update without one."""
+        if not os.path.isdir(self.path(self.server_path, "worlds", world)) or self.snapshot_world(world):
+            return True
+        confirm = QMessageBox.question(self, "Snapshot Failed", f"A safety snapshot of '{world}' could not be saved. Update it anyway?",
+                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        return confirm == QMessageBox.StandardButton.Yes
+
+    def save_snapshot(self):
+        world_path = file_funcs.pick_folder(self, self.path(self.server_path, "worlds"))
+        if world_path is None:
+            return
+
+        world_path = os.path.normpath(world_path)
+        if world_path not in glob.glob(self.path(self.server_path, "worlds", "*/")):
+            self.log_queue.put(f"<font color='red'>ERROR: Invalid world folder.</font>")
+            self.show_main_page()
+            return
+
+        self.show_main_page()
+        self.snapshot_world(os.path.basename(world_path))
+
+    def duplicate_world(self):
+        world_path = file_funcs.pick_folder(self, self.path(self.server_path, "worlds"), "Select World to Duplicate")
+        if world_path is None:
+            return
+
+        world_path = os.path.normpath(world_path)
+        world = os.path.basename(world_path)
+        if world_path not in glob.glob(self.path(self.server_path, "worlds", "*/")) or world not in self.worlds:
+            self.log_queue.put(f"<font color='red'>ERROR: World must be in the worlds list to be duplicated.</font>")
+            self.show_main_page()
+            return
+
+        name, ok = QInputDialog.getText(self, "Duplicate World", "Enter the name of the new world:", text=f"{world} Copy")
+        if not ok or not name:
+            return
+
+        name = name.strip()
+        if name in self.worlds or os.path.exists(self.path(self.server_path, "worlds", name)):
+            QMessageBox.warning(self, "Error", "A world with that name already exists.")
+            return
+
+        if self.world == world and self.status_service.snapshot().status == "online":
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to duplicate {world} while the world is being run.</font>")
+            self.show_main_page()
+            return
+
+        self.show_main_page()
+        try:
+            method, _ = backup_funcs.clone_tree(world_path, self.path(self.server_path, "worlds", name))
+        except Exception as e:
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to duplicate '{world}'. {e}</font>")
+            return
+
+        self.forget_world_results(name)
+        self.worlds[name] = {key: value for key, value in self.worlds[world].items() if key != "seed"}
+        self.world_order.insert(0, name)
+        file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
+        self.set_worlds_list()
+        self.publish_worlds()
+        if method == "copy":
+            self.log_queue.put(f"<font color='orange'>Drive does not support cloning. '{world}' was fully copied.</font>")
+        self.log_queue.put(f"<font color='green'>Successfully duplicated '{world}' as '{name}'.</font>")
+
+    def unshare_world_files(self, world_path):
+        """Anything about to write to a world must first split it from any hardlinked snapshots.
+        Returns False if some files are still shared, in which case the world must be left alone."""
+        # Copying a hardlinked world can take a while, so it runs on a worker while the dialog shows progress
+        job = f"unsharing of '{os.path.basename(world_path)}'"
+        dialog_box = QProgressDialog("Separating the world from its snapshots...", None, 0, 0, self)
+        dialog_box.setWindowTitle("Preparing World")
+        dialog_box.setMinimumDuration(500)
+        dialog_box.setStyleSheet("QLabel { color: green; }")
+        dialog_box.setModal(True)
+        progress = [0, 0, ""]
+
+        def update(processed, total, name):
+            progress[:] = [processed, total, name]
+
+        def pump():
+            processed, total, name = progress
+            if total:
+                dialog_box.setMaximum(total)
+                dialog_box.setValue(processed)
+                dialog_box.setLabelText("Separating the world from its snapshots...<br>" + name)
+            QApplication.processEvents()
+
+        self.maintenance.start(job)
+        try:
+            future = self.maintenance.submit(job, backup_funcs.break_hardlinks, world_path, update)
+            unshared, failed = self.maintenance.wait(future, pump)
+        finally:
+            self.maintenance.finish(job)
+            dialog_box.close()
+        if unshared:
+            self.log_queue.put(f"Separated {unshared} files from saved snapshots.")
+        if failed:
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to separate {len(failed)} files from saved snapshots, such as '{os.path.relpath(failed[0], world_path)}'. Check the drive has space and nothing has the world open.</font>")
+            return False
+        return True
+
+    def build_transfer_archive(self, archive: transfer_funcs.CachedArchive, world_path):
+        job = f"archive of '{archive.world}'"
+        self.maintenance.start(job)
+        try:
+            with open(archive.path, "wb") as f:
+                archive.started.set()
+                writer = transfer_funcs.ArchiveWriter(f)
+                transfer_funcs.stream_world_zip(world_path, writer, throttle=self.maintenance.throttle_for(job))
+            archive.complete(writer.position, writer.sha256.hexdigest())
+        except BaseException as e:
+            archive.fail()
+            self.log_queue.put(f"<font color='red'>ERROR: Unable to prepare {archive.world} for transfer. {str(e)}</font>")
+            raise
+        finally:
+            self.maintenance.finish(job)
+            self.transfer_cache.evict()
+
+    def start_transfer(self, world, client: socket.socket, resume=None, streams=1):
+        worker = TransferWorker(self, world, client, resume, streams)
+        dialog_box = QProgressDialog(
+            f"Transferring {world}...",
+            "Cancel",
+            0,
+            100,
+            self
+        )
+        dialog_box.setWindowTitle(f"World Transfer to {self.clients.get(client)}")
+        dialog_box.setMinimumDuration(500)
+        dialog_box.setAutoClose(False)
+        dialog_box.setStyleSheet("""
+            QLabel { color: green; }
+            QPushButton { color: lightcoral; background-color: darkred; }
+        """)
+        dialog_box.setWindowModality(Qt.WindowModality.NonModal)
+
+        def update_progress(value, text):
+            dialog_box.setValue(value)
+            dialog_box.setLabelText(text)
+
+        def cancel():
+            dialog_box.setCancelButton(None)
+            dialog_box.setLabelText("Cancelling...")
+            worker.cancel()
+
+        def finished():
+            self.transfer_workers.discard(worker)
+            dialog_box.canceled.disconnect(cancel)
+            dialog_box.close()
+            dialog_box.deleteLater()
+
+        worker.progress.connect(update_progress)
+        worker.finished.connect(finished)
+        dialog_box.canceled.connect(cancel)
+        self.transfer_workers.add(worker)
+        worker.start()
     
+    def sync_world(self, world, client: socket.socket):
+        # Sends only what changed since the client's copy, described by the manifest it sends first
+        job = f"sync of '{world}'"
+        world_path = self.path(self.server_path, "worlds", world)
+        transfer_sock = transfer_funcs.TransferSocket(self.host_ip)
+        self.maintenance.start(job)
+        try:
+            self.log_queue.put(f"{self.clients.get(client)} is syncing their copy of {world}.")
+            self.send_data("starting-sync", [world, transfer_sock.port], client)
+            transfer_sock.waitfor(client.getpeername()[0], timeout=60)
+            manifest = transfer_funcs.receive_manifest(transfer_sock.transfer_client)
+            writer = transfer_funcs.SocketStreamWriter(transfer_sock.transfer_client)
+            changed, patched, deleted = transfer_funcs.stream_world_delta(world_path, manifest, writer, self.maintenance.throttle_for(job))
+            transfer_sock.close()
+            self.send_data("transfer-complete", [world, writer.sha256.hexdigest(), writer.position], client)
+            self.log_queue.put(f"<font color='green'>Synced {world} in {file_funcs.format_size(writer.position)}: {len(changed)} changed files, {len(patched)} patched regions, {len(deleted)} removed files.</font>")
+        except Exception as e:
+            self.send_data("cancelled-transfer", world, client)
+            self.log_queue.put(f"<font color='red'>Sync of {world} failed: {str(e)}</font>")
+        finally:
+            transfer_sock.close()
+            self.maintenance.finish(job)
+
+    def send_resources(self, client: socket.socket, resource_paths, streams):
+        # Resources go over their own connections, so the control socket stays free for status and chat
+        streams = max(1, min(streams, transfer_funcs.RESOURCE_STREAMS, len(resource_paths)))
+        transfer_sock = transfer_funcs.TransferSocket(self.host_ip, backlog=streams)
+        token = transfer_funcs.new_transfer_token()
+        files = queue.Queue()
+        # Largest first, so one big file isn't left running on its own at the end
+        for path in sorted(resource_paths, key=os.path.getsize, reverse=True):
+            files.put(path)
+        total_size = sum(os.path.getsize(path) for path in resource_paths)
+        throttle = self.bandwidth.throttle_for_transfer()
+        try:
+            self.send_data("starting-resource-transfer", [transfer_sock.port, token, streams, len(resource_paths), total_size], client)
+            with ThreadPoolExecutor(max_workers=streams, thread_name_prefix="resources") as pool:
+                senders = []
+                for _ in range(streams):
+                    data_client = transfer_sock.accept_token(client.getpeername()[0], token, timeout=TRANSFER_ACCEPT_TIMEOUT)
+                    senders.append(pool.submit(transfer_funcs.send_resource_files, data_client, files, throttle))
+                for sender in senders:
+                    sender.result()
+            self.log_queue.put(f"Sent {len(resource_paths)} resource files ({file_funcs.format_size(total_size)}) to {self.clients.get(client)}.")
+        except socket.timeout:
+            self.log_queue.put(f"<font color='red'>Cancelled the resource download. {self.clients.get(client)} did not connect for it.</font>")
+        except (ConnectionResetError, BrokenPipeError, ConnectionAbortedError):
+            self.log_queue.put(f"<font color='red'>Lost connection while sending resources to {self.clients.get(client)}.</font>")
+        except Exception as e:
+            self.log_queue.put(f"<font color='red'>Resource download error: {str(e)}</font>")
+        finally:
+            transfer_sock.close()
+
     def add_existing_world(self, update=False):
         world_path = file_funcs.pick_folder(self, self.path(self.server_path, "worlds"))
         if world_path is None:
@@ -3087,7 +3483,7 @@ class ServerManagerApp(QMainWindow):
                         self.show_main_page()
                         return
                     world = os.path.basename(world_path)
-                    if world == self.world and self.query_status()[0] == "online":
+                    if world == self.world and self.status_service.snapshot().status == "online":
                         self.log_queue.put(f"<font color='red'>ERROR: Cannot update while {world} is online.</font>")
                         self.show_main_page()
                         return
@@ -3183,8 +3579,11 @@ class ServerManagerApp(QMainWindow):
 
     def confirm_add_world(self, update=False):
         result = self.verify_version(self.mc_version_dropdown.currentText(), self.is_fabric_check.isChecked())
-        if result:
-            name = self.add_world_label.text()
+        name = self.add_world_label.text()
+        if result and update and not self.snapshot_before_update(name):
+            self.log_queue.put(f"<font color='red'>Cancelled the update of '{name}'.</font>")
+            self.show_main_page()
+        elif result:
             if update:
                 self.remove_world(updating=name)
             self.worlds[name] = {
@@ -3194,11 +3593,12 @@ class ServerManagerApp(QMainWindow):
                 "fabric": self.is_fabric_check.isChecked(),
                 "level-type": self.level_type_dropdown.currentText()
             }
+            self.forget_world_results(name)
             self.world_order.insert(0, name)
             file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
             file_funcs.save_world_properties(self.path(os.path.join(self.server_path, "worlds", name)), self.worlds[name])
             self.set_worlds_list()
-            self.send_data("worlds-list", self.query_worlds())
+            self.publish_worlds()
             self.log_queue.put(f"<font color='green'>Successfully {'updated' if update else 'added'} world.</font>")
             self.dropdown.setCurrentText(self.add_world_label.text())
             self.show_main_page()
@@ -3228,10 +3628,11 @@ class ServerManagerApp(QMainWindow):
                 "fabric": self.is_fabric_check.isChecked() and not self.fabric_dropdown.isHidden(),
                 "level-type": self.level_type_dropdown.currentText()
             }
+            self.forget_world_results(self.new_world_name_edit.text())
             self.world_order.insert(0, self.new_world_name_edit.text())
             file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
             self.set_worlds_list()
-            self.send_data("worlds-list", self.query_worlds())
+            self.publish_worlds()
             self.log_queue.put(f"<font color='green'>Successfully added world.</font>")
             self.log_queue.put("The world and its folder will be generated when the world is run for the first time.")
             self.dropdown.setCurrentText(self.new_world_name_edit.text())
@@ -3269,7 +3670,7 @@ class ServerManagerApp(QMainWindow):
                     queries.version_comparison(new_version, "26.1-snapshot-6", after=True, equal=True):
                 if self.add_existing_world_button.isHidden():
                     self.add_world_error.setText(f"Warning! The existing world was generated in {old_version}{unknown}.<br>There are major data saving differences applied in 26.1-snapshot-6.<br>\
-                                                It is recommended to backup world before updating.")
+                                                A snapshot will be saved before updating.")
                 else:
                     self.add_world_error.setText(f"Warning! The existing world was generated in {old_version}{unknown}.<br>There are major data saving differences applied in 26.1-snapshot-6.<br>\
                                                 Instead, please:<br>1. Add world as older version<br>2. Update after using the world manager.")
@@ -3308,7 +3709,7 @@ class ServerManagerApp(QMainWindow):
         if not world:
             return
         
-        if self.world == world and self.query_status()[0] == "online":
+        if self.world == world and self.status_service.snapshot().status == "online":
             self.log_queue.put(f"<font color='red'>ERROR: Unable to {'update' if updating else 'remove'} {world} while the world is being run.</font>")
             self.show_main_page()
             return
@@ -3323,9 +3724,10 @@ class ServerManagerApp(QMainWindow):
         
         self.worlds.pop(world)
         self.world_order.remove(world)
+        self.forget_world_results(world)
         file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
         self.set_worlds_list()
-        self.send_data("worlds-list", self.query_worlds())
+        self.publish_worlds()
         if not updating:
             self.log_queue.put(f"<font color='green'>Successfully removed world.</font>")
             self.show_main_page()
@@ -3365,6 +3767,8 @@ class ServerManagerApp(QMainWindow):
                     os.mkdir(self.path(world_folder, "mods"))
 
             folder_path = self.path(world_folder, "client resources" if client_folder else "mods")
+            # Files are about to be added or removed by hand
+            self.forget_world_results(world)
             file_funcs.open_folder_explorer(folder_path)
             self.show_main_page(ignore_load=True)
     
@@ -3381,7 +3785,7 @@ class ServerManagerApp(QMainWindow):
         enabled = self.whitelist_toggle_button.text() == "Enabled"
         self.universal_settings["whitelist enabled"] = enabled
 
-        status = self.query_status()[0]
+        status = self.status_service.snapshot().status
         if status == "online" and self.bus is not None:
             self.bus.enable_whitelist.emit(enabled)
         elif status == "online":
@@ -3407,7 +3811,7 @@ class ServerManagerApp(QMainWindow):
         if not player:
             return
         
-        status = self.query_status()[0]
+        status = self.status_service.snapshot().status
         if status == "online":
             self.whitelist_add_textbox.clear()
             if self.is_api_compatible(self.running_version()):
@@ -3469,6 +3873,7 @@ class ServerManagerApp(QMainWindow):
         self.dropdown.addItems(self.world_order)
         self.dropdown.setCurrentText(current_selected)
         file_funcs.update_settings(self.file_lock, self.ips, self.saved_servers, self.server_path, self.worlds, self.world_order, self.disabled_download_worlds, self.universal_settings, self.saved_ip)
+        self.publish_worlds()
     
     def open_player_context_menu(self, item_pos, cursor_pos):
         item = self.players_info_box.itemAt(item_pos)
@@ -3567,8 +3972,7 @@ class ServerManagerApp(QMainWindow):
                 self.msg_player(player, "You have been given operator status.")
                 self.notify_player(player, "You have been given operator status")
 
-            self.curr_players = self.query_players()
-            self.update_players_list()
+            self.status_service.refresh()
     
     def whitelist_player(self, player, remove):
         # 1.3.1 introduced /whitelist <on|off|add|remove|list|reload>
@@ -3587,8 +3991,7 @@ class ServerManagerApp(QMainWindow):
         else:
             reason = " You got kicked? What where you doing?!" if queries.version_comparison(running_version, "1.3.1", after=True, equal=True) else ""
             self.supervisor_send_cmd(f"kick {player}{reason}")
-            self.curr_players = self.query_players()
-            self.update_players_list()
+            self.status_service.refresh()
     
     def ban_player(self, player):
         #ban player reason in 1.3.1
@@ -3598,8 +4001,7 @@ class ServerManagerApp(QMainWindow):
         else:
             reason = " You done messed up." if queries.version_comparison(running_version, "1.3.1", after=True, equal=True) else ""
             self.supervisor_send_cmd(f"ban {player}{reason}")
-            self.curr_players = self.query_players()
-            self.update_players_list()
+            self.status_service.refresh()
     
     def notify_player(self, player, msg):
         running_version = self.running_version()
@@ -3799,7 +4201,7 @@ class ServerManagerApp(QMainWindow):
             self.chat_toggle.setText("Log Mode")
     
     def change_server_folder(self):
-        if self.query_status()[0] == "online":
+        if self.status_service.snapshot().status == "online":
             self.log_queue.put("<font color='red'>Cannot change path while server is running.</font>")
         else:
             self.server_folder_path_entry.setText(self.server_path)
@@ -3841,6 +4243,11 @@ class ServerManagerApp(QMainWindow):
         self.supervisor_send({"type": "start_server", "args": [self.server_path, server_args], "version": version})
     
     def update_stats(self, stats: dict):
+        if "lag_ms" in stats:
+            self.maintenance.report_lag(stats["lag_ms"])
+            return
+        
+        self.maintenance.report_memory(stats.get("used_percent"), stats.get("server_percent"))
         self.total_mem_label.setText("Total RAM being used: " + str(round(stats.get("used_percent"), 1)) + "%")
         self.server_mem_label.setText("Server memory usage: " + str(round(stats.get("server_percent"), 1)) + "%")
     
@@ -4047,6 +4454,10 @@ class ServerManagerApp(QMainWindow):
             self.log_queue.put("<font color='red'>ERROR: Unable to find world/dimension region files.</font>")
             return
 
+        if not self.unshare_world_files(world_folder):
+            self.show_main_page(True)
+            self.log_queue.put("<font color='red'>ERROR: Pruning was cancelled so the world's snapshots aren't changed.</font>")
+            return
         files = glob.glob(self.path(region_path, "*.mca"))
         deleted_chunks = 0
         previous_size = 0
@@ -4075,23 +4486,23 @@ class ServerManagerApp(QMainWindow):
                                     }""")
         dialog_box.setModal(True)
 
+        job = f"pruning of '{self.prune_worlds_dropdown.currentText()}'"
+        self.maintenance.start(job)
         try:
-            start = time.time()
             surviving_chunks = set()
             
             processed = 0
-            for file in files:
+            # Region files are scanned and pruned on the maintenance workers, several at a time
+            scans = self.maintenance.map(job, lambda file: nbt_funcs.scan_mca_for_inhabited_chunks(file, minutes * 1200), files, QApplication.processEvents, os.path.getsize)
+            for file, chunks in zip(files, scans):
                 dialog_box.setLabelText(f"Scanning regions...<br>{os.path.basename(file)}")
-                surviving_chunks.update(nbt_funcs.scan_mca_for_inhabited_chunks(file, minutes * 1200))
+                surviving_chunks.update(chunks)
                 
                 processed += 1
                 dialog_box.setValue(processed)
                 
-                if time.time() - start >= 0.25:
-                    start = time.time()
-                    QApplication.processEvents()
-                
                 if dialog_box.wasCanceled():
+                    scans.close()
                     break
             
             if not dialog_box.wasCanceled():
@@ -4104,11 +4515,10 @@ class ServerManagerApp(QMainWindow):
                             
                 QApplication.processEvents()
 
-                for file in files:
+                prunes = self.maintenance.map(job, lambda file: nbt_funcs.prune_and_defrag_mca_by_set(file, keep_set), files, QApplication.processEvents, os.path.getsize)
+                for file, (deleted, previous, new) in zip(files, prunes):
                     dialog_box.setLabelText(f"Pruning regions...<br>{os.path.basename(file)}")
                     
-                    deleted, previous, new = nbt_funcs.prune_and_defrag_mca_by_set(file, keep_set)
-                    
                     deleted_chunks += deleted
                     previous_size += previous
                     new_size += new
@@ -4116,16 +4526,16 @@ class ServerManagerApp(QMainWindow):
                     processed += 1
                     dialog_box.setValue(processed)
                     
-                    if time.time() - start >= 0.25:
-                        start = time.time()
-                        QApplication.processEvents()
-                    
                     if dialog_box.wasCanceled():
                         dialog_box.setCancelButton(None)
+                        prunes.close()
                         break
 
         except Exception as e:
             dialog_box.cancel()
+        finally:
+            self.maintenance.finish(job)
+            self.forget_world_results(self.prune_worlds_dropdown.currentText())
 
         if dialog_box.wasCanceled():
             self.log_queue.put("<font color='red'>Pruning Cancelled.</font>")
@@ -4165,14 +4575,12 @@ class ServerManagerApp(QMainWindow):
             self.delay(1)
             self.async_runner.submit(self.supervisor_connector.close())
 
-        if self.server:
-            try:
-                self.server.close()
-            except socket.error:
-                pass
+        self.host_server.stop()
+        self.status_service.stop()
         
-        if self.receive_thread.is_alive():
-            self.receive_thread.join(timeout=2.0)
+        if self.pack_server:
+            self.pack_server.stop()
+            self.pack_server = None
     
     def exit_prompt(self, event: QCloseEvent):
         box = QMessageBox(self)
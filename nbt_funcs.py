@@ -160,4 +160,108 @@ def prune_and_defrag_mca_by_set(mca_path: str, keep_set: set):
             
         return chunks_deleted, len(old_data), len(final_file_data)
 
-    return 0, len(old_data), len(old_data)
\ No newline at end of file
+    return 0, len(old_data), len(old_data)
+
+REGION_PATCH_MAGIC = b"MCAP"
+
+def region_timestamps(mca_path: str):
+    """Reads only the timestamp header of an MCA file. Returns None if the file has no full header."""
+    with open(mca_path, "rb") as f:
+        header = f.read(8192)
+    if len(header) < 8192:
+        return None
+    return list(struct.unpack(">1024I", header[4096:8192]))
+
+def read_region(mca_path: str):
+    """Returns the timestamp of every chunk slot, and the stored payload (len + type + compressed data) of each present chunk by slot."""
+    with open(mca_path, "rb") as f:
+        data = f.read()
+
+    if len(data) < 8192:
+        return [0] * 1024, {}
+
+    timestamps = list(struct.unpack(">1024I", data[4096:8192]))
+    chunks = {}
+    for index in range(1024):
+        header_index = 4 * index
+        sector_offset = int.from_bytes(data[header_index : header_index + 3], byteorder="big")
+        if data[header_index + 3] == 0 or sector_offset == 0:
+            continue
+        
+        offset = sector_offset * 4096
+        payload_len = struct.unpack(">I", data[offset : offset + 4])[0]
+        chunks[index] = data[offset : offset + 4 + payload_len]
+    return timestamps, chunks
+
+def write_region(mca_path: str, timestamps: list, chunks: dict):
+    """Writes the chunks tightly packed after the headers, replacing the file in one step."""
+    new_locations = bytearray(4096)
+    new_timestamps = bytearray(4096)
+    new_payload = bytearray()
+    current_sector = 2
+
+    for index in sorted(chunks):
+        chunk = chunks[index]
+        sectors_needed = math.ceil(len(chunk) / 4096.0)
+        header_index = 4 * index
+        new_locations[header_index : header_index + 3] = current_sector.to_bytes(3, byteorder="big")
+        new_locations[header_index + 3] = sectors_needed
+        new_timestamps[header_index : header_index + 4] = struct.pack(">I", timestamps[index])
+        new_payload.extend(chunk.ljust(sectors_needed * 4096, b'\x00'))
+        current_sector += sectors_needed
+
+    temp_path = str(mca_path) + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(new_locations + new_timestamps + new_payload)
+    Path(temp_path).replace(mca_path)
+
+def build_region_patch(mca_path: str, known_timestamps: list):
+    """Collects the chunks whose timestamps differ from another copy of the region, and the chunks it has that this one doesn't.
+    Returns None if the copies already match."""
+    timestamps, chunks = read_region(mca_path)
+    entries = bytearray()
+    count = 0
+    for index in range(1024):
+        known = known_timestamps[index] if index < len(known_timestamps) else 0
+        chunk = chunks.get(index, b"")
+        if chunk and known != 0 and timestamps[index] == known:
+            continue
+        if not chunk and known == 0:
+            continue
+        
+        # An empty payload tells the other side to drop the chunk
+        entries += struct.pack(">HII", index, timestamps[index] if chunk else 0, len(chunk)) + chunk
+        count += 1
+
+    if count == 0:
+        return None
+    return REGION_PATCH_MAGIC + struct.pack(">I", count) + entries
+
+def apply_region_patch(mca_path: str, patch: bytes):
+    """Applies a patch from build_region_patch to a region file in place. Returns the number of chunks changed."""
+    if patch[:4] != REGION_PATCH_MAGIC:
+        raise ValueError(f"Invalid region patch for {Path(mca_path).name}")
+
+    if Path(mca_path).exists():
+        timestamps, chunks = read_region(mca_path)
+    else:
+        timestamps, chunks = [0] * 1024, {}
+
+    count = struct.unpack(">I", patch[4:8])[0]
+    position = 8
+    for _ in range(count):
+        index, timestamp, length = struct.unpack_from(">HII", patch, position)
+        position += 10
+        if length:
+            chunks[index] = patch[position : position + length]
+            timestamps[index] = timestamp
+        else:
+            chunks.pop(index, None)
+            timestamps[index] = 0
+        position += length
+
+    if chunks:
+        write_region(mca_path, timestamps, chunks)
+    elif Path(mca_path).exists():
+        Path(mca_path).unlink()
+    return count
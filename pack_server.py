@@ -0,0 +1,176 @@
+import os
+import hashlib
+import zipfile
+import threading
+import email.utils
+from urllib.parse import quote, unquote, urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import file_funcs
+
+PACK_SERVER_PORT = 5677
+PACK_PATH = "/packs/"
+DEFAULT_PACK_SERVER = {"enabled": True, "port": PACK_SERVER_PORT}
+SEND_SIZE = 1024 * 1024
+
+_pack_hashes = {}
+_pack_hashes_lock = threading.Lock()
+
+
+def pack_sha1(path):
+    """SHA-1 of a resource pack, as Minecraft expects in resource-pack-sha1. Only rehashed when the file changes."""
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _pack_hashes_lock:
+        cached = _pack_hashes.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        while data := f.read(SEND_SIZE):
+            sha1.update(data)
+    with _pack_hashes_lock:
+        _pack_hashes[path] = (key, sha1.hexdigest())
+    return sha1.hexdigest()
+
+
+def is_resource_pack(path):
+    """Whether a zip is a resource pack, which has pack.mcmeta at its root, rather than some other download."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return "pack.mcmeta" in archive.namelist()
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def choose_pack(world_folder):
+    """The world's server resource pack: the newest resource pack zip in its client resources,
+    or None if it has none."""
+    _, resources = file_funcs.get_available_resources(world_folder)
+    packs = [path for path in resources if path.endswith(".zip") and is_resource_pack(path)]
+    if not packs:
+        return None
+    return max(packs, key=os.path.getmtime)
+
+
+def parse_range(header, size):
+    """Returns (start, end) for a single byte range header, None to send the whole file,
+    or False if the range can't be satisfied."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+        else:
+            # A suffix range asks for the last few bytes
+            start = max(0, size - int(last))
+            end = size
+    except ValueError:
+        return None
+    if start >= size or start >= end:
+        return False
+    return start, end
+
+
+class PackRequestHandler(BaseHTTPRequestHandler):
+    server: "ResourcePackServer"
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.send_pack(body=False)
+
+    def do_GET(self):
+        self.send_pack(body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_pack(self, body):
+        path = self.server.resolve(urlsplit(self.path).path)
+        if not path:
+            self.send_error(404)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{pack_sha1(path)}"'
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        byte_range = parse_range(self.headers.get("Range"), size)
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range != etag:
+            byte_range = None
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+        if not body:
+            return
+
+        with open(path, "rb") as f:
+            offset = start
+            while offset < end:
+                sent = self.connection.sendfile(f, offset=offset, count=min(SEND_SIZE, end - offset))
+                if sent == 0:
+                    break
+                offset += sent
+
+
+class ResourcePackServer(ThreadingHTTPServer):
+    """Serves each world's client resource zips over HTTP, so players joining on the LAN download
+    the server resource pack from the host instead of from a public site."""
+    daemon_threads = True
+
+    def __init__(self, worlds_folder, host_ip, port=PACK_SERVER_PORT):
+        super().__init__((host_ip, port), PackRequestHandler)
+        self.worlds_folder = os.path.abspath(worlds_folder)
+        self.host_ip = host_ip
+        self.port = self.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def base_url(self):
+        """The start of every pack URL this server hands out."""
+        return f"http://{self.host_ip}:{self.port}{PACK_PATH}"
+
+    def pack_url(self, world, path):
+        return f"{self.base_url()}{quote(world)}/{quote(os.path.basename(path))}"
+
+    def resolve(self, url_path):
+        """Maps /packs/<world>/<file>.zip to that world's client resources, refusing anything else."""
+        if not url_path.startswith(PACK_PATH):
+            return None
+        parts = url_path[len(PACK_PATH):].split("/")
+        if len(parts) != 2:
+            return None
+        world, name = unquote(parts[0]), unquote(parts[1])
+        if not name.endswith(".zip") or world in ("", ".", "..") or os.path.basename(world) != world or os.path.basename(name) != name:
+            return None
+        path = os.path.join(self.worlds_folder, world, "client resources", name)
+        return path if os.path.isfile(path) else None
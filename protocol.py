@@ -0,0 +1,194 @@
+import json
+import struct
+from typing import NamedTuple
+
+# magic, protocol version, message type, request id, body length
+HEADER = struct.Struct(">2sBBII")
+MAGIC = b"MM"
+VERSION = 1
+FRAME_START = MAGIC + bytes([VERSION])
+MAX_BODY = 16 * 1024 * 1024
+# Room a decoder's buffer keeps between messages. It grows as needed and shrinks back to this when empty
+BUFFER_SIZE = 64 * 1024
+
+LEGACY = 0 # A marker-separated message from before framing was negotiated
+TEXT = 1 # Chat and log lines, or a client's name
+REQUEST = 2 # {"topic": ..., "args": [...]} from a client
+DATA = 3 # {"topic": ..., "data": ...} from the host
+
+FRAMING_REQUEST = "use-framing"
+FRAMING_TOPIC = "framing"
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Frame(NamedTuple):
+    kind: int
+    request_id: int
+    body: object
+
+
+def encode_frame(kind, request_id, body):
+    payload = json.dumps(body, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(MAGIC, VERSION, kind, request_id, len(payload)) + payload
+
+
+def encode_request(request_id, topic, args):
+    return encode_frame(REQUEST, request_id, {"topic": topic, "args": list(args)})
+
+
+def encode_data(request_id, topic, data):
+    return encode_frame(DATA, request_id, {"topic": topic, "data": data})
+
+
+class FrameDecoder:
+    """Splits a byte stream into frames. Data is received straight into one reused buffer, where
+    headers are read in place with unpack_from and bodies are decoded from a memoryview. Whatever
+    is left of a partial message is only moved back to the front when the space behind it runs out,
+    so a long burst is copied about once instead of on every read."""
+    def __init__(self, max_body=MAX_BODY, buffer_size=BUFFER_SIZE):
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.start = 0
+        self.end = 0
+        self.max_body = max_body
+
+    def feed(self, data):
+        self.reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def recv_into(self, sock, size):
+        """Receives up to size bytes from sock straight into the buffer. Returns how many arrived."""
+        self.reserve(size)
+        with memoryview(self.buffer) as view, view[self.end:self.end + size] as space:
+            received = sock.recv_into(space)
+        self.end += received
+        return received
+
+    def reserve(self, size):
+        if len(self.buffer) - self.end >= size:
+            return
+        self.compact()
+        if len(self.buffer) - self.end < size:
+            self.buffer.extend(bytes(size - (len(self.buffer) - self.end)))
+
+    def pending(self):
+        return self.end - self.start
+
+    def decode(self):
+        return list(self.frames())
+
+    def frames(self):
+        """Yields frames one at a time, so the caller can take raw bytes that follow one with take()."""
+        try:
+            while (frame := self.next_frame()) is not None:
+                yield frame
+        finally:
+            if not self.pending():
+                self.clear()
+
+    def take(self, size):
+        """Removes up to size bytes of unframed data, such as a file sent after its header."""
+        with memoryview(self.buffer) as view:
+            data = bytes(view[self.start:min(self.start + size, self.end)])
+        self.start += len(data)
+        if not self.pending():
+            self.clear()
+        return data
+
+    def clear(self):
+        self.start = self.end = 0
+        if len(self.buffer) > self.buffer_size:
+            # Gives back the room a large message needed
+            del self.buffer[self.buffer_size:]
+
+    def compact(self):
+        if self.start:
+            self.buffer[:self.pending()] = self.buffer[self.start:self.end]
+            self.end -= self.start
+            self.start = 0
+
+    def next_frame(self):
+        available = self.end - self.start
+        if available < HEADER.size:
+            return None
+        magic, version, kind, request_id, length = HEADER.unpack_from(self.buffer, self.start)
+        if magic != MAGIC or version != VERSION:
+            raise ProtocolError("Bad frame header")
+        if length > self.max_body:
+            raise ProtocolError(f"Frame of {length} bytes is too large")
+        if available < HEADER.size + length:
+            return None
+
+        body_start = self.start + HEADER.size
+        self.start = body_start + length
+        return Frame(kind, request_id, self.decode_body(body_start, length))
+
+    def decode_body(self, offset, length):
+        try:
+            with memoryview(self.buffer)[offset:offset + length] as body:
+                return json.loads(str(body, "utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise ProtocolError("Frame body is not valid JSON")
+
+
+class MixedDecoder(FrameDecoder):
+    """Decodes a stream that starts out with legacy marker-separated messages and may switch to
+    frames part way through. Legacy messages come back as LEGACY frames holding their text.
+
+    With a terminator, a legacy message ends at it. Without one (messages from older clients),
+    a legacy message runs to the next marker, the next frame, or the end of what has arrived.
+
+    Each byte is only searched once: a legacy message still waiting for its terminator carries on
+    from where the last search stopped."""
+    def __init__(self, marker: bytes, terminator: bytes = None, max_body=MAX_BODY, buffer_size=BUFFER_SIZE):
+        super().__init__(max_body, buffer_size)
+        self.marker = marker
+        self.terminator = terminator
+        self.searched = 0
+
+    def clear(self):
+        super().clear()
+        self.searched = 0
+
+    def compact(self):
+        self.searched = max(0, self.searched - self.start)
+        super().compact()
+
+    def next_frame(self):
+        while available := self.end - self.start:
+            if self.buffer.startswith(FRAME_START, self.start, self.end):
+                return super().next_frame()
+            if available < len(FRAME_START) and FRAME_START.startswith(self.buffer[self.start:self.end]):
+                return None
+            if self.buffer.startswith(self.marker, self.start, self.end):
+                return self.next_legacy()
+            if available < len(self.marker) and self.marker.startswith(self.buffer[self.start:self.end]):
+                return None
+
+            # Skip anything that isn't the start of a message, as the legacy parsers always have
+            next_start = [position for position in (self.buffer.find(self.marker, self.start + 1, self.end), self.buffer.find(FRAME_START, self.start + 1, self.end)) if position != -1]
+            self.start = min(next_start) if next_start else self.end
+        return None
+
+    def next_legacy(self):
+        text_start = self.start + len(self.marker)
+        if self.terminator:
+            end = self.buffer.find(self.terminator, max(text_start, self.searched), self.end)
+            if end == -1:
+                # The terminator could be split across reads, so its first bytes are searched again
+                self.searched = max(text_start, self.end - len(self.terminator) + 1)
+                return None
+            following = end + len(self.terminator)
+        else:
+            ends = [position for position in (self.buffer.find(self.marker, text_start, self.end), self.buffer.find(FRAME_START, text_start, self.end)) if position != -1]
+            end = following = min(ends) if ends else self.end
+
+        # Legacy messages are short lines, which are quicker to copy out than to view
+        message = self.buffer[text_start:end].decode("utf-8", "replace")
+        self.start = following
+        self.searched = 0
+        return Frame(LEGACY, 0, message)
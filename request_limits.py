@@ -0,0 +1,131 @@
+import time
+import threading
+from concurrent.futures import Future
+from maintenance import TokenBucket
+
+# Requests per second and burst size
+CLIENT_LIMIT = (10, 40)
+REQUEST_LIMITS = {
+    "chat": (2, 10),
+    "get-status": (2, 10),
+    "get-players": (2, 10),
+    "get-worlds-list": (2, 10),
+    "get-world-size": (0.5, 3),
+    "check-resources": (1, 5),
+    "get-resource-names": (1, 5),
+    "check-download-enabled": (2, 10),
+}
+# Never turned away, so a client can always leave
+EXEMPT_REQUESTS = {"closing"}
+# Only the newest of these matters, so one over the limit waits for a token instead of being dropped
+LATEST_WINS_REQUESTS = {"check-resources", "check-download-enabled"}
+NOTICE_INTERVAL = 10
+LIMIT_MESSAGE = "<font color='red'>Too many requests. Please wait a moment and try again.</font>"
+
+# How long expensive results are shared before being worked out again
+WORLD_SIZE_TTL = 30
+RESOURCES_TTL = 10
+
+
+class RequestLimiter:
+    """Limits how often each client can make requests, both overall and for each type of request."""
+    def __init__(self, client_limit=CLIENT_LIMIT, request_limits=None):
+        self.client_limit = client_limit
+        self.request_limits = REQUEST_LIMITS if request_limits is None else request_limits
+        self.buckets = {}
+        self.last_notice = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, client, request, limit):
+        key = (client, request)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(*limit)
+            return bucket
+
+    def allow(self, client, request):
+        if request in EXEMPT_REQUESTS:
+            return True
+        buckets = [self.bucket(client, None, self.client_limit)]
+        limit = self.request_limits.get(request)
+        if limit:
+            buckets.append(self.bucket(client, request, limit))
+        # Both are checked before either is taken from, so a turned away request costs nothing
+        if any(bucket.wait_time() > 0 for bucket in buckets):
+            return False
+        for bucket in buckets:
+            bucket.take()
+        return True
+
+    def retry_delay(self, client, request):
+        """How long until the client could make this request again."""
+        delay = self.bucket(client, None, self.client_limit).wait_time()
+        limit = self.request_limits.get(request)
+        if limit:
+            delay = max(delay, self.bucket(client, request, limit).wait_time())
+        return delay
+
+    def should_notify(self, client):
+        """Whether to tell the client it is being limited, which is only done now and then."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_notice.get(client, -NOTICE_INTERVAL) < NOTICE_INTERVAL:
+                return False
+            self.last_notice[client] = now
+            return True
+
+    def forget(self, client):
+        with self.lock:
+            self.buckets = {key: bucket for key, bucket in self.buckets.items() if key[0] is not client}
+            self.last_notice.pop(client, None)
+
+
+class SharedResults:
+    """Works out each expensive result once for everyone asking at the same time, then keeps it
+    for a short while so repeated requests don't redo the work. forget(key) throws away the kept
+    result, along with any result still being worked out from before it was called."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+        self.pending = {}
+        self.generations = {}
+
+    def get(self, key, ttl, function, *args):
+        with self.lock:
+            now = time.monotonic()
+            cached = self.results.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+            future = self.pending.get(key)
+            working = future is None
+            if working:
+                future = self.pending[key] = Future()
+                generation = self.generations.get(key, 0)
+        if not working:
+            return future.result()
+
+        try:
+            value = function(*args)
+        except BaseException as e:
+            with self.lock:
+                if self.pending.get(key) is future:
+                    del self.pending[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            now = time.monotonic()
+            self.results = {cached_key: cached for cached_key, cached in self.results.items() if cached[0] > now}
+            if self.generations.get(key, 0) == generation:
+                self.results[key] = (now + ttl, value)
+            if self.pending.get(key) is future:
+                del self.pending[key]
+        future.set_result(value)
+        return value
+
+    def forget(self, key):
+        with self.lock:
+            self.results.pop(key, None)
+            # Later requests start again instead of waiting on work that began before the change
+            self.pending.pop(key, None)
+            self.generations[key] = self.generations.get(key, 0) + 1
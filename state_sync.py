@@ -0,0 +1,121 @@
+import json
+import secrets
+import threading
+from collections import deque
+
+HISTORY_LENGTH = 256
+# Topics that subscribed clients get as state changes instead of full copies
+SYNCED_TOPICS = {"status", "players", "worlds-list"}
+
+
+def copy_value(value):
+    # Values are compared against later versions, so they can't share anything with the caller's objects
+    return json.loads(json.dumps(value))
+
+
+def diff_value(old, new):
+    """Describes how to turn old into new, or returns None if they are the same.
+    Dicts only carry the keys that changed, and lists that were only added to or removed from
+    only carry those items. Anything else is replaced whole."""
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {key: value for key, value in new.items() if key not in old or old[key] != value}
+        removed = [key for key in old if key not in new]
+        return {"set": changed, "remove": removed}
+    if isinstance(old, list) and isinstance(new, list):
+        removed = [item for item in old if item not in new]
+        kept = [item for item in old if item in new]
+        if new[:len(kept)] == kept:
+            return {"add": new[len(kept):], "remove": removed}
+    return {"value": new}
+
+
+def apply_change(old, change):
+    if "value" in change:
+        return change["value"]
+    if "set" in change:
+        value = {key: item for key, item in (old or {}).items() if key not in change["remove"]}
+        value.update(change["set"])
+        return value
+    value = [item for item in (old or []) if item not in change["remove"]]
+    return value + change["add"]
+
+
+class StateStore:
+    """Versioned copies of the state clients mirror. Each update that changes something gets the
+    next version number and is kept for a while, so a client that reconnects can catch up on what
+    it missed instead of downloading everything again."""
+    def __init__(self, history=HISTORY_LENGTH):
+        self.id = secrets.token_hex(8)
+        self.version = 0
+        self.values = {}
+        self.history = deque(maxlen=history)
+        self.lock = threading.RLock()
+
+    def update(self, values: dict):
+        """Records the new values. Returns the versioned changes, or None if nothing changed.
+        Callers that send the changes should hold the lock, so they go out in version order."""
+        with self.lock:
+            changes = {}
+            for name, value in values.items():
+                value = copy_value(value)
+                change = diff_value(self.values.get(name), value)
+                if change is not None:
+                    changes[name] = change
+                    self.values[name] = value
+            if not changes:
+                return None
+            self.version += 1
+            self.history.append([self.version, changes])
+            return [self.version, changes]
+
+    def snapshot(self):
+        with self.lock:
+            # Values are replaced rather than changed, so a shallow copy can be sent later on
+            return {"id": self.id, "version": self.version, "values": dict(self.values)}
+
+    def changes_since(self, store_id, version):
+        """The changes after version, or None if they are from another run or no longer kept."""
+        with self.lock:
+            if store_id != self.id or version > self.version:
+                return None
+            if version == self.version:
+                return []
+            if not self.history or self.history[0][0] > version + 1:
+                return None
+            return [update for update in self.history if update[0] > version]
+
+
+class StateMirror:
+    """A client's copy of a host's StateStore."""
+    def __init__(self):
+        self.id = ""
+        self.version = 0
+        self.values = {}
+        self.synced = False
+
+    def load(self, snapshot):
+        self.id = snapshot["id"]
+        self.version = snapshot["version"]
+        self.values = snapshot["values"]
+        self.synced = True
+        return set(self.values)
+
+    def apply(self, data):
+        """Applies {"id", "updates"} from the host. Returns the names that changed,
+        or None if the updates don't follow on from this copy and a snapshot is needed."""
+        if data["id"] != self.id:
+            return None
+        changed = set()
+        for version, changes in data["updates"]:
+            if version <= self.version:
+                continue
+            if version != self.version + 1:
+                return None
+            for name, change in changes.items():
+                self.values[name] = apply_change(self.values.get(name), change)
+                changed.add(name)
+            self.version = version
+        self.synced = True
+        return changed
@@ -0,0 +1,127 @@
+import json
+import asyncio
+import threading
+from typing import NamedTuple
+
+MANAGER_PORT = 5555
+STATUS_PORT = 5676
+# Every saved host gets this long in total, however many there are
+PROBE_BUDGET = 2.0
+STATUS_REPLY_SIZE = 4096
+
+
+class ProbeResult(NamedTuple):
+    manager_online: bool
+    server_online: bool
+    world: str
+    version: str
+    players: int
+    max_players: int
+
+
+OFFLINE = ProbeResult(False, False, "", "", 0, 0)
+
+
+async def probe_manager(ip, port):
+    try:
+        _, writer = await asyncio.open_connection(ip, port)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+async def probe_server(ip, port=STATUS_PORT):
+    """Reads the supervisor's status reply, which it sends as soon as the connection opens."""
+    try:
+        reader, writer = await asyncio.open_connection(ip, port)
+    except OSError:
+        return None
+    try:
+        data = await reader.read(STATUS_REPLY_SIZE)
+        response = json.loads(data.decode("utf-8"))
+        return (bool(response["status"]), response["world"]["name"], response["world"]["version"],
+                int(response["players"]["online"]), int(response["players"]["max"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    finally:
+        writer.close()
+
+
+async def probe(ip, port=MANAGER_PORT):
+    # Both ports are tried at once, so a host takes one round trip to check
+    manager_online, server = await asyncio.gather(probe_manager(ip, port), probe_server(ip))
+    if server is None or not server[0]:
+        return OFFLINE._replace(manager_online=manager_online)
+    return ProbeResult(manager_online, *server)
+
+
+class StatusProber:
+    """Checks the saved hosts all at once from one background event loop, instead of a thread and
+    blocking sockets for each. Results go to on_result(ip, port, result) from the loop's thread as
+    each host answers. Hosts that haven't answered when the budget runs out are reported offline.
+    The last result for each host is kept, so it can be shown while the next check runs."""
+    def __init__(self, on_result, budget=PROBE_BUDGET):
+        self.on_result = on_result
+        self.budget = budget
+        self.results = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.round = None
+
+    def cached(self, ip, port=MANAGER_PORT) -> ProbeResult | None:
+        with self.lock:
+            return self.results.get((ip, port))
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="status-prober", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.start_round, None)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(1)
+        self.thread = None
+
+    def probe_all(self, servers):
+        """Starts checking every (ip, port) in servers, replacing any check still running."""
+        self.start()
+        servers = list(dict.fromkeys(servers))
+        self.loop.call_soon_threadsafe(self.start_round, servers)
+
+    def start_round(self, servers):
+        if self.round is not None and not self.round.done():
+            self.round.cancel()
+        self.round = self.loop.create_task(self.probe_round(servers)) if servers is not None else None
+
+    async def probe_round(self, servers):
+        if not servers:
+            return
+        current = asyncio.current_task()
+        tasks = {asyncio.create_task(probe(ip, port)): (ip, port) for ip, port in servers}
+        for task, server in tasks.items():
+            task.add_done_callback(lambda done, server=server: self.finished(current, server, done))
+        pending = tasks
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=self.budget)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def finished(self, current, server, task: asyncio.Task):
+        if current is not self.round:
+            # Replaced by a newer check, which reports this host itself
+            return
+        result = OFFLINE if task.cancelled() or task.exception() else task.result()
+        with self.lock:
+            self.results[server] = result
+        try:
+            self.on_result(*server, result)
+        except Exception:
+            pass
@@ -0,0 +1,133 @@
+import time
+import threading
+from typing import NamedTuple
+
+POLL_INTERVAL = 10
+# An API heartbeat or event this recent stands in for the next poll
+EVENT_FRESHNESS = 5
+REFRESH_TIMEOUT = 5
+
+
+class StatusSnapshot(NamedTuple):
+    version: int
+    status: str
+    server_version: str
+    world: str
+    players: tuple
+    updated: float
+
+    def status_info(self):
+        """The [status, version, world] list the GUI and clients have always used."""
+        return [self.status, self.server_version, self.world]
+
+
+class StatusService:
+    """Keeps the server's status and players in one cached snapshot, so the GUI, clients and other
+    readers never have to query the server themselves.
+
+    A background thread polls on a single schedule, skipping polls while API heartbeats or
+    supervisor events are keeping the snapshot fresh. Every change bumps the snapshot's version and
+    is reported to on_update(snapshot, changed, requested) from the service's thread, where changed
+    is the set of fields that changed and requested is whether someone asked for this poll."""
+    def __init__(self, query_status, query_players, on_update, interval=POLL_INTERVAL):
+        self.query_status = query_status
+        self.query_players = query_players
+        self.on_update = on_update
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.current = StatusSnapshot(0, "pinging", "", "", (), 0)
+        self.last_event = 0
+        self.requested = 0
+        self.completed = 0
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopping.clear()
+        self.wake.set()
+        self.thread = threading.Thread(target=self.run, name="status-service", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def snapshot(self) -> StatusSnapshot:
+        with self.condition:
+            return self.current
+
+    def refresh(self, wait=False, timeout=REFRESH_TIMEOUT) -> StatusSnapshot:
+        """Asks for a poll as soon as possible. Any number of callers asking at once share one poll.
+        With wait, blocks until a poll started after the request has finished."""
+        with self.condition:
+            self.requested += 1
+            ticket = self.requested
+            self.wake.set()
+            if wait:
+                self.condition.wait_for(lambda: self.completed >= ticket or self.stopping.is_set(), timeout)
+            return self.current
+
+    def update(self, status=None, server_version=None, world=None, players=None):
+        """Merges in news from an API heartbeat, a player event or the supervisor."""
+        with self.condition:
+            self.last_event = time.monotonic()
+            changed = self.apply(status, server_version, world, players)
+            snapshot = self.current
+        if changed:
+            self.on_update(snapshot, changed, False)
+
+    def add_player(self, name):
+        with self.condition:
+            players = self.current.players
+        if name not in players:
+            self.update(players=players + (name,))
+
+    def remove_player(self, name):
+        with self.condition:
+            players = self.current.players
+        if name in players:
+            self.update(players=tuple(player for player in players if player != name))
+
+    def apply(self, status, server_version, world, players):
+        values = {"status": status, "server_version": server_version, "world": world, "players": None if players is None else tuple(players)}
+        if status == "offline":
+            values.update(server_version="", world="", players=())
+        changes = {field: value for field, value in values.items() if value is not None and getattr(self.current, field) != value}
+        if changes:
+            self.current = self.current._replace(version=self.current.version + 1, updated=time.time(), **changes)
+        else:
+            self.current = self.current._replace(updated=time.time())
+        return set(changes)
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stopping.is_set():
+                break
+            with self.condition:
+                covering = self.requested
+                requested = covering > self.completed
+                fresh = time.monotonic() - self.last_event < EVENT_FRESHNESS
+            if fresh and not requested:
+                continue
+
+            try:
+                status, server_version, world = self.query_status()
+                players = self.query_players() if status == "online" else []
+            except Exception:
+                status, server_version, world, players = "offline", "", "", []
+
+            with self.condition:
+                changed = self.apply(status, server_version, world, players)
+                snapshot = self.current
+                self.completed = covering
+                self.condition.notify_all()
+            if changed or requested:
+                try:
+                    self.on_update(snapshot, changed, requested)
+                except Exception:
+                    pass
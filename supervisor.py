@@ -18,6 +18,7 @@ import logging
 
 CHUNK_RE = re.compile(r"Loading [0-9]+ persistent chunks")
 DONE_RE = re.compile(r"Done \(\d+(?:\.\d+)?s\)!")
+LAG_RE = re.compile(r"Can't keep up! Is the server overloaded\? Running (\d+)ms")
 CUSTOM_COMMAND_PATTER = r"^\[\d{2}:\d{2}:\d{2}\]\s+\[Server thread/INFO\]:\s+<(?P<player>[^>]+)>\s+!(?P<command>\S+)(?P<args>.*)$"
 
 class Supervisor:
@@ -337,6 +338,8 @@ class Supervisor:
                         await self.send_to_client({"type": "player_left", "name": name})
                     elif "OutOfMemoryError" in line:
                         await self.send_to_client({"type": "out_of_memory"})
+                    elif (lag := LAG_RE.search(line)) is not None:
+                        await self.send_to_client({"type": "lag", "ms": int(lag.group(1))})
 
                     match = re.match(CUSTOM_COMMAND_PATTER, line)
 
@@ -766,6 +769,8 @@ class SupervisorConnector:
                         "used_percent": mem_perc,
                         "server_percent": serv_perc
                     })
+                elif msg.get("type") == "lag":
+                    self.stats_signal.emit({"lag_ms": msg.get("ms")})
                 elif msg.get("type") == "server_error":
                     self.msg_queue.put(f"<font color='red'>Server Error: {msg.get("error")}</font>")
                 elif msg.get("type") == "close_manager":
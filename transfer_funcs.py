@@ -0,0 +1,903 @@
+import os
+import json
+import time
+import zlib
+import queue
+import shutil
+import struct
+import socket
+import hashlib
+import secrets
+import threading
+import zipfile
+import nbt_funcs
+from maintenance import TokenBucket, MB
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+STREAM_QUEUE_DEPTH = 16
+ARCHIVE_SEND_SIZE = 65536 * 100
+SHAPED_SEND_SIZE = 256 * 1024
+RECEIVE_BUFFER_SIZE = 1024 * 1024
+RESOURCE_STREAMS = 4
+MAX_TRANSFER_STREAMS = 8
+RANGE_INDEX = struct.Struct(">I")
+RESOURCE_HEADER = struct.Struct(">HQ") # name length, file size. A zero name length ends the stream
+EXTRACT_OUTPUT_LIMIT = 4 * 1024 * 1024
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+ZIP_END_SIGNATURES = {0x02014b50, 0x06054b50, 0x06064b50, 0x07064b50}
+PART_SUFFIX = ".part"
+ARCHIVE_KEEP_SECONDS = 30 * 60
+DELTA_INDEX = "__delta__.json"
+REGION_PATCH_SUFFIX = ".mcapatch"
+SYNC_SKIPPED = {"session.lock"}
+_resource_hashes = {}
+_resource_hashes_lock = threading.Lock()
+
+
+class BandwidthLimiter:
+    """Shapes outgoing world and mod transfers. Each transfer has its own token bucket and also draws
+    from a shared one for the total cap, which drops to the players online limit while anyone is playing."""
+    def __init__(self, settings: dict = None):
+        self.players_online = False
+        self.total_bucket = TokenBucket(0)
+        self.configure(settings or {})
+
+    def configure(self, settings: dict):
+        self.per_transfer_rate = int(settings.get("per transfer limit mb", 0) * MB)
+        self.total_rate = int(settings.get("total limit mb", 0) * MB)
+        self.players_online_rate = int(settings.get("limit while players online mb", 0) * MB)
+        self.update_total_rate()
+
+    def set_players_online(self, online: bool):
+        if online != self.players_online:
+            self.players_online = online
+            self.update_total_rate()
+
+    def update_total_rate(self):
+        rates = [rate for rate in (self.total_rate, self.players_online_rate if self.players_online else 0) if rate]
+        self.total_bucket.set_rate(min(rates) if rates else 0)
+
+    def throttle_for_transfer(self):
+        bucket = TokenBucket(self.per_transfer_rate)
+        def throttle(amount):
+            delay = max(bucket.reserve(amount), self.total_bucket.reserve(amount))
+            if delay > 0:
+                time.sleep(delay)
+        return throttle
+
+
+class TransferSocket:
+    """One-off listening socket for a single client's transfer connection."""
+    def __init__(self, host_ip, backlog=1):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind((host_ip, 0))
+        self.port = self.sock.getsockname()[1]
+        # Listen straight away, so a client connecting as soon as it hears the port isn't refused
+        self.sock.listen(backlog)
+        self.transfer_client = None
+        self.data_clients = []
+    
+    def waitfor(self, client_ip, timeout=None):
+        self.sock.settimeout(timeout)
+        while True:
+            client, address = self.sock.accept()
+            client.settimeout(None)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+            if address[0] == client_ip:
+                self.transfer_client = client
+                break
+            client.close()
+
+    def accept_token(self, client_ip, token, timeout=None):
+        """Accepts one more data connection from the client, which has to open with the token it was given.
+        Used for channels made of several streams, where the client's address alone isn't enough."""
+        self.sock.settimeout(timeout)
+        while True:
+            client, address = self.sock.accept()
+            if address[0] != client_ip:
+                client.close()
+                continue
+            try:
+                client.settimeout(timeout)
+                received = receive_exactly(client, len(token))
+            except (socket.timeout, ConnectionError):
+                client.close()
+                continue
+            if not secrets.compare_digest(received, token.encode()):
+                client.close()
+                continue
+            client.settimeout(None)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+            self.data_clients.append(client)
+            return client
+
+    def close(self):
+        if self.transfer_client:
+            self.transfer_client.close()
+        for client in self.data_clients:
+            client.close()
+        self.sock.close()
+
+
+class SocketStreamWriter:
+    """Write-only, unseekable file for zipfile. Writes are gathered into chunks and handed to a
+    sender thread, so compressing the next file overlaps with sending the last one."""
+    def __init__(self, sock: socket.socket, chunk_size=STREAM_CHUNK_SIZE, depth=STREAM_QUEUE_DEPTH):
+        self.sock = sock
+        self.sha256 = hashlib.sha256()
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.position = 0
+        self.error = None
+        self.closed = False
+        self.chunks = queue.Queue(depth)
+        self.sender = threading.Thread(target=self.send_loop, daemon=True)
+        self.sender.start()
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        if self.closed:
+            # An aborted ZipFile still tries to finish the archive when it is collected
+            return len(data)
+        if self.error:
+            raise self.error
+        self.buffer += data
+        self.position += len(data)
+        if len(self.buffer) >= self.chunk_size:
+            self.push(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def push(self, chunk):
+        if chunk is not None:
+            self.sha256.update(chunk)
+        while True:
+            try:
+                self.chunks.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                if self.error:
+                    raise self.error
+
+    def send_loop(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            if self.error:
+                continue
+            try:
+                self.sock.sendall(chunk)
+            except OSError as e:
+                self.error = ConnectionResetError(f"Transfer connection lost: {e}")
+
+    def close(self, abort=False):
+        if self.closed:
+            return
+        self.closed = True
+        if abort:
+            self.error = self.error or InterruptedError("Transfer cancelled")
+        elif self.buffer:
+            self.push(bytes(self.buffer))
+            self.buffer.clear()
+        self.push(None)
+        self.sender.join()
+        if self.error and not abort:
+            raise self.error
+
+
+class ArchiveWriter:
+    """Unseekable writer over an archive file. zipfile then streams with data descriptors instead of going
+    back to fill in headers, so bytes already read by clients following the file never change."""
+    def __init__(self, archive_file):
+        self.archive_file = archive_file
+        self.sha256 = hashlib.sha256()
+        self.position = 0
+        self.closed = False
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        if self.closed:
+            return len(data)
+        self.archive_file.write(data)
+        self.sha256.update(data)
+        self.position += len(data)
+        return len(data)
+
+    def flush(self):
+        self.archive_file.flush()
+
+    def close(self, abort=False):
+        if not self.closed:
+            self.closed = True
+            self.archive_file.flush()
+
+
+class CachedArchive:
+    def __init__(self, world, key, path):
+        self.world = world
+        self.key = key
+        self.transfer_id = key[1]
+        self.path = path
+        # Set once the file exists, since the build may wait behind other maintenance work
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.failed = False
+        self.size = 0
+        self.sha256 = None
+        self.users = 0
+        self.last_used = time.time()
+
+    def complete(self, size, sha256):
+        self.size = size
+        self.sha256 = sha256
+        self.finished.set()
+
+    def fail(self):
+        self.failed = True
+        self.started.set()
+        self.finished.set()
+
+
+class TransferCache:
+    """Prepared world archives, shared by every client downloading the same state of a world and kept
+    for later requests until they age out or the cache goes over its disk budget."""
+    def __init__(self, folder, max_age=ARCHIVE_KEEP_SECONDS, disk_budget=0):
+        self.folder = folder
+        self.max_age = max_age
+        self.disk_budget = disk_budget
+        self.entries = {}
+        self.lock = threading.Lock()
+        # Archives from a previous run can't be matched to anything any more
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+
+    def configure(self, settings: dict):
+        self.max_age = int(settings.get("max age minutes", ARCHIVE_KEEP_SECONDS // 60) * 60)
+        self.disk_budget = int(settings.get("disk budget gb", 0) * 1024 * 1024 * 1024)
+
+    @staticmethod
+    def world_digest(world_folder_path):
+        digest = hashlib.sha1()
+        for root, dirs, names in os.walk(world_folder_path):
+            dirs.sort()
+            for name in sorted(names):
+                stat = os.stat(os.path.join(root, name))
+                relpath = os.path.relpath(os.path.join(root, name), world_folder_path)
+                digest.update(f"{relpath}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def acquire_world(self, world, world_folder_path):
+        """Returns (archive, created). When created, the caller is responsible for building the archive."""
+        key = (world, self.world_digest(world_folder_path))
+        with self.lock:
+            entry = self.entries.get(key)
+            created = entry is None or entry.failed
+            if created:
+                entry = CachedArchive(world, key, os.path.join(self.folder, f"{world}_{key[1]}.zip"))
+                self.entries[key] = entry
+            entry.users += 1
+            entry.last_used = time.time()
+        return entry, created
+
+    def acquire_transfer(self, transfer_id):
+        with self.lock:
+            for entry in self.entries.values():
+                if entry.transfer_id == transfer_id and not entry.failed:
+                    entry.users += 1
+                    entry.last_used = time.time()
+                    return entry
+        return None
+
+    def release(self, entry: CachedArchive):
+        with self.lock:
+            entry.users -= 1
+            entry.last_used = time.time()
+
+    def evict(self):
+        with self.lock:
+            idle = [entry for entry in self.entries.values() if entry.users == 0 and entry.finished.is_set()]
+            expired = [entry for entry in idle if entry.failed or time.time() - entry.last_used > self.max_age]
+            if self.disk_budget:
+                total = sum(entry.size for entry in self.entries.values() if entry not in expired)
+                for entry in sorted(idle, key=lambda entry: entry.last_used):
+                    if total <= self.disk_budget:
+                        break
+                    if entry not in expired:
+                        expired.append(entry)
+                        total -= entry.size
+            
+            for entry in expired:
+                self.entries.pop(entry.key, None)
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        return len(expired)
+
+
+def stream_world_zip(world_folder_path, writer, progress_function=None, cancelled: threading.Event = None, throttle=None):
+    """Zips the world straight into the writer. Entries use data descriptors since the stream can't
+    be seeked back into, so nothing has to be zipped before sending starts. Returns the archive size."""
+    processed = 0
+    zf = zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+    try:
+        for root, _, files in os.walk(world_folder_path):
+            for name in files:
+                if cancelled and cancelled.is_set():
+                    raise InterruptedError("Transfer cancelled by host")
+                full_path = os.path.join(root, name)
+                size = os.path.getsize(full_path)
+                if throttle:
+                    throttle(size)
+                zf.write(full_path, os.path.relpath(full_path, world_folder_path))
+                processed += size
+                if progress_function:
+                    progress_function(processed, name)
+        zf.close()
+    except BaseException:
+        # Leave the archive without a central directory so it can't be mistaken for a complete one
+        writer.close(abort=True)
+        raise
+
+    writer.close()
+    return writer.position
+
+
+def send_archive(sock: socket.socket, archive_path, offset, finished: threading.Event, progress_function=None, cancelled: threading.Event = None, throttle=None,
+                 started: threading.Event = None):
+    """Sends a kept archive from offset. If it is still being written, follows it until finished is set,
+    and if it hasn't been created yet, waits for started first."""
+    while started is not None and not started.wait(0.05):
+        if cancelled and cancelled.is_set():
+            raise InterruptedError("Transfer cancelled by host")
+    if finished.is_set() and not os.path.exists(archive_path):
+        # Failed before anything was written
+        return offset
+    with open(archive_path, "rb") as f:
+        while True:
+            if cancelled and cancelled.is_set():
+                raise InterruptedError("Transfer cancelled by host")
+            done = finished.is_set()
+            available = os.path.getsize(archive_path) - offset
+            if available <= 0:
+                if done:
+                    return offset
+                time.sleep(0.05)
+                continue
+            count = min(available, SHAPED_SEND_SIZE if throttle else ARCHIVE_SEND_SIZE)
+            if throttle:
+                throttle(count)
+            sent = sock.sendfile(f, offset=offset, count=count)
+            if sent == 0:
+                raise ConnectionResetError("Transfer connection lost")
+            offset += sent
+            if progress_function:
+                progress_function(offset)
+
+
+def split_ranges(start, end, count):
+    """Splits [start, end) into count contiguous (start, end) ranges of nearly equal size."""
+    count = max(1, min(count, end - start))
+    size, extra = divmod(end - start, count)
+    ranges = []
+    for i in range(count):
+        length = size + (1 if i < extra else 0)
+        ranges.append((start, start + length))
+        start += length
+    return ranges
+
+
+def contiguous_position(ranges, positions):
+    """How far the file is complete without gaps, given how far each range has been received."""
+    for (_, end), position in zip(ranges, positions):
+        if position < end:
+            return position
+    return ranges[-1][1] if ranges else 0
+
+
+def send_archive_range(sock: socket.socket, archive_path, start, end, progress_function=None, cancelled: threading.Event = None, throttle=None):
+    """Sends one range of a finished archive, for transfers split across several connections."""
+    offset = start
+    with open(archive_path, "rb") as f:
+        while offset < end:
+            if cancelled and cancelled.is_set():
+                raise InterruptedError("Transfer cancelled by host")
+            count = min(end - offset, SHAPED_SEND_SIZE if throttle else ARCHIVE_SEND_SIZE)
+            if throttle:
+                throttle(count)
+            sent = sock.sendfile(f, offset=offset, count=count)
+            if sent == 0:
+                raise ConnectionResetError("Transfer connection lost")
+            offset += sent
+            if progress_function:
+                progress_function(sent)
+    return offset
+
+
+def receive_range(sock: socket.socket, path, start, end, progress_function=None, cancelled: threading.Event = None):
+    """Writes one range of a download into place. Uses pwrite where the platform has it, and
+    otherwise a file handle of its own, so ranges can be received side by side."""
+    buffer = bytearray(RECEIVE_BUFFER_SIZE)
+    view = memoryview(buffer)
+    position = start
+    with open(path, "r+b") as f:
+        fd = f.fileno()
+        positioned = hasattr(os, "pwrite")
+        if not positioned:
+            f.seek(start)
+        while position < end:
+            if cancelled and cancelled.is_set():
+                return position
+            received = sock.recv_into(view[:min(end - position, len(buffer))])
+            if not received:
+                raise ConnectionResetError("Transfer connection lost")
+            if positioned:
+                written = 0
+                while written < received:
+                    written += os.pwrite(fd, view[written:received], position + written)
+            else:
+                f.write(view[:received])
+            position += received
+            if progress_function:
+                progress_function(position)
+    return position
+
+
+class ZipStreamExtractor:
+    """Extracts a zip while it is still arriving, working from the local headers alone so entries written
+    with data descriptors can be handled. Only the unparsed part of the last chunk fed is held in memory."""
+    def __init__(self, destination):
+        self.destination = os.path.abspath(destination)
+        self.pending = b""
+        self.state = "header"
+        self.entry = None
+        self.output = None
+        self.decompressor = None
+        self.crc = 0
+        self.remaining = 0
+        self.done = False
+        self.extracted = []
+
+    def feed(self, data):
+        if self.done:
+            return
+        self.pending = self.pending + bytes(data) if self.pending else bytes(data)
+        while not self.done and self.step():
+            pass
+
+    def finish(self):
+        if not self.done:
+            self.close_output()
+            raise zipfile.BadZipFile("The world archive ended early")
+
+    def close_output(self):
+        if self.output:
+            self.output.close()
+            self.output = None
+
+    def local_path(self, name):
+        path = os.path.abspath(os.path.join(self.destination, *name.split("/")))
+        if os.path.commonpath([path, self.destination]) != self.destination:
+            raise zipfile.BadZipFile(f"Invalid path in world archive: {name}")
+        return path
+
+    def step(self):
+        if self.state == "header":
+            return self.read_header()
+        elif self.state == "data":
+            return self.read_data()
+        return self.read_descriptor()
+
+    def read_header(self):
+        if len(self.pending) < 4:
+            return False
+        signature = struct.unpack("<I", self.pending[:4])[0]
+        if signature in ZIP_END_SIGNATURES:
+            # Everything needed is in the local headers, so the central directory is skipped
+            self.done = True
+            self.pending = b""
+            return False
+        if signature != LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile("Bad local file header in world archive")
+        if len(self.pending) < 30:
+            return False
+        
+        _, _, flags, method, mod_time, mod_date, crc, compressed_size, file_size, name_length, extra_length = struct.unpack("<IHHHHHIIIHH", self.pending[:30])
+        header_length = 30 + name_length + extra_length
+        if len(self.pending) < header_length:
+            return False
+        
+        raw_name = self.pending[30 : 30 + name_length]
+        name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+        extra = self.pending[30 + name_length : header_length]
+        self.pending = self.pending[header_length:]
+        
+        zip64 = False
+        position = 0
+        while position + 4 <= len(extra):
+            extra_id, extra_size = struct.unpack("<HH", extra[position : position + 4])
+            if extra_id == 0x0001:
+                zip64 = True
+                values = extra[position + 4 : position + 4 + extra_size]
+                if file_size == 0xFFFFFFFF and len(values) >= 8:
+                    file_size = struct.unpack("<Q", values[:8])[0]
+                    values = values[8:]
+                if compressed_size == 0xFFFFFFFF and len(values) >= 8:
+                    compressed_size = struct.unpack("<Q", values[:8])[0]
+            position += 4 + extra_size
+
+        has_descriptor = bool(flags & 0x08)
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise zipfile.BadZipFile(f"Unsupported compression in world archive: {name}")
+        if method == zipfile.ZIP_STORED and has_descriptor:
+            raise zipfile.BadZipFile(f"Can't find the end of stored entry {name} while streaming")
+
+        self.entry = {
+            "name": name,
+            "crc": crc,
+            "descriptor": has_descriptor,
+            "zip64": zip64,
+            "time": (1980 + (mod_date >> 9), (mod_date >> 5) & 0xF, mod_date & 0x1F, mod_time >> 11, (mod_time >> 5) & 0x3F, (mod_time & 0x1F) * 2)
+        }
+        path = self.local_path(name)
+        if name.endswith("/"):
+            os.makedirs(path, exist_ok=True)
+            self.state = "descriptor" if has_descriptor else "header"
+            return True
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.output = open(path, "wb")
+        self.entry["path"] = path
+        self.crc = 0
+        self.decompressor = zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+        self.remaining = compressed_size
+        self.state = "data"
+        return True
+
+    def read_data(self):
+        if not self.pending:
+            return False
+        
+        if self.decompressor:
+            data = self.decompressor.decompress(self.pending, EXTRACT_OUTPUT_LIMIT)
+            finished = self.decompressor.eof
+            self.pending = self.decompressor.unused_data if finished else self.decompressor.unconsumed_tail
+        else:
+            data = self.pending[:self.remaining]
+            self.pending = self.pending[self.remaining:]
+            self.remaining -= len(data)
+            finished = self.remaining == 0
+
+        self.output.write(data)
+        self.crc = zlib.crc32(data, self.crc)
+        if not finished:
+            return bool(self.pending)
+
+        self.close_output()
+        if self.entry["descriptor"]:
+            self.state = "descriptor"
+        else:
+            self.finish_entry(self.entry["crc"])
+        return True
+
+    def read_descriptor(self):
+        size_length = 8 if self.entry["zip64"] else 4
+        if len(self.pending) < 4:
+            return False
+        signed = struct.unpack("<I", self.pending[:4])[0] == DATA_DESCRIPTOR_SIGNATURE
+        descriptor_length = (4 if signed else 0) + 4 + 2 * size_length
+        if len(self.pending) < descriptor_length:
+            return False
+        
+        crc = struct.unpack("<I", self.pending[4 if signed else 0 : 8 if signed else 4])[0]
+        self.pending = self.pending[descriptor_length:]
+        if "path" in self.entry:
+            self.finish_entry(crc)
+        else:
+            self.state = "header"
+        return True
+
+    def finish_entry(self, crc):
+        if crc != self.crc:
+            raise zipfile.BadZipFile(f"CRC check failed for {self.entry['name']} in world archive")
+        try:
+            modified = time.mktime(self.entry["time"] + (0, 0, -1))
+            os.utime(self.entry["path"], (modified, modified))
+        except (OverflowError, ValueError, OSError):
+            pass
+        self.extracted.append(self.entry["name"])
+        self.state = "header"
+
+
+def send_file(sock: socket.socket, path, throttle=None):
+    with open(path, "rb") as f:
+        if not throttle:
+            sock.sendfile(f)
+            return
+        
+        offset = 0
+        size = os.path.getsize(path)
+        while offset < size:
+            count = min(SHAPED_SEND_SIZE, size - offset)
+            throttle(count)
+            sent = sock.sendfile(f, offset=offset, count=count)
+            if sent == 0:
+                raise ConnectionResetError("Connection lost while sending a file")
+            offset += sent
+
+
+def receive_exactly(sock: socket.socket, length):
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(min(length - len(data), STREAM_CHUNK_SIZE))
+        if not chunk:
+            raise ConnectionResetError("Connection closed before all the data arrived")
+        data += chunk
+    return bytes(data)
+
+
+def new_transfer_token():
+    return secrets.token_hex(16)
+
+
+def send_resource_files(sock: socket.socket, files: queue.Queue, throttle=None, progress_function=None, cancelled=None):
+    """Sends files from the shared queue until it is empty, so several streams split the work between them."""
+    while not (cancelled and cancelled.is_set()):
+        try:
+            path = files.get_nowait()
+        except queue.Empty:
+            break
+        name = os.path.basename(path).encode("utf-8")
+        size = os.path.getsize(path)
+        sock.sendall(RESOURCE_HEADER.pack(len(name), size) + name)
+        send_file(sock, path, throttle)
+        if progress_function:
+            progress_function(path)
+    sock.sendall(RESOURCE_HEADER.pack(0, 0))
+
+
+def receive_resource_files(sock: socket.socket, folder, file_function, progress_function=None, cancelled=None):
+    """Receives files into folder until the host ends the stream, calling file_function(name, path, sha256) for each."""
+    buffer = bytearray(RECEIVE_BUFFER_SIZE)
+    view = memoryview(buffer)
+    while not (cancelled and cancelled.is_set()):
+        name_length, size = RESOURCE_HEADER.unpack(receive_exactly(sock, RESOURCE_HEADER.size))
+        if not name_length:
+            return True
+        name = receive_exactly(sock, name_length).decode("utf-8")
+        if os.path.basename(name) != name or name in ("", ".", ".."):
+            raise ValueError(f"Invalid resource name: {name}")
+        
+        path = os.path.join(folder, name)
+        sha256 = hashlib.sha256()
+        remaining = size
+        with open(path, "wb") as f:
+            while remaining:
+                received = sock.recv_into(view[:min(remaining, len(buffer))])
+                if not received:
+                    raise ConnectionResetError("Connection closed while receiving a resource")
+                chunk = view[:received]
+                f.write(chunk)
+                sha256.update(chunk)
+                remaining -= received
+                if progress_function:
+                    progress_function(received)
+        file_function(name, path, sha256.hexdigest())
+    return False
+
+
+def file_sha256(path, length=None):
+    sha256 = hashlib.sha256()
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            data = f.read(STREAM_CHUNK_SIZE if remaining is None else min(remaining, STREAM_CHUNK_SIZE))
+            if not data:
+                break
+            sha256.update(data)
+            if remaining is not None:
+                remaining -= len(data)
+    return sha256
+
+
+def resource_details(paths):
+    """Returns [name, size, sha256] for each resource, only rehashing files whose size or mtime changed."""
+    details = []
+    for path in paths:
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        with _resource_hashes_lock:
+            cached = _resource_hashes.get(path)
+        if cached is None or cached[0] != key:
+            cached = (key, file_sha256(path).hexdigest())
+            with _resource_hashes_lock:
+                _resource_hashes[path] = cached
+        details.append([os.path.basename(path), stat.st_size, cached[1]])
+    return details
+
+
+def has_resource(path, size, sha256):
+    return os.path.isfile(path) and os.path.getsize(path) == size and file_sha256(path).hexdigest() == sha256
+
+
+def cached_resource(cache_folder, size, sha256):
+    """Returns the shared cache's copy of a resource, or None if it isn't cached or doesn't match."""
+    path = os.path.join(cache_folder, sha256)
+    # Cached files are hard linked into download folders, so they are rechecked in case one was edited there
+    if has_resource(path, size, sha256):
+        return path
+    return None
+
+
+def add_cached_resource(cache_folder, path, sha256):
+    """Keeps a copy of a downloaded resource under its hash, so other worlds using it don't download it again."""
+    os.makedirs(cache_folder, exist_ok=True)
+    cached = os.path.join(cache_folder, sha256)
+    if os.path.exists(cached) and file_sha256(cached).hexdigest() == sha256:
+        return cached
+    temp = cached + ".tmp"
+    shutil.copyfile(path, temp)
+    os.replace(temp, cached)
+    return cached
+
+
+def copy_cached_resource(cached, destination):
+    """Hard links the cached file into place when possible, falling back to a copy."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(cached, destination)
+    except OSError:
+        shutil.copyfile(cached, destination)
+
+
+def load_partial_transfer(save_path, host):
+    """Returns (offset, transfer id) for a partly downloaded world from this host, or (0, "")."""
+    try:
+        with open(save_path + PART_SUFFIX + ".json", "r") as f:
+            info = json.load(f)
+        if info.get("host") == host and os.path.exists(save_path + PART_SUFFIX):
+            offset = os.path.getsize(save_path + PART_SUFFIX)
+            # Parallel downloads fill the file out of order, so only the part received without gaps counts
+            if "received" in info:
+                offset = min(offset, info["received"])
+            return offset, info.get("transfer id", "")
+    except (OSError, json.JSONDecodeError):
+        pass
+    return 0, ""
+
+
+def save_partial_transfer(save_path, host, transfer_id, received=None):
+    info = {"host": host, "transfer id": transfer_id}
+    if received is not None:
+        info["received"] = received
+    with open(save_path + PART_SUFFIX + ".json", "w") as f:
+        json.dump(info, f)
+
+
+def remove_partial_transfer(save_path):
+    for path in [save_path + PART_SUFFIX, save_path + PART_SUFFIX + ".json"]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def build_world_manifest(world_folder_path):
+    """Describes a local copy of a world for delta syncing: size and hash of each file, and the chunk
+    timestamps of each region file in place of its hash."""
+    files = {}
+    regions = {}
+    for root, _, names in os.walk(world_folder_path):
+        for name in names:
+            if name in SYNC_SKIPPED:
+                continue
+            full_path = os.path.join(root, name)
+            relpath = os.path.relpath(full_path, world_folder_path).replace(os.sep, "/")
+            if name.endswith(".mca"):
+                timestamps = nbt_funcs.region_timestamps(full_path)
+                if timestamps is not None:
+                    regions[relpath] = timestamps
+                    continue
+            files[relpath] = [os.path.getsize(full_path), file_sha256(full_path).hexdigest()]
+    return {"files": files, "regions": regions}
+
+
+def send_manifest(sock: socket.socket, manifest: dict):
+    data = zlib.compress(json.dumps(manifest).encode("utf-8"))
+    sock.sendall(struct.pack(">Q", len(data)) + data)
+
+
+def receive_manifest(sock: socket.socket):
+    length = struct.unpack(">Q", receive_exactly(sock, 8))[0]
+    return json.loads(zlib.decompress(receive_exactly(sock, length)))
+
+
+def stream_world_delta(world_folder_path, manifest: dict, writer: SocketStreamWriter, throttle=None):
+    """Zips only what differs from the client's manifest into the writer: changed files whole, and region
+    files as patches holding just their changed chunks. Returns the (changed, patched, deleted) paths."""
+    client_files = manifest.get("files", {})
+    client_regions = manifest.get("regions", {})
+    changed, patched = [], []
+    host_files = set()
+    zf = zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+    try:
+        for root, _, names in os.walk(world_folder_path):
+            for name in names:
+                if name in SYNC_SKIPPED:
+                    continue
+                full_path = os.path.join(root, name)
+                relpath = os.path.relpath(full_path, world_folder_path).replace(os.sep, "/")
+                host_files.add(relpath)
+                size = os.path.getsize(full_path)
+                if throttle:
+                    throttle(size)
+                
+                if relpath in client_regions and name.endswith(".mca"):
+                    patch = nbt_funcs.build_region_patch(full_path, client_regions[relpath])
+                    if patch:
+                        zf.writestr(relpath + REGION_PATCH_SUFFIX, patch)
+                        patched.append(relpath)
+                    continue
+
+                known = client_files.get(relpath)
+                if known and known[0] == size and file_sha256(full_path).hexdigest() == known[1]:
+                    continue
+                zf.write(full_path, relpath)
+                changed.append(relpath)
+
+        deleted = [relpath for relpath in list(client_files) + list(client_regions) if relpath not in host_files]
+        zf.writestr(DELTA_INDEX, json.dumps({"changed": changed, "patched": patched, "deleted": deleted}))
+        zf.close()
+    except BaseException:
+        writer.close(abort=True)
+        raise
+
+    writer.close()
+    return changed, patched, deleted
+
+
+def apply_world_delta(world_folder_path, delta_zip_path):
+    """Patches a local world copy in place from a delta made by stream_world_delta."""
+    world_folder_path = os.path.abspath(world_folder_path)
+    def local_path(relpath):
+        path = os.path.abspath(os.path.join(world_folder_path, *relpath.split("/")))
+        if os.path.commonpath([path, world_folder_path]) != world_folder_path:
+            raise ValueError(f"Invalid path in world delta: {relpath}")
+        return path
+
+    with zipfile.ZipFile(delta_zip_path, "r") as zf:
+        index = json.loads(zf.read(DELTA_INDEX))
+        for relpath in index["changed"]:
+            path = local_path(relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with zf.open(relpath) as source, open(path + ".sync", "wb") as target:
+                shutil.copyfileobj(source, target, STREAM_CHUNK_SIZE)
+            os.replace(path + ".sync", path)
+        
+        for relpath in index["patched"]:
+            nbt_funcs.apply_region_patch(local_path(relpath), zf.read(relpath + REGION_PATCH_SUFFIX))
+        
+        for relpath in index["deleted"]:
+            try:
+                os.remove(local_path(relpath))
+            except FileNotFoundError:
+                pass
+    return index["changed"], index["patched"], index["deleted"]